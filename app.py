@@ -1,9 +1,33 @@
-import joblib
+import time
+T_START = time.perf_counter()
+
 import pandas as pd
-import numpy as np
 import streamlit as st
-import matplotlib.pyplot as plt
-from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+
+import dataset_store as store
+import model_artifact
+import model_evaluation
+import prediction_intervals
+import tree_shap
+from figure_cache import (
+    GLOBAL, FigureCache, feature_importance_table, figure_key, render_actual_vs_predicted,
+    render_feature_importance, render_residuals, render_sensitivity, render_trend, render_waterfall,
+)
+from sensitivity import GRID_RESOLUTIONS, sensitivity_grid, value_at
+from state_index import StateIndex
+from startup_timing import StartupTimer
+from fingerprint import cached_file_digest
+from instrumentation import span
+from model_config import (
+    DATASET, FEATURES, MODEL_FILE, TARGET, TEST_END, TEST_START, TRAIN_END, TRAIN_START,
+)
+
+# Opt-in fast start (CROP_APP_FAST_START=1): memory-mapped model copy.
+# matplotlib / sklearn are imported lazily in every mode, only where a section needs them.
+FAST_START = model_artifact.fast_start_enabled()
+timer = StartupTimer(T_START)
+timer.mark("imports")
+# Per-section timing spans (no-ops unless CROP_INSTRUMENT=1): see instrumentation.py
 
 # =========================
 # PAGE CONFIG + LIGHT UI CSS
@@ -21,29 +45,135 @@ h1, h2, h3 {letter-spacing: 0.2px;}
 """, unsafe_allow_html=True)
 
 # =========================
-# CONSTANTS
+# LOAD ASSETS (LOCAL FILES)
 # =========================
-TRAIN_START, TRAIN_END = 2000, 2019
-TEST_START, TEST_END = 2020, 2025
+# Content hashes (memoised on file size/mtime) key every cache below, so a replaced
+# model or dataset file is picked up on the next rerun without a restart
+model_hash = cached_file_digest(MODEL_FILE)
+data_hash = cached_file_digest(store.csv_path(DATASET))
 
-FEATURES = ["State", "Year", "avg_temp_growing", "total_rain_growing"]
-TARGET = "corn_yield_bu_acre"
+@st.cache_resource
+def load_data(data_hash):
+    # Typed + memory-mapped via dataset_store; cache_resource shares the frame
+    # across reruns instead of copying it (nothing below mutates df in place)
+    return store.load(DATASET)
 
-# =========================
-# LOAD ASSETS (LOCAL FILES)
-# =========================
-@st.cache_data
-def load_data():
-    df = pd.read_csv("final_corn_yield_weather_fixed.csv")
-    df["Year"] = df["Year"].astype(int)
-    return df
+@st.cache_resource
+def load_model(model_hash):
+    return model_artifact.load_model(MODEL_FILE, model_hash, mmap=FAST_START)
+
+@st.cache_data(show_spinner=False)
+def load_per_tree(model_hash):
+    # From the training manifest, so the sidebar does not load the model before first use
+    return model_artifact.manifest_per_tree(MODEL_FILE, model_hash)
+
+@st.cache_data(show_spinner="Evaluating model on the test set…")
+def load_evaluation(model_hash, data_hash):
+    # Disk artifact in .cache/evaluation/ keyed by both hashes; forest inference
+    # runs only the first time a (model, dataset) pair is seen
+    return model_evaluation.get_evaluation(
+        model_hash, data_hash, lambda: load_model(model_hash), lambda: load_data(data_hash)
+    )
+
+@st.cache_resource
+def load_state_index(data_hash):
+    # Per-state partitions, stats, test years and slider bounds, built once per dataset
+    return StateIndex(load_data(data_hash))
 
 @st.cache_resource
-def load_model():
-    return joblib.load("random_forest_crop_yield_model.joblib")
+def get_figure_cache():
+    return FigureCache()
+
+@st.cache_data(show_spinner=False)
+def load_importance(model_hash):
+    return feature_importance_table(load_model(model_hash))
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def load_sensitivity(model_hash, data_hash, state, year, resolution):
+    # Whole temp x rain grid (over the dataset's slider ranges) in one predict call
+    idx = load_state_index(data_hash)
+    return sensitivity_grid(load_model(model_hash), state, year, (idx.temp_min, idx.temp_max),
+                            (idx.rain_min, idx.rain_max), resolution)
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def load_figure(model_hash, data_hash, state, plot_type, year=None, resolution=None):
+    # PNG bytes: in-memory LRU here, on-disk LRU (.cache/figures/) below it,
+    # so each plot is drawn once per (model, dataset, state, plot type)
+    def render():
+        if plot_type == "trend":
+            return render_trend(state, load_state_index(data_hash).frame(state))
+        if plot_type == "sensitivity":
+            temps, rains, Z = load_sensitivity(model_hash, data_hash, state, year, resolution)
+            return render_sensitivity(state, year, temps, rains, Z)
+        if plot_type == "feature_importance":
+            return render_feature_importance(load_importance(model_hash))
+        ev = load_evaluation(model_hash, data_hash)
+        renderer = render_actual_vs_predicted if plot_type == "actual_vs_predicted" else render_residuals
+        return renderer(ev["y_test"], ev["y_pred"])
+    variant = plot_type if year is None else f"{plot_type}_{year}_{resolution}"
+    return get_figure_cache().get_or_render(figure_key(model_hash, data_hash, state, variant), render)
 
-df = load_data()
-model = load_model()
+@st.cache_resource
+def load_intervals(model_hash, data_hash):
+    # Flat leaf-value table + leaf training yields (quantile forest), built once per model
+    return prediction_intervals.ForestIntervals(
+        load_model(model_hash), prediction_intervals.training_frame(load_data(data_hash))
+    )
+
+@st.cache_resource
+def load_explainer(model_hash):
+    # Leaf paths of every tree flattened once per model (~0.5 s)
+    return tree_shap.TreeExplainer(load_model(model_hash))
+
+@st.cache_resource(show_spinner="Explaining the test split…")
+def load_test_shap(model_hash, data_hash):
+    # Test-split attributions: read from .cache/shap/ (written when the model was saved),
+    # else computed once per (model, dataset) pair
+    return tree_shap.get_test_shap(
+        model_hash, data_hash, lambda: load_explainer(model_hash), lambda: load_data(data_hash)
+    )
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def load_explanation(model_hash, data_hash, state, year, avg_temp, total_rain):
+    # (E[f], SHAP value per feature); a test-split row is looked up, anything else is
+    # explained on the spot (exact TreeSHAP, ~0.25 s per row)
+    shap = load_test_shap(model_hash, data_hash)
+    idx = load_state_index(data_hash)
+    if shap is not None and year in idx.test_years.get(state, []):
+        row = idx.row(state, year)
+        if (float(row["avg_temp_growing"]), float(row["total_rain_growing"])) == (avg_temp, total_rain):
+            hit = (shap["State"] == state) & (shap["Year"] == year)
+            if hit.any():
+                return shap["base_value"], shap["values"][hit.argmax()]
+    explainer = load_explainer(model_hash)
+    x = pd.DataFrame({"State": [state], "Year": [year], "avg_temp_growing": [avg_temp],
+                      "total_rain_growing": [total_rain]})
+    return explainer.base_value, explainer.explain(x).to_numpy()[0]
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def load_waterfall(model_hash, data_hash, state, year, avg_temp, total_rain):
+    base_value, values = load_explanation(model_hash, data_hash, state, year, avg_temp, total_rain)
+    shown = {"State": state, "Year": year, "avg_temp_growing": f"{avg_temp:.1f} °C",
+             "total_rain_growing": f"{total_rain:.0f} mm"}
+    contributions = sorted(((f"{f} = {shown[f]}", v) for f, v in zip(FEATURES, values)), key=lambda c: -abs(c[1]))
+    return render_waterfall(f"{state} {year} - SHAP Contributions", base_value, contributions)
+
+@st.cache_resource
+def process_runs():
+    # Script runs served by this server process; the first one is the cold start
+    return {"count": 0}
+
+def get_model():
+    # Loaded on first use (prediction / feature importance), not before the first paint
+    model = load_model(model_hash)
+    if "model" not in timer.marks:
+        timer.mark("model")
+    return model
+
+with span("app.load_assets") as sp:
+    index = load_state_index(data_hash)
+    sp.rows = index.n_rows
+timer.mark("data")
 
 # =========================
 # HEADER
@@ -52,10 +182,11 @@ st.title("🌾 Weather-Based Crop Yield Prediction")
 st.caption("Random Forest Regression • State-level U.S. corn yield forecasting using growing-season temperature and rainfall (local dataset + saved model).")
 
 c1, c2, c3, c4 = st.columns(4)
-c1.metric("Rows", f"{len(df):,}")
-c2.metric("States", f"{df['State'].nunique():,}")
-c3.metric("Years", f"{df['Year'].min()}–{df['Year'].max()}")
+c1.metric("Rows", f"{index.n_rows:,}")
+c2.metric("States", f"{len(index.states):,}")
+c3.metric("Years", f"{index.year_min}–{index.year_max}")
 c4.metric("Target", "bu/acre")
+timer.mark("first_render")
 
 # =========================
 # SIDEBAR INPUTS
@@ -69,28 +200,26 @@ mode = st.sidebar.radio(
     help="Evaluate mode auto-fills real weather for test years and shows actual vs predicted."
 )
 
-states = sorted(df["State"].unique().tolist())
+states = index.states
 state = st.sidebar.selectbox("State", states)
 
-state_df = df[df["State"] == state].copy()
-
 # Fix year bounds: don't allow years outside dataset
-year_min, year_max = int(df["Year"].min()), int(df["Year"].max())
+year_min, year_max = index.year_min, index.year_max
 
 # defaults from selected state history
-default_temp = float(state_df["avg_temp_growing"].mean())
-default_rain = float(state_df["total_rain_growing"].mean())
+default_temp = index.stat(state, "mean_temp")
+default_rain = index.stat(state, "mean_rain")
 
 # ranges (global)
-temp_min, temp_max = float(df["avg_temp_growing"].min()), float(df["avg_temp_growing"].max())
-rain_min, rain_max = float(df["total_rain_growing"].min()), float(df["total_rain_growing"].max())
+temp_min, temp_max = index.temp_min, index.temp_max
+rain_min, rain_max = index.rain_min, index.rain_max
 
 actual_yield = None
 autofilled = False
 
 if mode == "Evaluate on Test Set (2020–2025)":
     # restrict years to test period for fair evaluation
-    test_years = sorted(state_df[state_df["Year"].between(TEST_START, TEST_END)]["Year"].unique().tolist())
+    test_years = index.test_years[state]
     if not test_years:
         st.sidebar.warning(f"No test-year data for {state}. Try another state.")
         year = TEST_START
@@ -98,7 +227,7 @@ if mode == "Evaluate on Test Set (2020–2025)":
         total_rain = default_rain
     else:
         year = st.sidebar.selectbox("Year (Test only)", test_years, index=len(test_years) - 1)
-        row = state_df[state_df["Year"] == int(year)].iloc[0]
+        row = index.row(state, year)
         avg_temp = float(row["avg_temp_growing"])
         total_rain = float(row["total_rain_growing"])
         actual_yield = float(row[TARGET])
@@ -117,6 +246,24 @@ else:
         rain_min, rain_max, default_rain
     )
 
+INTERVAL_METHODS = {"Off": None, "Tree percentiles": "trees", "Quantile forest": "quantile"}
+intervals_ok = load_per_tree(model_hash)  # per-tree bands need a forest; None = not recorded
+interval_choice = st.sidebar.selectbox(
+    "Uncertainty band", list(INTERVAL_METHODS),
+    help="Percentiles of the individual trees' predictions, or of the training yields that share "
+         "the input's leaves (quantile regression forest).",
+    disabled=intervals_ok is False,
+)
+if intervals_ok is None and INTERVAL_METHODS[interval_choice] is not None:
+    # No manifest flag for this model: check the model itself, only once a band is asked for
+    intervals_ok = prediction_intervals.supports(get_model())
+interval_method = INTERVAL_METHODS[interval_choice] if intervals_ok else None
+interval_level = st.sidebar.select_slider("Band level", [0.5, 0.8, 0.9, 0.95], value=0.8,
+                                          format_func=lambda v: f"{v:.0%}",
+                                          disabled=interval_method is None)
+if intervals_ok is False:
+    st.sidebar.caption("Uncertainty bands need a forest model; the saved model has no per-tree predictions.")
+
 predict_btn = st.sidebar.button("Predict Yield ✅", use_container_width=True)
 
 with st.sidebar.expander("What do these inputs mean?"):
@@ -135,7 +282,7 @@ left, right = st.columns([1.05, 1.95], gap="large")
 # =========================
 # LEFT: PREDICTION CARD + STATE SUMMARY
 # =========================
-with left:
+with left, span("app.prediction"):
     st.subheader("🔮 Prediction")
 
     split_label = "TEST" if TEST_START <= int(year) <= TEST_END else "TRAIN"
@@ -152,9 +299,15 @@ with left:
         st.success("Auto-filled weather inputs from dataset for this State + Year (test set).")
 
     if predict_btn:
-        pred = float(model.predict(input_df)[0])
+        pred = float(get_model().predict(input_df)[0])
         st.metric("Predicted Corn Yield (bu/acre)", f"{pred:.2f}")
 
+        if interval_method is not None:
+            band = load_intervals(model_hash, data_hash).predict(input_df, interval_level, interval_method)
+            lower, upper = prediction_intervals.interval_columns(interval_level)
+            st.write(f"**{interval_level:.0%} band ({interval_choice.lower()}):** "
+                     f"{band[lower].iloc[0]:.1f} – {band[upper].iloc[0]:.1f} bu/acre")
+
         if actual_yield is not None:
             abs_err = abs(pred - actual_yield)
             st.write(f"**Actual yield:** {actual_yield:.2f} bu/acre")
@@ -170,12 +323,11 @@ with left:
     st.divider()
     st.subheader("📌 State Snapshot")
 
-    state_hist = df[df["State"] == state].sort_values("Year")
     st.write(f"Historical yield summary for **{state}**:")
     s1, s2, s3 = st.columns(3)
-    s1.metric("Mean", f"{state_hist[TARGET].mean():.1f}")
-    s2.metric("Min", f"{state_hist[TARGET].min():.1f}")
-    s3.metric("Max", f"{state_hist[TARGET].max():.1f}")
+    s1.metric("Mean", f"{index.stat(state, 'yield_mean'):.1f}")
+    s2.metric("Min", f"{index.stat(state, 'yield_min'):.1f}")
+    s3.metric("Max", f"{index.stat(state, 'yield_max'):.1f}")
 
 # =========================
 # RIGHT: PERFORMANCE + ANALYSIS TABS
@@ -183,81 +335,88 @@ with left:
 with right:
     st.subheader("📊 Model Results & Analysis")
 
-    # Test set: strictly 2020–2025
-    test_df = df[df["Year"].between(TEST_START, TEST_END)].copy()
-    X_test = test_df[FEATURES]
-    y_test = test_df[TARGET]
-
-    y_pred = model.predict(X_test)
-
-    mae = mean_absolute_error(y_test, y_pred)
-    # ✅ sklearn 1.6-safe RMSE
-    rmse = np.sqrt(mean_squared_error(y_test, y_pred))
-    r2 = r2_score(y_test, y_pred)
+    # Test set: strictly 2020–2025 (cached per model + dataset hash)
+    with span("app.evaluation"):
+        evaluation = load_evaluation(model_hash, data_hash)
+    mae, rmse, r2 = evaluation["mae"], evaluation["rmse"], evaluation["r2"]
 
     m1, m2, m3 = st.columns(3)
     m1.metric("MAE", f"{mae:.2f}")
     m2.metric("RMSE", f"{rmse:.2f}")
     m3.metric("R²", f"{r2:.3f}")
 
-    tabs = st.tabs(["Actual vs Predicted", "Residuals", "Feature Importance", "Trends"])
-
-    with tabs[0]:
-        fig = plt.figure(figsize=(5.5, 5.2))
-        plt.scatter(y_test, y_pred, alpha=0.45)
-        mn, mx = float(y_test.min()), float(y_test.max())
-        plt.plot([mn, mx], [mn, mx], "r--")
-        plt.xlabel("Actual Yield (bu/acre)")
-        plt.ylabel("Predicted Yield (bu/acre)")
-        plt.title(f"Actual vs Predicted (Test Years {TEST_START}–{TEST_END})")
-        st.pyplot(fig, use_container_width=True)
+    tabs = st.tabs(["Actual vs Predicted", "Residuals", "Feature Importance", "Explanation", "Trends", "Sensitivity"])
+
+    with tabs[0], span("app.tab.actual_vs_predicted"):
+        st.image(load_figure(model_hash, data_hash, GLOBAL, "actual_vs_predicted"), use_column_width=True)
         st.caption("Points closer to the diagonal indicate better prediction accuracy.")
 
-    with tabs[1]:
-        residuals = y_test - y_pred
-        fig = plt.figure(figsize=(6.2, 4.2))
-        plt.scatter(y_pred, residuals, alpha=0.45)
-        plt.axhline(0, color="red")
-        plt.xlabel("Predicted Yield (bu/acre)")
-        plt.ylabel("Residual (Actual − Predicted)")
-        plt.title(f"Residual Plot (Test Years {TEST_START}–{TEST_END})")
-        st.pyplot(fig, use_container_width=True)
+    with tabs[1], span("app.tab.residuals"):
+        st.image(load_figure(model_hash, data_hash, GLOBAL, "residuals"), use_column_width=True)
         st.caption("Residuals centered around 0 indicate no major systematic bias.")
 
-    with tabs[2]:
+    with tabs[2], span("app.tab.feature_importance"):
         # Pipeline feature importance (works if saved model is a Pipeline)
         try:
-            feature_names = model.named_steps["preprocessor"].get_feature_names_out()
-            importances = model.named_steps["model"].feature_importances_
-
-            fi = pd.DataFrame({"Feature": feature_names, "Importance": importances})
-            fi = fi.sort_values("Importance", ascending=False).head(15)
+            fi = load_importance(model_hash)
 
             st.write("Top 15 important features:")
             st.dataframe(fi, hide_index=True, use_container_width=True)
 
-            fig = plt.figure(figsize=(7, 4.2))
-            plt.barh(fi["Feature"][::-1], fi["Importance"][::-1])
-            plt.title("Top 15 Feature Importances")
-            st.pyplot(fig, use_container_width=True)
+            st.image(load_figure(model_hash, data_hash, GLOBAL, "feature_importance"), use_column_width=True)
             st.caption("Higher importance means the feature contributes more to the model’s decisions.")
         except Exception as e:
             st.warning(f"Feature importance not available for this saved model: {e}")
 
-    with tabs[3]:
+    with tabs[3], span("app.tab.explanation"):
+        # TreeSHAP (works if the saved model is a tree ensemble). Every tab's body runs on
+        # every rerun, so nothing is explained until asked for here
+        if not st.toggle("Explain the current input", key="explain",
+                         help="Exact TreeSHAP for the sidebar inputs, recomputed as they change."):
+            st.caption("Turn on to see each feature's contribution to the current prediction.")
+        else:
+            try:
+                explain_args = (model_hash, data_hash, state, int(year), float(avg_temp), float(total_rain))
+                base_value, values = load_explanation(*explain_args)
+                st.write(f"Why the model predicts **{base_value + values.sum():.1f}** bu/acre for the current input:")
+                st.image(load_waterfall(*explain_args), use_column_width=True)
+                st.caption("Exact TreeSHAP: each bar is one feature's contribution, stacked from the model's "
+                           "average prediction E[f] to this prediction.")
+                shap = load_test_shap(model_hash, data_hash)
+                st.write(f"Mean |SHAP| over the test split ({TEST_START}–{TEST_END}):")
+                mean_abs = pd.DataFrame(shap["values"], columns=FEATURES).abs().mean()
+                st.dataframe(mean_abs.sort_values(ascending=False).rename("Mean |SHAP| (bu/acre)"),
+                             use_container_width=True)
+            except Exception as e:
+                st.warning(f"Explanations not available for this saved model: {e}")
+
+    with tabs[4], span("app.tab.trends"):
         st.write("Yield trend for selected state:")
-        trend = df[df["State"] == state].sort_values("Year")
-
-        fig = plt.figure(figsize=(10, 3.2))
-        plt.plot(trend["Year"], trend[TARGET])
-        plt.xlabel("Year")
-        plt.ylabel("Corn Yield (bu/acre)")
-        plt.title(f"{state} - Corn Yield Over Time")
-        st.pyplot(fig, use_container_width=True)
+        # trend depends on the dataset only: keyed without the model hash
+        st.image(load_figure(None, data_hash, state, "trend"), use_column_width=True)
         st.caption("This shows historical yield behavior and supports interpretation of predictions.")
 
+    with tabs[5], span("app.tab.sensitivity"):
+        st.write(f"Predicted yield over the temperature × rainfall ranges for **{state}**, {int(year)}:")
+        resolution = st.select_slider("Grid resolution", GRID_RESOLUTIONS, value=50)
+        temps, rains, Z = load_sensitivity(model_hash, data_hash, state, int(year), resolution)
+        st.image(load_figure(model_hash, data_hash, state, "sensitivity", int(year), resolution),
+                 use_column_width=True)
+        st.caption(
+            f"At the current inputs ({avg_temp:.1f} °C, {total_rain:.0f} mm) the grid predicts "
+            f"{value_at(temps, rains, Z, avg_temp, total_rain):.1f} bu/acre. "
+            f"The full {resolution}×{resolution} grid is scored in one batched prediction."
+        )
+
 # =========================
 # FOOTER
 # =========================
 st.divider()
 st.caption("Note: This demo uses a locally saved Random Forest model and a local dataset (no external APIs).")
+
+timer.mark("done")
+runs = process_runs()
+if runs["count"] == 0:
+    rec = timer.write(fast_start=FAST_START, cold=True)
+    print(f"Startup timing (cold): {rec['marks_sec']}")
+runs["count"] += 1
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Rolling-origin backtest across years for every candidate model.
+
+For each origin year o (first_origin..last year), each model is fitted on all years < o and
+predicts years o..o+horizon-1. Folds run in parallel on a process pool. Every fold's
+predictions are cached under .cache/backtest/, keyed by the model's parameters and a hash of
+the exact training and prediction rows, so when a new season lands only the folds whose
+rows changed (the new origin) are trained again.
+
+Outputs (prefix configurable):
+  backtest_predictions.csv   model, origin, step, State, Year, actual, predicted, error
+  backtest_by_year.csv       model x Year: n, MAE, RMSE, bias
+  backtest_by_state.csv      model x State: n, MAE, RMSE, bias
+
+Run:
+  python backtest.py --workers 4
+  python backtest.py --models linear rf_n200_dfull --first-origin 2012 --horizon 2
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+from sklearn.pipeline import Pipeline
+
+import dataset_store as store
+from model_config import CACHE_DIR, DATASET, FEATURES, TARGET
+from train_model import build_preprocessor, candidates
+
+BACKTEST_DIR = os.path.join(CACHE_DIR, "backtest")
+OUTPUT_PREFIX = "backtest"
+DEFAULT_MODELS = ["mean_baseline", "linear", "ridge_a1", "rf_n200_dfull"]
+FIRST_ORIGIN = 2010
+HORIZON = 1
+
+
+# ==============================
+# Folds
+# ==============================
+def _rows_digest(df):
+    return hashlib.sha256(pd.util.hash_pandas_object(df[FEATURES + [TARGET]], index=False).values.tobytes()).hexdigest()
+
+
+def model_digest(estimator):
+    params = {k: repr(v) for k, v in sorted(estimator.get_params().items())}
+    return hashlib.sha256(json.dumps([type(estimator).__name__, params]).encode("utf-8")).hexdigest()
+
+
+def fold_frames(df, origin, horizon=HORIZON):
+    train = df[df["Year"] < origin]
+    test = df[df["Year"].between(origin, origin + horizon - 1)]
+    return train, test
+
+
+def fold_key(model_hash, train, test):
+    raw = "|".join([model_hash, _rows_digest(train), _rows_digest(test)])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+def run_fold(estimator, train, test):
+    """Fit preprocessor + model on train, predict test; returns a dict of arrays."""
+    pipe = Pipeline([("preprocessor", build_preprocessor()), ("model", clone(estimator))])
+    pipe.fit(train[FEATURES], train[TARGET])
+    return {
+        "State": test["State"].astype(str).to_numpy(dtype=str),
+        "Year": test["Year"].to_numpy(dtype=int),
+        "actual": test[TARGET].to_numpy(dtype=float),
+        "predicted": np.asarray(pipe.predict(test[FEATURES]), dtype=float),
+    }
+
+
+def _fold_path(key, cache_dir):
+    return os.path.join(cache_dir, f"fold_{key}.npz")
+
+
+def load_fold(key, cache_dir=BACKTEST_DIR):
+    try:
+        with np.load(_fold_path(key, cache_dir), allow_pickle=False) as z:
+            return {k: z[k] for k in z.files}
+    except (OSError, ValueError):
+        return None
+
+
+def save_fold(key, fold, cache_dir=BACKTEST_DIR):
+    os.makedirs(cache_dir, exist_ok=True)
+    path = _fold_path(key, cache_dir)
+    tmp = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez(tmp, **fold)
+    os.replace(tmp, path)
+
+
+# ==============================
+# Backtest
+# ==============================
+def backtest(df, models, first_origin=FIRST_ORIGIN, last_origin=None, horizon=HORIZON, workers=1,
+             cache_dir=BACKTEST_DIR, use_cache=True):
+    """Long prediction table over every (model, origin) fold; returns (table, n_trained, n_cached)."""
+    last_origin = int(df["Year"].max()) if last_origin is None else last_origin
+    folds, pending = [], []
+    for name, est in models:
+        mhash = model_digest(est)
+        for origin in range(first_origin, last_origin + 1):
+            train, test = fold_frames(df, origin, horizon)
+            if train.empty or test.empty:
+                continue
+            key = fold_key(mhash, train, test)
+            fold = load_fold(key, cache_dir) if use_cache else None
+            folds.append((name, origin, key, fold))
+            if fold is None:
+                pending.append((key, est, train, test))
+
+    fitted = {}
+    if pending:
+        if workers <= 1:
+            results = [run_fold(est, train, test) for _, est, train, test in pending]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(run_fold, *zip(*[(est, tr, te) for _, est, tr, te in pending])))
+        for (key, _, _, _), fold in zip(pending, results):
+            fitted[key] = fold
+            if use_cache:
+                try:
+                    save_fold(key, fold, cache_dir)
+                except OSError as e:
+                    print(f"⚠️ backtest: could not cache fold {key}: {e}")
+
+    frames = []
+    for name, origin, key, fold in folds:
+        fold = fold if fold is not None else fitted[key]
+        part = pd.DataFrame(fold)
+        part.insert(0, "step", part["Year"] - origin + 1)
+        part.insert(0, "origin", origin)
+        part.insert(0, "model", name)
+        frames.append(part)
+    table = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(
+        columns=["model", "origin", "step", "State", "Year", "actual", "predicted"])
+    table["error"] = table["predicted"] - table["actual"]
+    return table, len(pending), len(folds) - len(pending)
+
+
+def error_table(table, by):
+    err = table["error"]
+    return (
+        table.assign(abs_err=err.abs(), sq_err=err ** 2)
+        .groupby(["model", by])
+        .agg(n=("error", "size"), MAE=("abs_err", "mean"), RMSE=("sq_err", "mean"), bias=("error", "mean"))
+        .assign(RMSE=lambda t: np.sqrt(t["RMSE"]))
+        .round(3)
+        .reset_index()
+    )
+
+
+def parse_args(argv=None):
+    names = [n for n, _ in candidates()]
+    p = argparse.ArgumentParser(description="Rolling-origin backtest of candidate models across years.")
+    p.add_argument("--models", nargs="*", default=DEFAULT_MODELS, choices=names, metavar="MODEL",
+                   help=f"candidate names from train_model.py (default: {' '.join(DEFAULT_MODELS)})")
+    p.add_argument("--first-origin", type=int, default=FIRST_ORIGIN)
+    p.add_argument("--last-origin", type=int, default=None)
+    p.add_argument("--horizon", type=int, default=HORIZON, help="years predicted per origin")
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    p.add_argument("--no-cache", action="store_true")
+    p.add_argument("--output-prefix", default=OUTPUT_PREFIX)
+    return p.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    t0 = time.perf_counter()
+    df = store.load(DATASET)
+    models = [(n, est) for n, est in candidates() if n in args.models]
+
+    table, trained, cached = backtest(
+        df, models, args.first_origin, args.last_origin, args.horizon, workers=args.workers,
+        use_cache=not args.no_cache,
+    )
+    by_year = error_table(table, "Year")
+    by_state = error_table(table, "State")
+    table.to_csv(f"{args.output_prefix}_predictions.csv", index=False)
+    by_year.to_csv(f"{args.output_prefix}_by_year.csv", index=False)
+    by_state.to_csv(f"{args.output_prefix}_by_state.csv", index=False)
+
+    overall = error_table(table.assign(all="all"), "all").drop(columns="all").sort_values("MAE")
+    print(overall.to_string(index=False))
+    print(f"✅ Backtest: {trained} folds trained, {cached} from cache, {time.perf_counter() - t0:.1f}s "
+          f"-> {args.output_prefix}_{{predictions,by_year,by_state}}.csv")
+
+
+if __name__ == "__main__":
+    main()
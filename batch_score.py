@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Streaming batch scorer: the saved yield model over large scenario files.
+
+Reads a CSV or Parquet file with (at least) the model FEATURES — State, Year,
+avg_temp_growing, total_rain_growing — in fixed-size chunks, scores each chunk with one
+vectorized predict call and appends it to the output (CSV or Parquet, by extension), so
+memory stays bounded by the chunk size whatever the file size. Other input columns
+(scenario ids etc.) are passed through; rows with missing/non-numeric features get an
+empty prediction. CSV input columns are carried through as text (so a column that is
+empty in one chunk and filled in the next keeps one type); Parquet input keeps its schema.
+
+With --workers N the chunks are scored on N processes (each loads the model once); at most
+2 x N chunks are in flight and results are written in input order.
+
+With --intervals LEVEL every row also gets a central percentile interval (e.g. 0.8 ->
+pred_..._p10 / pred_..._p90) from the same per-tree pass that gives the point prediction
+(see prediction_intervals.py; --interval-method quantile uses leaf training yields).
+
+Run:
+  python batch_score.py scenarios.parquet scored.parquet --chunk-rows 200000 --workers 4
+  python batch_score.py scenarios.csv scored.csv --intervals 0.8 --interval-method quantile
+"""
+
+import argparse
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import dataset_store as store
+from model_artifact import load_model
+from model_config import DATASET, FEATURES, MODEL_FILE, TARGET
+from prediction_intervals import METHODS, ForestIntervals, check_level, interval_columns, supports, training_frame
+
+CHUNK_ROWS = 100_000
+PRED_COLUMN = f"pred_{TARGET}"
+
+
+# ==============================
+# Input / output
+# ==============================
+def _is_parquet(path):
+    return path.lower().endswith((".parquet", ".pq"))
+
+
+def iter_chunks(path, chunk_rows=CHUNK_ROWS):
+    """Yield DataFrames of at most chunk_rows rows from a CSV or Parquet file."""
+    if _is_parquet(path):
+        import pyarrow.parquet as pq
+
+        pf = pq.ParquetFile(path)
+        missing = [c for c in FEATURES if c not in pf.schema_arrow.names]
+        if missing:
+            raise ValueError(f"{path}: missing feature column(s) {missing}")
+        for batch in pf.iter_batches(batch_size=chunk_rows):
+            yield batch.to_pandas()
+        return
+
+    header = pd.read_csv(path, nrows=0).columns
+    missing = [c for c in FEATURES if c not in header]
+    if missing:
+        raise ValueError(f"{path}: missing feature column(s) {missing}. Found: {list(header)}")
+    # Everything as text: per-chunk type inference would give the same column different
+    # dtypes in different chunks; prepare_features parses the feature columns itself.
+    yield from pd.read_csv(path, chunksize=chunk_rows, dtype=str)
+
+
+def output_schema(input_path, pred_columns):
+    """
+    Arrow schema of the scored output: Parquet input keeps its own schema; CSV input gets typed
+    numeric features and text for everything else. float64 prediction columns are appended.
+    """
+    import pyarrow as pa
+
+    if _is_parquet(input_path):
+        import pyarrow.parquet as pq
+
+        fields = list(pq.read_schema(input_path).remove_metadata())
+    else:
+        numeric = {"Year": pa.int64(), "avg_temp_growing": pa.float64(), "total_rain_growing": pa.float64()}
+        fields = [pa.field(c, numeric.get(c, pa.string())) for c in pd.read_csv(input_path, nrows=0).columns]
+    names = {f.name for f in fields}
+    fields += [pa.field(c, pa.float64()) for c in pred_columns if c not in names]
+    return pa.schema(fields)
+
+
+def _coerce_to_schema(df, schema):
+    """Parse text columns that the schema declares numeric; unparseable values (and fractional ints) become null."""
+    import pyarrow as pa
+
+    df = df.copy()
+    for field in schema:
+        if field.name not in df or df[field.name].dtype != object:
+            continue
+        if pa.types.is_integer(field.type) or pa.types.is_floating(field.type):
+            values = pd.to_numeric(df[field.name], errors="coerce")
+            if pa.types.is_integer(field.type):
+                values = values.where(values % 1 == 0)
+            df[field.name] = values
+    return df
+
+
+class ChunkWriter:
+    """
+    Appends scored chunks to a CSV or Parquet file; written to <path>.tmp, moved into place on close().
+    Parquet output is written with a fixed schema (see output_schema) declared up front.
+    """
+
+    def __init__(self, path, columns=None, schema=None):
+        self.path = path
+        self.columns = columns or FEATURES + [PRED_COLUMN]
+        self.schema = schema
+        self.tmp = f"{path}.tmp"
+        self.parquet = _is_parquet(path)
+        self._writer = None
+        self.rows = 0
+
+    def write(self, df):
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            if self.schema is not None:
+                df = _coerce_to_schema(df, self.schema)
+            table = pa.Table.from_pandas(df, schema=self.schema, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.tmp, table.schema)
+            self._writer.write_table(table)
+        else:
+            df.to_csv(self.tmp, mode="a" if self.rows else "w", header=not self.rows, index=False)
+        self.rows += len(df)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        if not os.path.exists(self.tmp):  # empty input: header-only / zero-row output
+            if self.parquet:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+
+                if self.schema is not None:
+                    empty = self.schema.empty_table()
+                else:
+                    empty = pa.Table.from_pandas(pd.DataFrame(columns=self.columns), preserve_index=False)
+                pq.write_table(empty, self.tmp)
+            else:
+                pd.DataFrame(columns=self.columns).to_csv(self.tmp, index=False)
+        os.replace(self.tmp, self.path)
+
+    def abort(self):
+        """Discard the partial output; an existing file at path is left untouched."""
+        if self._writer is not None:
+            self._writer.close()
+        try:
+            os.remove(self.tmp)
+        except OSError:
+            pass
+
+
+# ==============================
+# Scoring
+# ==============================
+def prepare_features(chunk):
+    """Model inputs with the training dtypes, plus a mask of rows that can be scored."""
+    X = pd.DataFrame({
+        "State": chunk["State"].astype(str).str.strip().str.upper(),
+        "Year": pd.to_numeric(chunk["Year"], errors="coerce"),
+        "avg_temp_growing": pd.to_numeric(chunk["avg_temp_growing"], errors="coerce"),
+        "total_rain_growing": pd.to_numeric(chunk["total_rain_growing"], errors="coerce"),
+    })
+    ok = X[FEATURES[1:]].notna().all(axis=1).to_numpy()
+    return X[FEATURES], ok
+
+
+def score_chunk(model, chunk, intervals=None):
+    """
+    Chunk plus the prediction column. With intervals=(ForestIntervals, level, method) the
+    prediction and its interval columns come from one per-tree pass instead of model.predict.
+    """
+    X, ok = prepare_features(chunk)
+    X = X[ok] if not ok.all() else X
+    out = chunk.copy()
+    if intervals is None:
+        pred = np.full(len(chunk), np.nan)
+        if ok.any():
+            pred[ok] = model.predict(X)
+        out[PRED_COLUMN] = pred
+        return out
+    forest, level, method = intervals
+    names = [PRED_COLUMN, *interval_columns(level, f"{PRED_COLUMN}_")]
+    cols = np.full((len(chunk), 3), np.nan)
+    if ok.any():
+        cols[ok] = forest.predict(X, level, method).to_numpy()
+    out[names] = cols
+    return out
+
+
+def load_intervals(model, model_file, method):
+    """ForestIntervals for the model (with leaf training yields when method is 'quantile')."""
+    train = training_frame(store.load(DATASET), model_file) if method == "quantile" else None
+    return ForestIntervals(model, train)
+
+
+_worker_model = None
+_worker_intervals = None
+
+
+def _init_worker(model_file, level=None, method=None):
+    global _worker_model, _worker_intervals
+    _worker_model = load_model(model_file)
+    if level is not None:
+        _worker_intervals = (load_intervals(_worker_model, model_file, method), level, method)
+
+
+def _score_in_worker(chunk):
+    return score_chunk(_worker_model, chunk, _worker_intervals)
+
+
+def score_file(input_path, output_path, model_file=MODEL_FILE, chunk_rows=CHUNK_ROWS, workers=1,
+               progress_every=10, interval_level=None, interval_method="trees"):
+    """Score input_path -> output_path; returns (rows, seconds). On error output_path is left as it was."""
+    t0 = time.perf_counter()
+    columns = FEATURES + [PRED_COLUMN]
+    if interval_level is not None:
+        check_level(interval_level)
+        columns += list(interval_columns(interval_level, f"{PRED_COLUMN}_"))
+    schema = output_schema(input_path, columns[len(FEATURES):]) if _is_parquet(output_path) else None
+    writer = ChunkWriter(output_path, schema.names if schema is not None else columns, schema)
+    chunks = iter_chunks(input_path, chunk_rows)
+
+    def report(n_chunks):
+        if progress_every and n_chunks % progress_every == 0:
+            dt = time.perf_counter() - t0
+            print(f"  {writer.rows:,} rows ({writer.rows / max(dt, 1e-9):,.0f} rows/s)")
+
+    n_chunks = 0
+    try:
+        if workers <= 1:
+            model = load_model(model_file)
+            intervals = None
+            if interval_level is not None:
+                intervals = (load_intervals(model, model_file, interval_method), interval_level, interval_method)
+            for chunk in chunks:
+                writer.write(score_chunk(model, chunk, intervals))
+                n_chunks += 1
+                report(n_chunks)
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(model_file, interval_level, interval_method)) as pool:
+                in_flight = deque()
+                for chunk in chunks:
+                    in_flight.append(pool.submit(_score_in_worker, chunk))
+                    if len(in_flight) >= 2 * workers:
+                        writer.write(in_flight.popleft().result())
+                        n_chunks += 1
+                        report(n_chunks)
+                while in_flight:
+                    writer.write(in_flight.popleft().result())
+                    n_chunks += 1
+                    report(n_chunks)
+    except BaseException:
+        writer.abort()
+        raise
+    writer.close()
+    return writer.rows, time.perf_counter() - t0
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Score a CSV/Parquet scenario file with the saved yield model.")
+    p.add_argument("input", help="CSV or Parquet with columns " + ", ".join(FEATURES))
+    p.add_argument("output", help="CSV or Parquet (by extension)")
+    p.add_argument("--model", default=MODEL_FILE)
+    p.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    p.add_argument("--workers", type=int, default=1, help="scoring processes (1 = in-process)")
+    p.add_argument("--intervals", type=float, default=None, metavar="LEVEL",
+                   help="add a central percentile interval, e.g. 0.8 for p10/p90")
+    p.add_argument("--interval-method", choices=METHODS, default="trees")
+    args = p.parse_args(argv)
+    if args.intervals is not None and not 0 < args.intervals < 1:
+        p.error(f"--intervals LEVEL must be between 0 and 1 (e.g. 0.8 for p10/p90), got {args.intervals}")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.intervals is not None and not supports(load_model(args.model)):
+        raise SystemExit(f"--intervals needs a forest model; {args.model} has no per-tree predictions "
+                         "(mean / linear / ridge)")
+    rows, seconds = score_file(args.input, args.output, model_file=args.model,
+                               chunk_rows=args.chunk_rows, workers=args.workers,
+                               interval_level=args.intervals, interval_method=args.interval_method)
+    print(f"✅ Scored {rows:,} rows -> {args.output} in {seconds:.1f}s "
+          f"({rows / max(seconds, 1e-9):,.0f} rows/s, {args.workers} worker(s))")
+
+
+if __name__ == "__main__":
+    main()
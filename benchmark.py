@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark suite: pipeline stages, model inference and a headless dashboard rerun.
+
+Every run uses pinned synthetic data (fixed seed) at 1x / 10x / 100x the real dataset's
+size — 48 x scale states, 2000–2025, the same files and schemas the pipeline reads — built
+once under .cache/bench/scale_<n>/ and reused. No network is touched. A small RandomForest
+with the production pipeline layout is fitted on the 1x data for the inference and app cases.
+
+Cases (median of --repeat timed runs, each after an untimed setup):
+  clean_usda            clean_usda_corn_yield.clean_state_corn_yield
+  clean_usda_stream     clean_usda_corn_yield.stream_clean
+  merge_yield_weather   merge_yield_weather.main (CSV parse + columnar rebuild included)
+  fix_weather_and_merge fix_weather_and_merge.main (same)
+  predict_single        model.predict on one row (per call)
+  predict_batch         model.predict on every modelling row
+  app_cold              app.py first run via streamlit AppTest, caches cleared
+  app_rerun             app.py rerun of the same session
+
+Results go to benchmark_results.json; with --baseline, each case is compared with the stored
+run and cases slower by more than --threshold are reported as regressions (exit code 1).
+
+Run:
+  python benchmark.py --scales 1 10 --save-baseline          # on the reference machine
+  python benchmark.py --scales 1 10 --baseline benchmark_baseline.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+if REPO_DIR not in sys.path:
+    sys.path.insert(0, REPO_DIR)
+
+import dataset_store as store  # noqa: E402
+from download_us_weather_power import STATE_COORDS  # noqa: E402
+from model_config import CACHE_DIR, DATASET, FEATURES, MODEL_FILE, TARGET  # noqa: E402
+
+BENCH_DIR = os.path.join(REPO_DIR, CACHE_DIR, "bench")
+RESULTS_FILE = "benchmark_results.json"
+BASELINE_FILE = "benchmark_baseline.json"
+STREAM_BENCH_OUTPUT = "bench_quickstats_clean.csv"  # written by clean_usda_stream inside the scratch tree
+
+SCALES = [1, 10, 100]
+REPEAT = 3
+THRESHOLD = 0.25        # slower than baseline by more than 25 % -> regression
+MIN_DELTA_SEC = 0.005   # ... and by more than this (ignores timer noise on tiny cases)
+SEED = 20240601
+GENERATOR_VERSION = 1
+BENCH_TREES = 100
+
+YEARS = np.arange(2000, 2026)
+BASE_STATES = sorted(s for s in STATE_COORDS if s not in ("ALASKA", "HAWAII"))
+
+QS_COLUMNS = [
+    "Program", "Year", "Period", "Week Ending", "Geo Level", "State", "State ANSI", "Ag District",
+    "Ag District Code", "County", "County ANSI", "Zip Code", "Region", "watershed_code", "Watershed",
+    "Commodity", "Data Item", "Domain", "Domain Category", "Value", "CV (%)",
+]
+
+
+# ==============================
+# Pinned synthetic data
+# ==============================
+def state_names(scale):
+    return [s if k == 0 else f"{s} {k + 1}" for k in range(scale) for s in BASE_STATES]
+
+
+def make_dataset(scale, out_dir):
+    """Raw QuickStats yield file, cleaned yield file and monthly weather for 48 x scale states."""
+    rng = np.random.default_rng(SEED + scale)
+    states = state_names(scale)
+    n_s, n_y = len(states), len(YEARS)
+
+    base_temp = rng.uniform(16, 27, n_s)
+    base_rain = rng.uniform(1.0, 4.5, n_s)        # mm/day
+    season = 10 * np.sin((np.arange(12) - 3) / 12 * 2 * np.pi)
+    t2m = base_temp[:, None, None] - 8 + season[None, None, :] + rng.normal(0, 1.2, (n_s, n_y, 12))
+    prcp = np.clip(base_rain[:, None, None] * rng.lognormal(0, 0.35, (n_s, n_y, 12)), 0, None)
+    weather = pd.DataFrame({
+        "State": np.repeat(states, n_y * 12),
+        "Year": np.tile(np.repeat(YEARS, 12), n_s),
+        "Month": np.tile(np.arange(1, 13), n_s * n_y),
+        "T2M": t2m.ravel().round(2),
+        "PRECTOTCORR": prcp.ravel().round(2),
+    })
+
+    grow_t = t2m[:, :, 3:9].mean(axis=2)
+    grow_r = prcp[:, :, 3:9].sum(axis=2) * 30.5
+    yld = (100 + 1.8 * (YEARS - 2000)[None, :] + rng.normal(0, 15, n_s)[:, None]
+           - 2.5 * np.abs(grow_t - 22) + 0.02 * np.minimum(grow_r, 600) + rng.normal(0, 8, (n_s, n_y)))
+    yld = np.clip(yld, 20, 250).round(0)
+    clean = pd.DataFrame({
+        "Year": np.tile(YEARS, n_s),
+        "State": np.repeat(states, n_y),
+        "corn_yield_bu_acre": yld.ravel(),
+    })
+
+    raw = pd.DataFrame("", index=np.arange(len(clean)), columns=QS_COLUMNS)
+    raw["Program"] = "SURVEY"
+    raw["Year"] = clean["Year"].astype(str)
+    raw["Period"] = "YEAR"
+    raw["Geo Level"] = "STATE"
+    raw["State"] = clean["State"]
+    raw["Commodity"] = "CORN"
+    raw["Data Item"] = "CORN, GRAIN - YIELD, MEASURED IN BU / ACRE"
+    raw["Domain"] = "TOTAL"
+    raw["Domain Category"] = "NOT SPECIFIED"
+    raw["Value"] = clean["corn_yield_bu_acre"].map(lambda v: f"{v:,.0f}")
+
+    os.makedirs(out_dir, exist_ok=True)
+    raw.to_csv(os.path.join(out_dir, "usda_corn_yield_state_year.csv"), index=False)
+    clean.to_csv(os.path.join(out_dir, store.csv_path("yield_clean")), index=False)
+    weather.to_csv(os.path.join(out_dir, store.csv_path("weather_monthly")), index=False)
+
+
+def scale_dir(scale):
+    return os.path.join(BENCH_DIR, f"v{GENERATOR_VERSION}_scale_{scale}")
+
+
+def ensure_dataset(scale):
+    path = scale_dir(scale)
+    if not os.path.exists(os.path.join(path, ".complete")):
+        shutil.rmtree(path, ignore_errors=True)
+        make_dataset(scale, path)
+        with _in_dir(path), _quiet():
+            import fix_weather_and_merge
+            fix_weather_and_merge.main()   # modelling table for the inference / app cases
+        open(os.path.join(path, ".complete"), "w").close()
+    return path
+
+
+def bench_model(model_path):
+    """Pinned RandomForest pipeline (production layout) fitted on the 1x data."""
+    import joblib
+    from sklearn.ensemble import RandomForestRegressor
+    from sklearn.pipeline import Pipeline
+
+    from train_model import build_preprocessor
+
+    if not os.path.exists(model_path):
+        with _in_dir(ensure_dataset(1)):
+            df = store.load(DATASET)
+        pipe = Pipeline([("preprocessor", build_preprocessor()),
+                         ("model", RandomForestRegressor(BENCH_TREES, random_state=SEED, n_jobs=1))])
+        pipe.fit(df[FEATURES], df[TARGET])
+        joblib.dump(pipe, model_path)
+    return model_path
+
+
+@contextlib.contextmanager
+def _in_dir(path):
+    prev = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(prev)
+
+
+@contextlib.contextmanager
+def _quiet():
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+# ==============================
+# Cases: name -> (setup(ctx), run(ctx), rows(ctx)); run inside the scale directory
+# ==============================
+def _drop_store(ctx):
+    shutil.rmtree(store.STORE_DIR, ignore_errors=True)
+
+
+def _load_model(ctx):
+    if "model" not in ctx:
+        import joblib
+        ctx["model"] = joblib.load(MODEL_FILE)
+        ctx["X"] = store.load(DATASET)[FEATURES]
+
+
+def _clean(ctx):
+    from clean_usda_corn_yield import clean_state_corn_yield
+    clean_state_corn_yield("usda_corn_yield_state_year.csv")
+
+
+def _clean_stream(ctx):
+    from clean_usda_corn_yield import stream_clean
+    stream_clean("usda_corn_yield_state_year.csv", STREAM_BENCH_OUTPUT)
+
+
+def _stream_rows(ctx):
+    # Rows the case actually wrote, so a broken stream output shows up in rows / rows/s
+    return len(pd.read_csv(STREAM_BENCH_OUTPUT))
+
+
+def _merge(ctx):
+    import merge_yield_weather
+    merge_yield_weather.main()
+
+
+def _fix(ctx):
+    import fix_weather_and_merge
+    fix_weather_and_merge.main()
+
+
+PREDICT_SINGLE_CALLS = 50
+
+
+def _predict_single(ctx):
+    row = ctx["X"].iloc[[0]]
+    for _ in range(PREDICT_SINGLE_CALLS):
+        ctx["model"].predict(row)
+
+
+def _predict_batch(ctx):
+    ctx["model"].predict(ctx["X"])
+
+
+def _app_setup(ctx):
+    import streamlit as st
+    from streamlit.testing.v1 import AppTest
+
+    st.cache_data.clear()
+    st.cache_resource.clear()
+    shutil.rmtree(CACHE_DIR, ignore_errors=True)
+    ctx["app"] = AppTest.from_file(os.path.join(REPO_DIR, "app.py"), default_timeout=600)
+
+
+def _app_run(ctx):
+    ctx["app"].run()
+    if ctx["app"].exception:
+        raise RuntimeError(f"app.py raised: {ctx['app'].exception[0].value}")
+
+
+def _app_rerun_setup(ctx):
+    if "app" not in ctx:
+        _app_setup(ctx)
+        _app_run(ctx)
+
+
+def _n_rows(name):
+    return lambda ctx: len(store.load(name))
+
+
+CASES = {
+    "clean_usda": (None, _clean, _n_rows("yield_clean")),
+    "clean_usda_stream": (None, _clean_stream, _stream_rows),
+    "merge_yield_weather": (_drop_store, _merge, _n_rows("weather_monthly")),
+    "fix_weather_and_merge": (_drop_store, _fix, _n_rows("weather_monthly")),
+    "predict_single": (_load_model, _predict_single, lambda ctx: PREDICT_SINGLE_CALLS),
+    "predict_batch": (_load_model, _predict_batch, lambda ctx: len(ctx["X"])),
+    "app_cold": (_app_setup, _app_run, _n_rows(DATASET)),
+    "app_rerun": (_app_rerun_setup, _app_run, _n_rows(DATASET)),
+}
+
+
+def run_case(name, scale, repeat=REPEAT):
+    setup, run, rows = CASES[name]
+    ctx = {}
+    times = []
+    with _in_dir(scale_dir(scale)), _quiet():
+        for _ in range(repeat):
+            if setup is not None:
+                setup(ctx)
+            t0 = time.perf_counter()
+            run(ctx)
+            times.append(time.perf_counter() - t0)
+        n = rows(ctx)
+    median = statistics.median(times)
+    if name == "predict_single":
+        times = [t / PREDICT_SINGLE_CALLS for t in times]
+        median /= PREDICT_SINGLE_CALLS
+        n = 1
+    return {
+        "case": name,
+        "scale": scale,
+        "repeats": repeat,
+        "median_sec": round(median, 6),
+        "min_sec": round(min(times), 6),
+        "rows": int(n),
+        "rows_per_sec": round(n / median, 1) if median > 0 else None,
+    }
+
+
+# ==============================
+# Baseline comparison
+# ==============================
+def compare(results, baseline, threshold=THRESHOLD, min_delta=MIN_DELTA_SEC):
+    """Per-case ratio to the baseline; returns (rows, regressions)."""
+    base = {(r["case"], r["scale"]): r for r in baseline.get("results", [])}
+    rows, regressions = [], []
+    for r in results:
+        b = base.get((r["case"], r["scale"]))
+        if b is None:
+            continue
+        ratio = r["median_sec"] / b["median_sec"] if b["median_sec"] else float("inf")
+        slower = ratio > 1 + threshold and r["median_sec"] - b["median_sec"] > min_delta
+        row = {"case": r["case"], "scale": r["scale"], "baseline_sec": b["median_sec"],
+               "median_sec": r["median_sec"], "ratio": round(ratio, 3), "regression": slower}
+        rows.append(row)
+        if slower:
+            regressions.append(row)
+    return rows, regressions
+
+
+def environment():
+    import sklearn
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "sklearn": sklearn.__version__,
+        "generator_version": GENERATOR_VERSION,
+        "seed": SEED,
+    }
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Offline benchmarks for pipeline stages, inference and app reruns.")
+    p.add_argument("--scales", type=int, nargs="*", default=SCALES)
+    p.add_argument("--cases", nargs="*", default=list(CASES), choices=list(CASES), metavar="CASE")
+    p.add_argument("--repeat", type=int, default=REPEAT)
+    p.add_argument("--output", default=RESULTS_FILE)
+    p.add_argument("--baseline", default=None, help="compare against this results file")
+    p.add_argument("--threshold", type=float, default=THRESHOLD)
+    p.add_argument("--save-baseline", action="store_true", help=f"also write the results to {BASELINE_FILE}")
+    return p.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    model_path = bench_model(os.path.join(BENCH_DIR, "bench_model.joblib"))
+
+    results = []
+    for scale in args.scales:
+        path = ensure_dataset(scale)
+        shutil.copyfile(model_path, os.path.join(path, MODEL_FILE))
+        for name in args.cases:
+            r = run_case(name, scale, args.repeat)
+            results.append(r)
+            print(f"{name:<22} x{scale:<4} {r['median_sec'] * 1000:>10.2f} ms  "
+                  f"({r['rows']:,} rows, {r['rows_per_sec'] or 0:,.0f} rows/s)")
+
+    out = {"created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+           "environment": environment(), "results": results}
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        out["comparison"], regressions = compare(results, baseline, args.threshold)
+        for row in out["comparison"]:
+            flag = "  <-- REGRESSION" if row["regression"] else ""
+            print(f"{row['case']:<22} x{row['scale']:<4} {row['ratio']:>6.2f}x baseline{flag}")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(out, f, indent=2)
+    if args.save_baseline:
+        with open(BASELINE_FILE, "w", encoding="utf-8") as f:
+            json.dump(out, f, indent=2)
+    print(f"✅ Results: {args.output}")
+    if regressions:
+        print(f"❌ {len(regressions)} regression(s) above {args.threshold:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,57 +1,232 @@
+"""
+Clean a USDA NASS QuickStats export.
+
+Default mode (unchanged): state-level corn yield -> Year,State,corn_yield_bu_acre
+  python clean_usda_corn_yield.py
+
+Streaming mode: read only the needed columns with explicit dtypes, in chunks, filtering
+on Commodity / Data Item / Geo Level / Period while reading, and append every chunk to one
+long-format output. Works for multi-crop, county-level, multi-million-row exports.
+  python clean_usda_corn_yield.py --stream --input qs_export.csv \\
+      --commodity CORN SOYBEANS --geo-level STATE COUNTY --data-item-contains YIELD
+"""
+
+import argparse
+import os
+
+import numpy as np
 import pandas as pd
 
+from instrumentation import span
+
 # ====== CONFIG (change filename if needed) ======
 INPUT_CSV  = "usda_corn_yield_state_year.csv"   # <-- your downloaded USDA file name
 OUTPUT_CSV = "usda_corn_yield_clean.csv"
 
-# ====== LOAD ======
-df = pd.read_csv(INPUT_CSV)
+# ====== STREAMING MODE CONFIG ======
+STREAM_OUTPUT_CSV = "usda_quickstats_clean.csv"
+CHUNK_ROWS = 250_000
+
+STREAM_COLUMNS = ["Year", "Period", "Geo Level", "State", "County", "Commodity", "Data Item", "Value"]
+STREAM_DTYPES = {
+    "Year": "Int16",
+    "Period": "category",
+    "Geo Level": "category",
+    "State": "category",
+    "County": "category",
+    "Commodity": "category",
+    "Data Item": "category",
+    "Value": "string",      # "1,234", "(D)", "(Z)" ... parsed below
+}
+STREAM_KEYS = ["Year", "Period", "Geo Level", "State", "County", "Commodity", "Data Item"]
+
+DEFAULT_COMMODITIES = ["CORN"]
+DEFAULT_DATA_ITEMS = ["CORN, GRAIN - YIELD, MEASURED IN BU / ACRE"]
+DEFAULT_GEO_LEVELS = ["STATE"]
+DEFAULT_PERIODS = ["YEAR"]
+
+
+def parse_values(s):
+    """QuickStats Value strings -> float ("1,234" -> 1234.0; "(D)" etc. -> NaN)."""
+    return pd.to_numeric(s.astype(str).str.replace(",", "", regex=False).str.strip(), errors="coerce")
+
+
+# ==============================
+# Default mode: state-level corn yield
+# ==============================
+def clean_state_corn_yield(input_csv=INPUT_CSV):
+    # ====== LOAD ======
+    with span("read_csv") as sp:
+        df = pd.read_csv(input_csv)
+        sp.rows = len(df)
+
+    # ====== KEEP ONLY WHAT WE NEED ======
+    # Keep: Year, State, Value (yield)
+    keep_cols = ["Year", "State", "Value"]
+    missing = [c for c in keep_cols if c not in df.columns]
+    if missing:
+        raise ValueError(f"Missing expected columns: {missing}. Found columns: {list(df.columns)}")
+
+    df = df[keep_cols].copy()
+
+    # ====== CLEAN + RENAME ======
+    df.rename(columns={"Value": "corn_yield_bu_acre"}, inplace=True)
+
+    # Convert year to int
+    df["Year"] = pd.to_numeric(df["Year"], errors="coerce").astype("Int64")
+
+    # Clean yield values:
+    # - remove commas
+    # - convert to numeric
+    df["corn_yield_bu_acre"] = parse_values(df["corn_yield_bu_acre"])
+
+    # Normalize state names (optional but helps)
+    df["State"] = df["State"].astype(str).str.strip().str.upper()
+
+    # Drop rows with missing Year or Yield
+    df = df.dropna(subset=["Year", "corn_yield_bu_acre"]).copy()
+
+    # Convert Year to regular int after dropping NaNs
+    df["Year"] = df["Year"].astype(int)
+
+    # Remove duplicates (just in case)
+    df = df.drop_duplicates(subset=["Year", "State"])
+
+    # Sort for readability
+    return df.sort_values(["State", "Year"]).reset_index(drop=True)
+
+
+# ==============================
+# Streaming mode: chunked, column-pruned, filtered while reading
+# ==============================
+def _isin(col, allowed):
+    return col.astype("string").str.upper().isin([a.upper() for a in allowed])
+
+
+def iter_filtered_chunks(input_csv, commodities=None, data_items=None, data_item_contains=None,
+                         geo_levels=None, periods=None, chunk_rows=CHUNK_ROWS):
+    """Yield cleaned long-format chunks; every filter left as None keeps all values."""
+    header = pd.read_csv(input_csv, nrows=0).columns
+    missing = [c for c in STREAM_COLUMNS if c not in header]
+    if missing:
+        raise ValueError(f"Missing expected columns: {missing}. Found columns: {list(header)}")
+
+    reader = pd.read_csv(
+        input_csv, usecols=STREAM_COLUMNS, dtype=STREAM_DTYPES, chunksize=chunk_rows,
+        keep_default_na=False, na_values={"Year": [""]},
+    )
+    for chunk in reader:
+        keep = pd.Series(True, index=chunk.index)
+        if commodities:
+            keep &= _isin(chunk["Commodity"], commodities)
+        if data_items:
+            keep &= _isin(chunk["Data Item"], data_items)
+        if data_item_contains:
+            keep &= chunk["Data Item"].astype("string").str.upper().str.contains(data_item_contains.upper(), regex=False)
+        if geo_levels:
+            keep &= _isin(chunk["Geo Level"], geo_levels)
+        if periods:
+            keep &= _isin(chunk["Period"], periods)
+        chunk = chunk[keep]
+        if chunk.empty:
+            continue
+
+        out = pd.DataFrame({
+            "Year": chunk["Year"],
+            "Period": chunk["Period"].astype("string").str.strip().str.upper(),
+            "Geo Level": chunk["Geo Level"].astype("string").str.strip().str.upper(),
+            "State": chunk["State"].astype("string").str.strip().str.upper(),
+            "County": chunk["County"].astype("string").str.strip().str.upper(),
+            "Commodity": chunk["Commodity"].astype("string").str.strip().str.upper(),
+            "Data Item": chunk["Data Item"].astype("string").str.strip(),
+            "Value": parse_values(chunk["Value"]),  # float64: production/area values reach 1e10
+        })
+        yield out.dropna(subset=["Year", "Value"])
+
+
+def key_hashes(chunk):
+    """One uint64 per row identifying its STREAM_KEYS (values are already normalized)."""
+    return pd.util.hash_pandas_object(chunk[STREAM_KEYS], index=False).to_numpy()
 
-# ====== KEEP ONLY WHAT WE NEED ======
-# Keep: Year, State, Value (yield)
-keep_cols = ["Year", "State", "Value"]
-missing = [c for c in keep_cols if c not in df.columns]
-if missing:
-    raise ValueError(f"Missing expected columns: {missing}. Found columns: {list(df.columns)}")
 
-df = df[keep_cols].copy()
+def stream_clean(input_csv, output_csv=STREAM_OUTPUT_CSV, **filters):
+    """
+    Append every filtered chunk to output_csv, skipping duplicate keys across chunks.
 
-# ====== CLEAN + RENAME ======
-df.rename(columns={"Value": "corn_yield_bu_acre"}, inplace=True)
+    Keys seen so far are kept as a set of 64-bit row hashes (8-byte ints, not tuples of
+    seven strings) and each chunk is checked against it in one pass, so dedupe is linear in
+    the number of rows. Only the hashes are compared: if two distinct keys ever hash alike,
+    the later row is dropped as a duplicate. With n distinct keys the chance of any such
+    collision is about n**2 / 2**65 (~3e-6 for ten million rows).
+    """
+    seen = set()
+    rows_in = rows_out = 0
+    tmp = f"{output_csv}.tmp"
+    header = True
+    for chunk in iter_filtered_chunks(input_csv, **filters):
+        rows_in += len(chunk)
+        h = key_hashes(chunk)
+        dup = pd.Series(h).duplicated().to_numpy() | np.fromiter(map(seen.__contains__, h.tolist()), bool, len(h))
+        chunk = chunk[~dup]
+        seen.update(h[~dup].tolist())
+        chunk.to_csv(tmp, mode="w" if header else "a", header=header, index=False)
+        header = False
+        rows_out += len(chunk)
+    if header:  # nothing matched: still write an empty file with the schema
+        pd.DataFrame(columns=STREAM_KEYS + ["Value"]).to_csv(tmp, index=False)
+    os.replace(tmp, output_csv)
+    return rows_in, rows_out
 
-# Convert year to int
-df["Year"] = pd.to_numeric(df["Year"], errors="coerce").astype("Int64")
 
-# Clean yield values:
-# - remove commas
-# - convert to numeric
-df["corn_yield_bu_acre"] = (
-    df["corn_yield_bu_acre"]
-    .astype(str)
-    .str.replace(",", "", regex=False)
-    .str.strip()
-)
-df["corn_yield_bu_acre"] = pd.to_numeric(df["corn_yield_bu_acre"], errors="coerce")
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Clean a USDA NASS QuickStats export.")
+    p.add_argument("--input", default=INPUT_CSV)
+    p.add_argument("--output", default=None)
+    p.add_argument("--stream", action="store_true",
+                   help="chunked, filtered, multi-crop long-format mode (dedupes on 64-bit key hashes; "
+                        "a hash collision would drop a distinct row, ~3e-6 chance at 10M rows)")
+    p.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    p.add_argument("--commodity", nargs="*", default=DEFAULT_COMMODITIES)
+    p.add_argument("--data-item", nargs="*", default=None,
+                   help=f"exact Data Item values (default: {DEFAULT_DATA_ITEMS[0]!r} unless --data-item-contains)")
+    p.add_argument("--data-item-contains", default=None, help="substring filter on Data Item, e.g. YIELD")
+    p.add_argument("--geo-level", nargs="*", default=DEFAULT_GEO_LEVELS)
+    p.add_argument("--period", nargs="*", default=DEFAULT_PERIODS)
+    return p.parse_args(argv)
 
-# Normalize state names (optional but helps)
-df["State"] = df["State"].astype(str).str.strip().str.upper()
 
-# Drop rows with missing Year or Yield
-df = df.dropna(subset=["Year", "corn_yield_bu_acre"]).copy()
+def main(argv=None):
+    args = parse_args(argv)
 
-# Convert Year to regular int after dropping NaNs
-df["Year"] = df["Year"].astype(int)
+    if args.stream:
+        output = args.output or STREAM_OUTPUT_CSV
+        data_items = args.data_item
+        if data_items is None and not args.data_item_contains:
+            data_items = DEFAULT_DATA_ITEMS
+        with span("stream_clean", chunk_rows=args.chunk_rows) as sp:
+            rows_in, rows_out = stream_clean(
+                args.input, output, commodities=args.commodity, data_items=data_items,
+                data_item_contains=args.data_item_contains, geo_levels=args.geo_level,
+                periods=args.period, chunk_rows=args.chunk_rows,
+            )
+            sp.rows = rows_in
+        print("✅ Cleaned QuickStats rows saved:", output)
+        print(f"Rows matched: {rows_in:,}  written (deduplicated): {rows_out:,}")
+        return
 
-# Remove duplicates (just in case)
-df = df.drop_duplicates(subset=["Year", "State"])
+    output = args.output or OUTPUT_CSV
+    with span("clean_state_corn_yield") as sp:
+        df = clean_state_corn_yield(args.input)
+        sp.rows = len(df)
 
-# Sort for readability
-df = df.sort_values(["State", "Year"]).reset_index(drop=True)
+    # ====== SAVE ======
+    with span("save", rows=len(df)):
+        df.to_csv(output, index=False)
 
-# ====== SAVE ======
-df.to_csv(OUTPUT_CSV, index=False)
+    print("✅ Cleaned yield dataset saved:", output)
+    print("Shape:", df.shape)
+    print(df.head(10))
 
-print("✅ Cleaned yield dataset saved:", OUTPUT_CSV)
-print("Shape:", df.shape)
-print(df.head(10))
 
+if __name__ == "__main__":
+    main()
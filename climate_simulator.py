@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+Monte Carlo climate-scenario simulator: yield distribution for one state and year.
+
+"What is the yield distribution for Iowa in 2026 if the weather looks like any of the
+last 25 seasons, plus +2 °C?"
+
+Draws (avg_temp_growing, total_rain_growing) from the state's own history in the
+modelling dataset (final_corn_yield_weather_fixed.csv):
+
+  - a whole season row is resampled, so temperature and rain stay paired (correlation
+    preserved); with --bandwidth > 0 (default: Scott's rule, n^(-1/6)) the pair is then
+    jittered with N(0, h^2 * Sigma), Sigma being the history's covariance (smoothed
+    bootstrap), so draws are not limited to the n observed seasons
+  - shifts are applied after sampling: + --temp-shift °C, rain x (1 + --rain-pct / 100)
+
+Draws are generated and scored in fixed-size chunks on a process pool. A worker receives
+only (chunk index, size), builds its draws from a per-chunk seed (results do not depend on
+--workers) and returns a fixed-bin histogram plus running sums, never the draws. The
+parent merges histograms as chunks finish, so memory is bounded by the chunks in flight.
+Quantiles are read off the merged histogram (accurate to BIN_WIDTH). With --bandwidth 0
+there are only n distinct draws: each worker scores the n seasons once and bins them with
+their draw counts.
+
+Outputs: climate_simulation_report.json (summary) and climate_simulation_histogram.csv.
+
+Run:
+  python climate_simulator.py --state IOWA --year 2026 --last-seasons 25 --temp-shift 2 \\
+      --draws 2000000 --workers 4
+"""
+
+import argparse
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import dataset_store as store
+from model_artifact import load_model
+from model_config import DATASET, FEATURES, MODEL_FILE, TARGET
+
+DRAWS = 1_000_000
+CHUNK_DRAWS = 100_000
+SEED = 2026
+HIST_MIN, HIST_MAX = 0.0, 400.0     # bu/acre; draws outside are counted as under/overflow
+BIN_WIDTH = 0.25
+QUANTILES = [0.05, 0.10, 0.25, 0.50, 0.75, 0.90, 0.95]
+
+REPORT_FILE = "climate_simulation_report.json"
+HIST_FILE = "climate_simulation_histogram.csv"
+
+
+# ==============================
+# Streaming reduction
+# ==============================
+class YieldHistogram:
+    """Fixed-bin histogram with running count / sum / sum of squares / min / max; mergeable."""
+
+    def __init__(self, lo=HIST_MIN, hi=HIST_MAX, width=BIN_WIDTH):
+        self.lo, self.hi, self.width = lo, hi, width
+        self.counts = np.zeros(int(round((hi - lo) / width)), dtype=np.int64)
+        self.below = self.above = 0
+        self.n = 0
+        self.total = self.total_sq = 0.0
+        self.min, self.max = np.inf, -np.inf
+
+    def add(self, values, weights=None):
+        """Add values (each counted `weights` times, default once)."""
+        values = np.asarray(values, dtype=float)
+        w = np.ones(len(values), dtype=np.int64) if weights is None else np.asarray(weights, dtype=np.int64)
+        values, w = values[w > 0], w[w > 0]
+        if not len(values):
+            return
+        idx = np.floor((values - self.lo) / self.width).astype(np.int64)
+        inside = (idx >= 0) & (idx < len(self.counts))
+        self.counts += np.bincount(idx[inside], weights=w[inside], minlength=len(self.counts)).astype(np.int64)
+        self.below += int(w[idx < 0].sum())
+        self.above += int(w[idx >= len(self.counts)].sum())
+        self.n += int(w.sum())
+        self.total += float((values * w).sum())
+        self.total_sq += float((values * values * w).sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+    def merge(self, other):
+        self.counts += other.counts
+        self.below += other.below
+        self.above += other.above
+        self.n += other.n
+        self.total += other.total
+        self.total_sq += other.total_sq
+        self.min, self.max = min(self.min, other.min), max(self.max, other.max)
+        return self
+
+    @property
+    def edges(self):
+        return self.lo + self.width * np.arange(len(self.counts) + 1)
+
+    def mean(self):
+        return self.total / self.n
+
+    def std(self):
+        return float(np.sqrt(max(self.total_sq / self.n - self.mean() ** 2, 0.0)))
+
+    def quantiles(self, qs=QUANTILES):
+        """Quantiles interpolated linearly inside the bin where the CDF crosses q."""
+        cdf = (self.below + np.cumsum(self.counts)) / self.n
+        out = []
+        for q in qs:
+            i = int(np.searchsorted(cdf, q, side="left"))
+            if i >= len(self.counts):
+                out.append(self.max)
+                continue
+            prev = (self.below + (self.counts[:i].sum() if i else 0)) / self.n
+            if q < prev:              # falls in the underflow mass
+                out.append(self.min)
+                continue
+            frac = (q - prev) / max(cdf[i] - prev, 1e-300)
+            out.append(float(self.lo + self.width * (i + frac)))
+        return out
+
+    def prob_below(self, threshold):
+        """P(yield < threshold), from the bins (threshold rounded to a bin edge)."""
+        i = int(np.clip(round((threshold - self.lo) / self.width), 0, len(self.counts)))
+        return float((self.below + self.counts[:i].sum()) / self.n)
+
+
+# ==============================
+# Sampling
+# ==============================
+def season_pool(df, state, last_seasons=None):
+    """(temps, rains, years) of the state's historical seasons, most recent last_seasons only if given."""
+    hist = df[df["State"].astype(str) == state].sort_values("Year")
+    if last_seasons:
+        hist = hist.tail(last_seasons)
+    if hist.empty:
+        raise ValueError(f"No seasons for state {state!r} in {store.csv_path(DATASET)}")
+    return (hist["avg_temp_growing"].to_numpy(dtype=float), hist["total_rain_growing"].to_numpy(dtype=float),
+            hist["Year"].to_numpy(dtype=int))
+
+
+def default_bandwidth(n_seasons):
+    """Scott's rule for a 2-D kernel: n^(-1/6)."""
+    return float(n_seasons ** (-1 / 6))
+
+
+def draw_weather(temps, rains, n, rng, bandwidth=0.0, temp_shift=0.0, rain_pct=0.0):
+    """n (temp, rain) draws: joint season resampling, optional correlated jitter, then shifts."""
+    pick = rng.integers(len(temps), size=n)
+    t, r = temps[pick], rains[pick]
+    if bandwidth > 0 and len(temps) > 1:
+        # eigh: the history covariance can be singular (e.g. a constant rain column)
+        noise = rng.multivariate_normal([0.0, 0.0], bandwidth ** 2 * np.cov(temps, rains), size=n, method="eigh")
+        t, r = t + noise[:, 0], np.maximum(r + noise[:, 1], 0.0)
+    return t + temp_shift, r * (1 + rain_pct / 100.0)
+
+
+def chunk_rng(seed, chunk):
+    return np.random.default_rng(np.random.SeedSequence([seed, chunk]))
+
+
+def features_frame(state, year, temps, rains):
+    return pd.DataFrame({
+        "State": np.full(len(temps), state),
+        "Year": np.full(len(temps), int(year)),
+        "avg_temp_growing": temps,
+        "total_rain_growing": rains,
+    })[FEATURES]
+
+
+# ==============================
+# Worker side
+# ==============================
+_worker = {}
+
+
+def _init_worker(model_file, spec):
+    _worker["model"] = load_model(model_file)
+    _worker["spec"] = spec
+    _worker["pool_pred"] = None
+
+
+def pool_predictions(model, spec):
+    """Predicted yield of every (shifted) historical season: the only outcomes when bandwidth is 0."""
+    t, r = spec["temps"] + spec["temp_shift"], spec["rains"] * (1 + spec["rain_pct"] / 100.0)
+    return model.predict(features_frame(spec["state"], spec["year"], t, r))
+
+
+def simulate_chunk(model, spec, chunk, n, pool_pred=None):
+    """YieldHistogram of chunk `chunk` (n draws) of the simulation described by spec."""
+    rng = chunk_rng(spec["seed"], chunk)
+    temps, rains = spec["temps"], spec["rains"]
+    hist = YieldHistogram(spec["hist_min"], spec["hist_max"], spec["bin_width"])
+    if spec["bandwidth"] > 0:
+        t, r = draw_weather(temps, rains, n, rng, spec["bandwidth"], spec["temp_shift"], spec["rain_pct"])
+        hist.add(model.predict(features_frame(spec["state"], spec["year"], t, r)))
+    else:
+        # same draws as draw_weather(bandwidth=0), binned by season instead of scored one by one
+        if pool_pred is None:
+            pool_pred = pool_predictions(model, spec)
+        hist.add(pool_pred, np.bincount(rng.integers(len(temps), size=n), minlength=len(temps)))
+    return hist
+
+
+def _simulate_in_worker(chunk, n):
+    spec = _worker["spec"]
+    if spec["bandwidth"] <= 0 and _worker["pool_pred"] is None:
+        _worker["pool_pred"] = pool_predictions(_worker["model"], spec)
+    return simulate_chunk(_worker["model"], spec, chunk, n, _worker["pool_pred"])
+
+
+# ==============================
+# Driver
+# ==============================
+def chunk_sizes(draws, chunk_draws=CHUNK_DRAWS):
+    full, rest = divmod(draws, chunk_draws)
+    return [chunk_draws] * full + ([rest] if rest else [])
+
+
+def simulate(spec, draws=DRAWS, chunk_draws=CHUNK_DRAWS, workers=1, model_file=MODEL_FILE, progress_every=10):
+    """Merged YieldHistogram of `draws` simulated yields; at most 2 x workers chunks in flight."""
+    sizes = chunk_sizes(draws, chunk_draws)
+    total = YieldHistogram(spec["hist_min"], spec["hist_max"], spec["bin_width"])
+    t0 = time.perf_counter()
+
+    def report(done):
+        if progress_every and done % progress_every == 0:
+            dt = time.perf_counter() - t0
+            print(f"  {total.n:,} draws ({total.n / max(dt, 1e-9):,.0f} draws/s)")
+
+    if workers <= 1:
+        _init_worker(model_file, spec)
+        for i, n in enumerate(sizes):
+            total.merge(_simulate_in_worker(i, n))
+            report(i + 1)
+        return total
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(model_file, spec)) as pool:
+        in_flight = deque()
+        done = 0
+        for i, n in enumerate(sizes):
+            in_flight.append(pool.submit(_simulate_in_worker, i, n))
+            if len(in_flight) >= 2 * workers:
+                total.merge(in_flight.popleft().result())
+                done += 1
+                report(done)
+        while in_flight:
+            total.merge(in_flight.popleft().result())
+            done += 1
+            report(done)
+    return total
+
+
+def make_spec(df, state, year, last_seasons=None, bandwidth=None, temp_shift=0.0, rain_pct=0.0, seed=SEED,
+              hist_min=HIST_MIN, hist_max=HIST_MAX, bin_width=BIN_WIDTH):
+    """Everything a worker needs to generate and score its chunks (small, picklable)."""
+    temps, rains, years = season_pool(df, state, last_seasons)
+    return {
+        "state": state, "year": int(year), "seed": int(seed),
+        "temps": temps, "rains": rains, "seasons": [int(years.min()), int(years.max()), len(years)],
+        "bandwidth": default_bandwidth(len(temps)) if bandwidth is None else float(bandwidth),
+        "temp_shift": float(temp_shift), "rain_pct": float(rain_pct),
+        "hist_min": hist_min, "hist_max": hist_max, "bin_width": bin_width,
+    }
+
+
+def write_outputs(spec, hist, seconds, history_mean, report_file=REPORT_FILE, hist_file=HIST_FILE):
+    qs = dict(zip([f"p{int(q * 100)}" for q in QUANTILES], hist.quantiles(QUANTILES)))
+    report = {
+        "state": spec["state"], "year": spec["year"],
+        "seasons": {"first": spec["seasons"][0], "last": spec["seasons"][1], "count": spec["seasons"][2]},
+        "temp_shift_c": spec["temp_shift"], "rain_pct": spec["rain_pct"], "bandwidth": spec["bandwidth"],
+        "seed": spec["seed"], "draws": hist.n, "seconds": round(seconds, 3),
+        "mean": hist.mean(), "std": hist.std(), "min": hist.min, "max": hist.max,
+        "quantiles": qs, "bin_width": spec["bin_width"],
+        "history_mean_yield": history_mean, "prob_below_history_mean": hist.prob_below(history_mean),
+        "out_of_range": {"below": hist.below, "above": hist.above},
+    }
+    tmp = f"{report_file}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    os.replace(tmp, report_file)
+
+    keep = np.flatnonzero(hist.counts)
+    edges = hist.edges
+    pd.DataFrame({"bin_left": edges[:-1][keep], "bin_right": edges[1:][keep], "count": hist.counts[keep]}).to_csv(
+        hist_file, index=False)
+    return report
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Monte Carlo yield distribution under resampled / shifted weather.")
+    p.add_argument("--state", required=True)
+    p.add_argument("--year", type=int, default=None, help="model Year input (default: last dataset year + 1)")
+    p.add_argument("--last-seasons", type=int, default=None, help="sample only the most recent N seasons")
+    p.add_argument("--temp-shift", type=float, default=0.0, help="°C added to every draw")
+    p.add_argument("--rain-pct", type=float, default=0.0, help="percent change applied to every draw's rain")
+    p.add_argument("--bandwidth", type=float, default=None,
+                   help="jitter scale (x history covariance); 0 = plain season resampling (default: n^-1/6)")
+    p.add_argument("--draws", type=int, default=DRAWS)
+    p.add_argument("--chunk-draws", type=int, default=CHUNK_DRAWS)
+    p.add_argument("--workers", type=int, default=1)
+    p.add_argument("--seed", type=int, default=SEED)
+    p.add_argument("--model", default=MODEL_FILE)
+    args = p.parse_args(argv)
+    for name in ("draws", "chunk_draws", "workers", "last_seasons"):
+        value = getattr(args, name)
+        if value is not None and value < 1:
+            p.error(f"--{name.replace('_', '-')} must be at least 1, got {value}")
+    if args.bandwidth is not None and args.bandwidth < 0:
+        p.error(f"--bandwidth must be >= 0, got {args.bandwidth}")
+    args.state = args.state.strip().upper()
+    states = sorted(store.load(DATASET, columns=["State"])["State"].astype(str).unique())
+    if args.state not in states:
+        p.error(f"--state {args.state!r} not in {store.csv_path(DATASET)}; valid states: {', '.join(states)}")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    df = store.load(DATASET)
+    state = args.state
+    year = args.year if args.year is not None else int(df["Year"].max()) + 1
+    spec = make_spec(df, state, year, args.last_seasons, args.bandwidth, args.temp_shift, args.rain_pct, args.seed)
+    first, last, count = spec["seasons"]
+    print(f"{state} {year}: sampling {count} seasons ({first}–{last}), shift {spec['temp_shift']:+g} °C / "
+          f"{spec['rain_pct']:+g}% rain, bandwidth {spec['bandwidth']:.3f}, {args.draws:,} draws")
+
+    t0 = time.perf_counter()
+    hist = simulate(spec, args.draws, args.chunk_draws, args.workers, args.model)
+    seconds = time.perf_counter() - t0
+    history_mean = float(df.loc[df["State"].astype(str) == state, TARGET].mean())
+    report = write_outputs(spec, hist, seconds, history_mean)
+
+    print(f"✅ {hist.n:,} draws in {seconds:.1f}s ({hist.n / max(seconds, 1e-9):,.0f} draws/s, "
+          f"{args.workers} worker(s)) -> {REPORT_FILE}, {HIST_FILE}")
+    print(f"Mean {report['mean']:.1f} ± {report['std']:.1f} bu/acre; "
+          + ", ".join(f"{k} {v:.1f}" for k, v in report["quantiles"].items()))
+    print(f"P(yield < state's historical mean {history_mean:.1f}) = {report['prob_below_history_mean']:.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Compact, fast-loading model artifact: tree selection + float32 quantization.
+
+Starting from the compiled flat-array forest (compiled_forest.py):
+  1. Tree selection. Trees are added greedily, each time picking the one that brings the
+     subset's average closest (MAE) to the full forest's prediction on the dataset's feature
+     rows, until that gap is <= --max-gap bu/acre or --max-trees is reached. Only the full
+     forest's outputs are used, not yields, so no test labels leak into the choice.
+  2. Quantization. float32 thresholds (rounded down, which keeps every split decision
+     identical) and leaf values, int16 split features; the one-hot State mapping is stored
+     once for all trees.
+
+The report compares artifact size, load time, predict latency and test MAE against the
+original joblib pipeline.
+
+Run:
+  python compact_model.py --max-gap 0.5
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+import dataset_store as store
+from compiled_forest import CompiledForest, compile_pipeline
+from fingerprint import file_digest
+from model_artifact import load_model
+from model_config import DATASET, FEATURES, MODEL_FILE, TARGET, TEST_END, TEST_START
+from model_evaluation import regression_metrics
+
+COMPACT_FILE = "random_forest_crop_yield_model.compact.npz"
+MAX_GAP = 0.5           # bu/acre: mean |subset - full forest| on the selection rows
+REPORT_FILE = "compact_model_report.json"
+
+
+def select_trees(tree_preds, max_gap=MAX_GAP, max_trees=None):
+    """Greedy forward selection of tree columns; returns (tree ids, gap after each step)."""
+    n_rows, n_trees = tree_preds.shape
+    max_trees = min(max_trees or n_trees, n_trees)
+    target = tree_preds.mean(axis=1)
+    total = np.zeros(n_rows)
+    chosen, gaps = [], []
+    available = np.ones(n_trees, dtype=bool)
+    for k in range(1, max_trees + 1):
+        err = np.abs((total[:, None] + tree_preds) / k - target[:, None]).mean(axis=0)
+        err[~available] = np.inf
+        best = int(err.argmin())
+        chosen.append(best)
+        gaps.append(float(err[best]))
+        available[best] = False
+        total += tree_preds[:, best]
+        if err[best] <= max_gap:
+            break
+    return chosen, gaps
+
+
+def _timed(fn, repeat=1):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        out = fn()
+    return out, (time.perf_counter() - t0) / repeat
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Build a pruned, float32 compiled forest and compare it to the original.")
+    p.add_argument("--model", default=MODEL_FILE)
+    p.add_argument("--output", default=COMPACT_FILE)
+    p.add_argument("--max-gap", type=float, default=MAX_GAP, help="allowed mean |compact - full| (bu/acre)")
+    p.add_argument("--max-trees", type=int, default=None)
+    p.add_argument("--report", default=REPORT_FILE)
+    return p.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    df = store.load(DATASET)
+    test = df[df["Year"].between(TEST_START, TEST_END)]
+    y_test = test[TARGET].to_numpy(dtype=float)
+
+    pipeline, t_load_orig = _timed(lambda: load_model(args.model))
+    full = compile_pipeline(pipeline, source_hash=file_digest(args.model))
+
+    tree_preds = full.tree_predictions(full.transform(df[FEATURES]))
+    chosen, gaps = select_trees(tree_preds, args.max_gap, args.max_trees)
+    compact = full.subset(chosen).quantized()
+    compact.meta["selection_gap"] = gaps[-1]
+    compact.save(args.output)
+    compact, t_load_compact = _timed(lambda: CompiledForest.load(args.output))
+
+    row = test[FEATURES].iloc[[0]]
+    row_cols = {c: row[c].to_numpy() for c in FEATURES}
+    rows = {
+        "original": {
+            "file": args.model,
+            "bytes": os.path.getsize(args.model),
+            "trees": len(pipeline.named_steps["model"].estimators_),
+            "load_ms": t_load_orig * 1000,
+            "row_predict_us": _timed(lambda: pipeline.predict(row), 20)[1] * 1e6,
+            "test_predict_ms": _timed(lambda: pipeline.predict(test[FEATURES]), 3)[1] * 1000,
+            "test": regression_metrics(y_test, pipeline.predict(test[FEATURES])),
+        },
+        "compact": {
+            "file": args.output,
+            "bytes": os.path.getsize(args.output),
+            "trees": compact.n_trees,
+            "load_ms": t_load_compact * 1000,
+            "row_predict_us": _timed(lambda: compact.predict(row_cols), 200)[1] * 1e6,
+            "test_predict_ms": _timed(lambda: compact.predict(test[FEATURES]), 3)[1] * 1000,
+            "test": regression_metrics(y_test, compact.predict(test[FEATURES])),
+        },
+    }
+
+    print(f"{'':<10}{'size MB':>9}{'trees':>7}{'load ms':>9}{'1-row µs':>10}{'test ms':>9}{'test MAE':>10}")
+    for name, r in rows.items():
+        print(f"{name:<10}{r['bytes'] / 1e6:>9.2f}{r['trees']:>7}{r['load_ms']:>9.1f}{r['row_predict_us']:>10,.0f}"
+              f"{r['test_predict_ms']:>9.1f}{r['test']['mae']:>10.3f}")
+    print(f"✅ Compact model: {args.output} ({compact.n_trees} trees, mean |compact - full| {gaps[-1]:.3f} bu/acre "
+          f"on {len(df):,} rows)")
+    with open(args.report, "w", encoding="utf-8") as f:
+        json.dump({"max_gap": args.max_gap, "selection_gaps": gaps, **rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
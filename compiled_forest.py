@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Compiled flat-array inference engine for the saved preprocessor + random forest pipeline.
+
+The fitted pipeline is flattened into contiguous NumPy arrays:
+  - the one-hot State mapping (category list -> output column) and the passthrough numeric
+    columns, in the ColumnTransformer's output order
+  - every tree's nodes concatenated: split feature, threshold, children[node] = (left, right)
+    as global node ids, and the leaf value; leaves point to themselves
+
+All (row, tree) pairs are advanced together one level per step with a few gathers (no
+per-tree loop); pairs that have reached their leaf drop out of the active set.
+
+Splits are evaluated exactly like sklearn: features cast to float32, thresholds kept in
+float64, `x <= threshold` goes left, leaf values averaged over trees in float64.
+
+The artifact (.npz, no pickle) stores the source model's hash; CompiledForest.load checks it.
+
+Run (export + verify against sklearn + latency report):
+  python compiled_forest.py
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from fingerprint import file_digest
+from model_config import DATASET, FEATURES, MODEL_FILE
+
+COMPILED_FILE = "random_forest_crop_yield_model.forest.npz"
+ROW_BLOCK = 4096      # rows per traversal block (bounds the rows x trees index array)
+
+
+# ==============================
+# Export
+# ==============================
+def _column_layout(preprocessor):
+    """[(kind, input column, categories or None)] in the transformer's output column order."""
+    if getattr(preprocessor, "remainder", "drop") != "drop":
+        raise ValueError("compiled_forest: ColumnTransformer remainder must be 'drop'")
+    layout = []
+    spec = {name: trans for name, trans, _ in preprocessor.transformers}
+    for name, fitted, cols in preprocessor.transformers_:
+        if fitted == "drop" or name == "remainder":
+            continue
+        declared = spec.get(name)
+        if type(fitted).__name__ == "OneHotEncoder":
+            if fitted.drop_idx_ is not None or fitted.handle_unknown not in ("ignore", "infrequent_if_exist"):
+                raise ValueError("compiled_forest: OneHotEncoder must use drop=None, handle_unknown='ignore'")
+            for col, cats in zip(cols, fitted.categories_):
+                layout.append(("onehot", col, [str(c) for c in cats]))
+        elif declared == "passthrough" or fitted == "passthrough":
+            layout.extend(("num", col, None) for col in cols)
+        else:
+            raise ValueError(f"compiled_forest: unsupported transformer {name!r} ({type(fitted).__name__})")
+    return layout
+
+
+def compile_pipeline(pipeline, source_hash=None):
+    """Flatten a fitted Pipeline(preprocessor=ColumnTransformer, model=forest) into a CompiledForest."""
+    layout = _column_layout(pipeline.named_steps["preprocessor"])
+    forest = pipeline.named_steps["model"]
+    if getattr(forest, "n_outputs_", 1) != 1:
+        raise ValueError("compiled_forest: single-output regression forests only")
+
+    trees = [est.tree_ for est in forest.estimators_]
+    counts = np.array([t.node_count for t in trees])
+    roots = np.concatenate([[0], np.cumsum(counts)[:-1]]).astype(np.int32)
+    n_nodes = int(counts.sum())
+
+    feature = np.zeros(n_nodes, dtype=np.int32)
+    threshold = np.zeros(n_nodes, dtype=np.float64)
+    children = np.zeros((n_nodes, 2), dtype=np.int32)
+    value = np.zeros(n_nodes, dtype=np.float64)
+    for t, off in zip(trees, roots):
+        sl = slice(off, off + t.node_count)
+        ids = np.arange(t.node_count, dtype=np.int32) + off
+        leaf = t.children_left == -1
+        feature[sl] = np.where(leaf, 0, t.feature)
+        threshold[sl] = np.where(leaf, np.inf, t.threshold)     # leaves always "go left" ...
+        children[sl, 0] = np.where(leaf, ids, t.children_left + off)   # ... to themselves
+        children[sl, 1] = np.where(leaf, ids, t.children_right + off)
+        value[sl] = t.value[:, 0, 0]
+
+    meta = {
+        "layout": layout,
+        "n_trees": len(trees),
+        "max_depth": int(max(t.max_depth for t in trees)),
+        "source_hash": source_hash,
+    }
+    return CompiledForest(meta, roots, feature, threshold, children, value)
+
+
+# ==============================
+# Inference
+# ==============================
+class CompiledForest:
+    def __init__(self, meta, roots, feature, threshold, children, value):
+        self.meta = meta
+        self.roots = roots
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.value = value
+        self.max_depth = meta["max_depth"]
+        self.n_trees = meta["n_trees"]
+
+        self._numeric = []     # (output column, input column)
+        self._onehot = []      # (first output column, input column, category index)
+        col = 0
+        for kind, name, cats in meta["layout"]:
+            if kind == "onehot":
+                self._onehot.append((col, name, pd.Index(cats)))
+                col += len(cats)
+            else:
+                self._numeric.append((col, name))
+                col += 1
+        self.n_columns = col
+
+    # ---------- input ----------
+    def transform(self, df):
+        """FEATURES frame (or dict of columns) -> (n_rows, n_columns) float32 design matrix."""
+        n = len(df[FEATURES[0]])
+        X = np.zeros((n, self.n_columns), dtype=np.float32)
+        rows = np.arange(n)
+        for start, name, cats in self._onehot:
+            codes = cats.get_indexer(np.asarray(df[name], dtype=object))
+            known = codes >= 0          # unknown categories -> all-zero block (handle_unknown='ignore')
+            X[rows[known], start + codes[known]] = 1.0
+        for col, name in self._numeric:
+            X[:, col] = np.asarray(df[name], dtype=np.float64)
+        return X
+
+    # ---------- traversal ----------
+    def leaves(self, X):
+        """(n_rows, n_trees) global leaf node ids for a design matrix."""
+        n, n_cols = X.shape
+        x = np.ascontiguousarray(X).ravel()
+        node = np.tile(self.roots, n)                                 # (row, tree) pairs, row-major
+        base = np.repeat(np.arange(n, dtype=np.int64) * n_cols, self.n_trees)
+        active = np.arange(node.size)
+        children = self.children.ravel()                              # node * 2 + (0 left | 1 right)
+        for _ in range(self.max_depth + 1):
+            cur = node[active]
+            right = x[base[active] + self.feature[cur]] > self.threshold[cur]
+            nxt = children[cur * 2 + right]
+            node[active] = nxt
+            active = active[nxt != cur]   # leaves point to themselves: done once a step stays put
+            if not active.size:
+                break
+        return node.reshape(n, self.n_trees)
+
+    def tree_predictions(self, X):
+        """(n_rows, n_trees) per-tree outputs."""
+        return self.value[self.leaves(X)]
+
+    def predict_matrix(self, X):
+        out = np.empty(X.shape[0])
+        for s in range(0, X.shape[0], ROW_BLOCK):
+            out[s:s + ROW_BLOCK] = self.tree_predictions(X[s:s + ROW_BLOCK]).mean(axis=1, dtype=np.float64)
+        return out
+
+    def predict(self, df):
+        return self.predict_matrix(self.transform(df))
+
+    # ---------- reduction ----------
+    def subset(self, tree_ids):
+        """New CompiledForest with only the given trees (in that order)."""
+        ends = np.append(self.roots[1:], len(self.value))
+        parts, roots, off = [], [], 0
+        for t in tree_ids:
+            a, b = int(self.roots[t]), int(ends[t])
+            parts.append((a, b, off))
+            roots.append(off)
+            off += b - a
+        cat = lambda arr: np.concatenate([arr[a:b] for a, b, _ in parts])
+        children = np.concatenate([self.children[a:b] - a + o for a, b, o in parts]).astype(np.int32)
+        meta = {**self.meta, "n_trees": len(tree_ids), "tree_ids": [int(t) for t in tree_ids]}
+        return CompiledForest(meta, np.array(roots, dtype=np.int32), cat(self.feature), cat(self.threshold),
+                              children, cat(self.value))
+
+    def quantized(self):
+        """float32 thresholds / leaf values, int16 split features.
+
+        Thresholds are rounded *down* to float32. Features are float32 and a split threshold
+        lies strictly below the next float32 feature value, so for every float32 x,
+        x <= t  <=>  x <= floor32(t): the traversal is unchanged; only leaf values round.
+        """
+        thr = self.threshold.astype(np.float32)
+        up = thr.astype(np.float64) > self.threshold
+        thr[up] = np.nextafter(thr[up], np.float32(-np.inf))
+        feature = self.feature.astype(np.int16) if self.n_columns < np.iinfo(np.int16).max else self.feature
+        meta = {**self.meta, "quantized": True}
+        return CompiledForest(meta, self.roots, feature, thr, self.children, self.value.astype(np.float32))
+
+    # ---------- persistence ----------
+    def save(self, path=COMPILED_FILE):
+        tmp = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp, roots=self.roots, feature=self.feature, threshold=self.threshold,
+                 children=self.children, value=self.value, meta=np.array(json.dumps(self.meta)))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path=COMPILED_FILE, expected_hash=None):
+        with np.load(path, allow_pickle=False) as z:
+            meta = json.loads(str(z["meta"]))
+            if expected_hash is not None and meta.get("source_hash") != expected_hash:
+                raise ValueError(f"{path} was compiled from a different model (re-run compiled_forest.py)")
+            return cls(meta, z["roots"], z["feature"], z["threshold"], z["children"], z["value"])
+
+
+def _time_per_call(fn, repeat):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) / repeat
+
+
+def main(argv=None):
+    import dataset_store as store
+    from model_artifact import load_model
+
+    p = argparse.ArgumentParser(description="Compile the saved pipeline into flat arrays and verify it.")
+    p.add_argument("--model", default=MODEL_FILE)
+    p.add_argument("--output", default=COMPILED_FILE)
+    args = p.parse_args(argv)
+
+    pipeline = load_model(args.model)
+    compiled = compile_pipeline(pipeline, source_hash=file_digest(args.model))
+    compiled.save(args.output)
+
+    t0 = time.perf_counter()
+    compiled = CompiledForest.load(args.output)
+    t_load = time.perf_counter() - t0
+
+    X = store.load(DATASET)[FEATURES]
+    ref = pipeline.predict(X)
+    got = compiled.predict(X)
+    max_diff = float(np.abs(ref - got).max())
+
+    row = X.iloc[[0]]
+    row_cols = {c: row[c].to_numpy() for c in FEATURES}
+    sk_row = _time_per_call(lambda: pipeline.predict(row), 20)
+    cf_row = _time_per_call(lambda: compiled.predict(row_cols), 200)
+    sk_all = _time_per_call(lambda: pipeline.predict(X), 3)
+    cf_all = _time_per_call(lambda: compiled.predict(X), 3)
+
+    print(f"✅ Compiled {compiled.n_trees} trees ({len(compiled.value):,} nodes, depth <= {compiled.max_depth}) "
+          f"-> {args.output}")
+    print(f"Artifact: {os.path.getsize(args.output) / 1e6:.1f} MB (joblib {os.path.getsize(args.model) / 1e6:.1f} MB), "
+          f"load {t_load * 1000:.1f} ms")
+    print(f"Max |sklearn - compiled| over {len(X):,} rows: {max_diff:.2e}")
+    print(f"Single row: sklearn {sk_row * 1e6:,.0f} µs, compiled {cf_row * 1e6:,.0f} µs")
+    print(f"{len(X):,} rows: sklearn {sk_all * 1000:.1f} ms, compiled {cf_all * 1000:.1f} ms")
+    if max_diff > 1e-6:
+        raise SystemExit("compiled predictions do not match sklearn")
+
+
+if __name__ == "__main__":
+    main()
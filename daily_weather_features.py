@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Daily NASA POWER ingestion -> per-(State, Year) growing-season features, streamed.
+
+Daily data is pulled one state at a time in DAILY_CHUNK_YEARS-year requests and pushed
+through a generator pipeline:
+
+  fetch chunk (state, years)  ->  split into years  ->  season features  ->  CSV row
+
+Only the chunk being processed (and a few prefetched ones) is ever in memory, never the
+whole ~475k-rows-per-variable daily table.
+
+Features (growing season months only):
+  - gdd_growing               growing degree days, base 10°C / cap 30°C (corn 50/86°F method)
+  - heat_days_growing         days with T2M_MAX above HEAT_THRESHOLD_C
+  - max_dry_spell_growing     longest run of consecutive days with rain < DRY_DAY_MM
+  - total_rain_growing_exact  exact sum of daily PRECTOTCORR (mm)
+  - avg_temp_growing_daily    mean daily T2M
+  - days_observed             days with complete data
+
+OUTPUT FILE:
+  - usa_state_yearly_weather_daily_features_2000_2025.csv
+
+Run:
+  python daily_weather_features.py --workers 4
+"""
+
+import argparse
+import csv
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from download_us_weather_power import END_YEAR, START_YEAR, STATE_COORDS, select_states
+from power_cache import CACHE_DIR, PowerCache
+from power_client import (
+    BACKOFF_BASE_SEC,
+    MAX_RETRIES,
+    MAX_WORKERS,
+    POWER_FILL_VALUE,
+    SLEEP_SEC,
+    RateLimiter,
+    fetch_point_cached,
+    make_session,
+)
+from weather_features import GROWING_MONTHS
+
+# NASA POWER daily endpoint
+POWER_DAILY_URL = "https://power.larc.nasa.gov/api/temporal/daily/point"
+DAILY_PARAMS = ["T2M", "T2M_MAX", "T2M_MIN", "PRECTOTCORR"]
+
+# Years per daily request (keeps each payload / chunk small)
+DAILY_CHUNK_YEARS = 5
+
+
+GDD_BASE_C = 10.0
+GDD_CAP_C = 30.0
+HEAT_THRESHOLD_C = 35.0
+DRY_DAY_MM = 1.0
+
+OUTPUT_FILE = "usa_state_yearly_weather_daily_features_2000_2025.csv"
+FEATURE_COLUMNS = [
+    "State", "Year", "gdd_growing", "heat_days_growing", "max_dry_spell_growing",
+    "total_rain_growing_exact", "avg_temp_growing_daily", "days_observed",
+]
+
+
+# ==============================
+# Stage 1: fetch daily chunks, one state at a time
+# ==============================
+def year_chunks(start_year, end_year, chunk_years=DAILY_CHUNK_YEARS):
+    for y0 in range(start_year, end_year + 1, chunk_years):
+        yield y0, min(end_year, y0 + chunk_years - 1)
+
+
+def daily_payload_to_arrays(data):
+    """POWER daily payload -> (dates as datetime64[D], values (n_days, n_params)), fill -> NaN."""
+    keys = sorted(data[DAILY_PARAMS[0]].keys())
+    dates = pd.to_datetime(keys, format="%Y%m%d").to_numpy(dtype="datetime64[D]")
+    values = np.column_stack([
+        pd.to_numeric(pd.Series(data[p]).reindex(keys), errors="coerce").to_numpy(dtype=float)
+        for p in DAILY_PARAMS
+    ])
+    values[values == POWER_FILL_VALUE] = np.nan
+    return dates, values
+
+
+def iter_daily_chunks(states, start_year=START_YEAR, end_year=END_YEAR, chunk_years=DAILY_CHUNK_YEARS,
+                      max_workers=MAX_WORKERS, min_interval=SLEEP_SEC, max_retries=MAX_RETRIES,
+                      backoff_base=BACKOFF_BASE_SEC, url=POWER_DAILY_URL, cache=None, failed=None):
+    """
+    Yield (state, dates, values) per (state, year chunk), in state order.
+
+    Requests run on a thread pool but at most `max_workers` chunks are in flight / buffered,
+    so memory stays bounded regardless of how many states are requested. Chunks that still
+    fail after retries are appended to `failed` as (state, y0, y1, error) and skipped.
+    """
+    limiter = RateLimiter(min_interval)
+    session = make_session(max_workers)
+    jobs = ((st, y0, y1) for st in states for y0, y1 in year_chunks(start_year, end_year, chunk_years))
+
+    def fetch(job):
+        st, y0, y1 = job
+        lat, lon = STATE_COORDS[st]
+        data, _, _ = fetch_point_cached(
+            lat, lon, f"{y0}0101", f"{y1}1231", session=session, url=url, limiter=limiter, cache=cache,
+            max_retries=max_retries, backoff_base=backoff_base, params=",".join(DAILY_PARAMS),
+        )
+        return daily_payload_to_arrays(data)
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        in_flight = deque()
+        for job in jobs:
+            in_flight.append((job, pool.submit(fetch, job)))
+            if len(in_flight) >= max(1, max_workers):
+                yield from _drain_one(in_flight, failed)
+        while in_flight:
+            yield from _drain_one(in_flight, failed)
+    session.close()
+
+
+def _drain_one(in_flight, failed):
+    (st, y0, y1), fut = in_flight.popleft()
+    try:
+        dates, values = fut.result()
+    except Exception as e:
+        print(f"FAIL {st} {y0}-{y1}: {e}")
+        if failed is not None:
+            failed.append((st, y0, y1, str(e)))
+        return
+    yield st, dates, values
+
+
+# ==============================
+# Stage 2: split chunks into growing seasons
+# ==============================
+def iter_growing_seasons(chunks, growing_months=GROWING_MONTHS):
+    """Yield (state, year, values) with only the growing-season days of each year."""
+    months = np.asarray(growing_months)
+    for st, dates, values in chunks:
+        years = dates.astype("datetime64[Y]").astype(int) + 1970
+        month = dates.astype("datetime64[M]").astype(int) % 12 + 1
+        in_season = np.isin(month, months)
+        for year in np.unique(years):
+            sel = in_season & (years == year)
+            yield st, int(year), values[sel]
+
+
+# ==============================
+# Stage 3: per-season features (vectorized over days)
+# ==============================
+def longest_run(mask):
+    """Length of the longest run of True values in a 1-D boolean array."""
+    if not mask.any():
+        return 0
+    padded = np.concatenate(([False], mask, [False])).astype(np.int8)
+    edges = np.flatnonzero(np.diff(padded))
+    return int((edges[1::2] - edges[0::2]).max())
+
+
+def growing_degree_days(tmax, tmin, base=GDD_BASE_C, cap=GDD_CAP_C):
+    """Daily GDD with the modified (capped) method: both temperatures clipped to [base, cap]."""
+    tmax = np.clip(tmax, base, cap)
+    tmin = np.clip(tmin, base, cap)
+    return (tmax + tmin) / 2.0 - base
+
+
+def season_features(state, year, values, heat_threshold=HEAT_THRESHOLD_C, dry_day_mm=DRY_DAY_MM):
+    t2m, tmax, tmin, prcp = values.T
+    complete = ~np.isnan(values).any(axis=1)
+    dry = (prcp < dry_day_mm) & ~np.isnan(prcp)
+    return {
+        "State": state,
+        "Year": year,
+        "gdd_growing": round(float(np.nansum(growing_degree_days(tmax, tmin))), 2),
+        "heat_days_growing": int(np.sum(tmax > heat_threshold)),
+        "max_dry_spell_growing": longest_run(dry),
+        "total_rain_growing_exact": round(float(np.nansum(prcp)), 2),
+        "avg_temp_growing_daily": round(float(np.nanmean(t2m)), 4) if (~np.isnan(t2m)).any() else np.nan,
+        "days_observed": int(complete.sum()),
+    }
+
+
+def iter_features(seasons, heat_threshold=HEAT_THRESHOLD_C, dry_day_mm=DRY_DAY_MM):
+    for st, year, values in seasons:
+        yield season_features(st, year, values, heat_threshold=heat_threshold, dry_day_mm=dry_day_mm)
+
+
+# ==============================
+# Stage 4: stream rows to CSV
+# ==============================
+def write_rows(rows, path):
+    n = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=FEATURE_COLUMNS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            n += 1
+    return n
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Daily POWER weather -> growing-season features per (State, Year).")
+    p.add_argument("--workers", type=int, default=MAX_WORKERS)
+    p.add_argument("--min-interval", type=float, default=SLEEP_SEC)
+    p.add_argument("--retries", type=int, default=MAX_RETRIES)
+    p.add_argument("--power-url", default=POWER_DAILY_URL)
+    p.add_argument("--start-year", type=int, default=START_YEAR)
+    p.add_argument("--end-year", type=int, default=END_YEAR)
+    p.add_argument("--chunk-years", type=int, default=DAILY_CHUNK_YEARS)
+    p.add_argument("--heat-threshold", type=float, default=HEAT_THRESHOLD_C, help="°C, daily max")
+    p.add_argument("--dry-day-mm", type=float, default=DRY_DAY_MM)
+    p.add_argument("--no-cache", action="store_true")
+    p.add_argument("--cache-dir", default=CACHE_DIR)
+    p.add_argument("--output", default=OUTPUT_FILE)
+    return p.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    states_to_use = select_states()
+    cache = None if args.no_cache else PowerCache(args.cache_dir)
+
+    failed = []
+    t0 = time.perf_counter()
+    chunks = iter_daily_chunks(
+        states_to_use, args.start_year, args.end_year, chunk_years=args.chunk_years,
+        max_workers=args.workers, min_interval=args.min_interval, max_retries=args.retries,
+        url=args.power_url, cache=cache, failed=failed,
+    )
+    seasons = iter_growing_seasons(chunks)
+    rows = iter_features(seasons, heat_threshold=args.heat_threshold, dry_day_mm=args.dry_day_mm)
+    n = write_rows(rows, args.output)
+
+    print(f"✅ Saved: {args.output} ({n} State-Year rows in {time.perf_counter() - t0:.1f}s)")
+    if failed:
+        print(f"Failed chunks ({len(failed)}):")
+        for st, y0, y1, err in failed:
+            print(f"  {st} {y0}-{y1}: {err}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Typed columnar dataset store for the pipeline's intermediate tables.
+
+Every dataset has one declared schema (categorical State, compact int Year/Month,
+float32 measures). The CSVs stay the interchange format; next to each one the store keeps
+an uncompressed Arrow/Feather copy under data_store/ that is read back memory-mapped, so
+numeric columns are zero-copy views of the file and the strip/upper/to_numeric cleanup
+runs once, when the copy is (re)built.
+
+A copy is rebuilt automatically whenever its CSV changes (size or mtime differs from what
+was recorded when the copy was written).
+
+Usage:
+  import dataset_store as store
+  df = store.load("final_fixed")
+  store.save("final_fixed", df)     # writes the CSV and refreshes the columnar copy
+"""
+
+import json
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+STORE_DIR = "data_store"
+SCHEMA_VERSION = 1
+
+_GROWING = {"avg_temp_growing": "float32", "total_rain_growing": "float32"}
+
+# name -> (csv path, {column: dtype}) ; column order = output order
+DATASETS = {
+    "yield_clean": ("usda_corn_yield_clean.csv", {
+        "Year": "int16", "State": "category", "corn_yield_bu_acre": "float32",
+    }),
+    "weather_monthly": ("usa_state_monthly_weather_2000_2025.csv", {
+        "State": "category", "Year": "int16", "Month": "int8", "T2M": "float32", "PRECTOTCORR": "float32",
+    }),
+    "weather_growing": ("usa_state_yearly_weather_growing_2000_2025.csv", {
+        "State": "category", "Year": "int16", **_GROWING,
+    }),
+    "final": ("final_corn_yield_weather.csv", {
+        "Year": "int16", "State": "category", "corn_yield_bu_acre": "float32", **_GROWING,
+    }),
+    "final_fixed": ("final_corn_yield_weather_fixed.csv", {
+        "Year": "int16", "State": "category", "corn_yield_bu_acre": "float32", **_GROWING,
+    }),
+}
+
+
+def csv_path(name):
+    return _spec(name)[0]
+
+
+def schema(name):
+    return dict(_spec(name)[1])
+
+
+def _spec(name):
+    if name not in DATASETS:
+        raise KeyError(f"Unknown dataset '{name}'. Known: {sorted(DATASETS)}")
+    return DATASETS[name]
+
+
+def _store_path(name, store_dir):
+    return os.path.join(store_dir, f"{name}.feather")
+
+
+def _source_stamp(path):
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "schema_version": SCHEMA_VERSION}
+
+
+# ==============================
+# Schema enforcement (the one place the cleanup happens)
+# ==============================
+def apply_schema(df, name):
+    """Validate columns, normalise State, coerce numerics, drop incomplete rows, cast to schema."""
+    return _cast(_clean(df, name), name)
+
+
+def _clean(df, name):
+    """apply_schema without the final cast: numerics stay at the precision they were computed in."""
+    cols = schema(name)
+    missing = [c for c in cols if c not in df.columns]
+    if missing:
+        raise ValueError(f"{name}: missing column(s) {missing}. Found: {list(df.columns)}")
+    df = df[list(cols)].copy()
+    for c, dtype in cols.items():
+        if dtype == "category":
+            df[c] = df[c].astype(str).str.strip().str.upper()
+        else:
+            df[c] = pd.to_numeric(df[c], errors="coerce")
+    return df.dropna(subset=list(cols)).reset_index(drop=True)
+
+
+def _cast(df, name):
+    for c, dtype in schema(name).items():
+        df[c] = df[c].astype(dtype)
+    return df
+
+
+# ==============================
+# Read / write
+# ==============================
+def _write_columnar(name, df, stamp, store_dir):
+    os.makedirs(store_dir, exist_ok=True)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        b"dataset_store": json.dumps(stamp).encode("utf-8"),
+    })
+    path = _store_path(name, store_dir)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    feather.write_feather(table, tmp, compression="uncompressed")
+    os.replace(tmp, path)
+
+
+def _read_columnar(path, columns=None):
+    """Memory-mapped read; returns (DataFrame, stamp). Numeric columns are views of the file."""
+    with pa.memory_map(path, "r") as source:
+        table = pa.ipc.open_file(source).read_all()
+    if columns is not None:
+        table = table.select(columns)
+    meta = (table.schema.metadata or {}).get(b"dataset_store")
+    stamp = json.loads(meta) if meta else None
+    return table.to_pandas(split_blocks=True), stamp
+
+
+def is_fresh(name, store_dir=STORE_DIR):
+    path = _store_path(name, store_dir)
+    if not os.path.exists(path):
+        return False
+    src = csv_path(name)
+    if not os.path.exists(src):
+        return True  # columnar copy is all we have
+    with pa.memory_map(path, "r") as source:
+        meta = (pa.ipc.open_file(source).schema.metadata or {}).get(b"dataset_store")
+    return bool(meta) and json.loads(meta) == _source_stamp(src)
+
+
+def load(name, columns=None, store_dir=STORE_DIR, exact=False):
+    """
+    Load a dataset with its declared dtypes, (re)building the columnar copy if the CSV changed.
+    exact=True parses the CSV and keeps measures at float64 instead (no columnar read), for
+    stages that compute and write interchange CSVs from the result.
+    """
+    if exact:
+        df = _clean(pd.read_csv(csv_path(name)), name)
+        return df[columns] if columns is not None else df
+    if is_fresh(name, store_dir):
+        df, _ = _read_columnar(_store_path(name, store_dir), columns)
+        return df
+    src = csv_path(name)
+    df = apply_schema(pd.read_csv(src), name)
+    try:
+        _write_columnar(name, df, _source_stamp(src), store_dir)
+    except OSError as e:  # read-only checkout etc.: still serve the parsed frame
+        print(f"⚠️ dataset_store: could not write columnar copy of {name}: {e}")
+    return df[columns] if columns is not None else df
+
+
+def save(name, df, store_dir=STORE_DIR, write_csv=True):
+    """
+    Write a dataset: CSV (interchange) + columnar copy stamped against that CSV. The CSV is
+    written before the float32 cast so its values are not rounded; only the copy is compact.
+    """
+    df = _clean(df, name)
+    src = csv_path(name)
+    if write_csv:
+        df.to_csv(src, index=False)
+    df = _cast(df, name)
+    _write_columnar(name, df, _source_stamp(src), store_dir)
+    return df
@@ -1,6 +1,52 @@
-import pandas as pd
-import requests
+"""
+Download NASA POWER monthly weather (T2M, PRECTOTCORR) for every state centroid.
+
+States are fetched concurrently by a small thread pool. All workers share one
+rate limiter, and failed requests are retried with exponential backoff (see power_client.py).
+
+OUTPUT FILES:
+  - usa_state_monthly_weather_2000_2025.csv
+  - usa_state_yearly_weather_growing_2000_2025.csv   (not with --skip-growing)
+  - power_fetch_report.csv   (one row per state: status, attempts, seconds, error)
+
+Responses are cached on disk (see power_cache.py). With --incremental only the years
+that still have missing months in the existing monthly file are requested, and the
+result is merged into that file instead of replacing it.
+
+With --grid N (or --points-file) each state is sampled at many points instead of its
+centroid and the points are reduced to state-month means (see spatial_sampling.py);
+the output schema is unchanged.
+
+Run:
+  python download_us_weather_power.py --workers 4
+  python download_us_weather_power.py --incremental
+  python download_us_weather_power.py --grid 5 --workers 8
+"""
+
+import argparse
+import datetime
+import os
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+from instrumentation import span
+from power_cache import CACHE_DIR, CACHE_MAX_ENTRIES, CACHE_TTL_SEC, RECENT_TTL_SEC, PowerCache
+from power_client import (
+    BACKOFF_BASE_SEC,
+    MAX_RETRIES,
+    MAX_WORKERS,
+    POWER_FILL_VALUE,
+    POWER_URL,
+    SLEEP_SEC,
+    RateLimiter,
+    fetch_point_cached,
+    make_session,
+    month_axis,
+    power_to_array,
+)
+from weather_features import GROWING_MONTHS
 
 # ==============================
 # CONFIG
@@ -8,19 +54,9 @@ import time
 START_YEAR = 2000
 END_YEAR   = 2025
 
-# NASA POWER monthly endpoint
-POWER_URL = "https://power.larc.nasa.gov/api/temporal/monthly/point"
-
-# Variables:
-# T2M = Temperature at 2m (°C)
-# PRECTOTCORR = Corrected precipitation (mm)
-PARAMS = "T2M,PRECTOTCORR"
-
-# Growing season months (corn typical): Apr-Sep
-GROWING_MONTHS = [4,5,6,7,8,9]
-
-# Polite delay between requests
-SLEEP_SEC = 0.25
+MONTHLY_OUT = "usa_state_monthly_weather_2000_2025.csv"
+GROWING_OUT = "usa_state_yearly_weather_growing_2000_2025.csv"
+FETCH_REPORT_OUT = "power_fetch_report.csv"
 
 # ==============================
 # STATE CENTROID COORDS (lat, lon)
@@ -85,89 +121,262 @@ STATE_COORDS = {
 # ==============================
 YIELD_FILE = "usda_corn_yield_clean.csv"  # change if needed
 
-try:
-    y = pd.read_csv(YIELD_FILE)
-    y["State"] = y["State"].astype(str).str.strip().str.upper()
-    states_to_use = sorted(set(y["State"]) & set(STATE_COORDS.keys()))
-    missing = sorted(set(y["State"]) - set(STATE_COORDS.keys()))
-    if missing:
-        print("⚠️ Missing coords for these states (will be skipped):", missing[:10], "..." if len(missing)>10 else "")
-    print(f"Using {len(states_to_use)} states from yield file.")
-except Exception as e:
-    print("Could not read yield file; using ALL states in STATE_COORDS. Error:", e)
-    states_to_use = sorted(STATE_COORDS.keys())
+
+def select_states(yield_file=YIELD_FILE):
+    try:
+        y = pd.read_csv(yield_file)
+        y["State"] = y["State"].astype(str).str.strip().str.upper()
+        states_to_use = sorted(set(y["State"]) & set(STATE_COORDS.keys()))
+        missing = sorted(set(y["State"]) - set(STATE_COORDS.keys()))
+        if missing:
+            print("⚠️ Missing coords for these states (will be skipped):", missing[:10], "..." if len(missing)>10 else "")
+        print(f"Using {len(states_to_use)} states from yield file.")
+    except Exception as e:
+        print("Could not read yield file; using ALL states in STATE_COORDS. Error:", e)
+        states_to_use = sorted(STATE_COORDS.keys())
+    return states_to_use
+
 
 # ==============================
 # Fetch NASA POWER monthly weather
 # ==============================
-def fetch_power_monthly(lat, lon, start_year, end_year):
-    params = {
-        "latitude": lat,
-        "longitude": lon,
-        "start": start_year,
-        "end": end_year,
-        "community": "AG",
-        "parameters": PARAMS,
-        "format": "JSON",
-    }
-    r = requests.get(POWER_URL, params=params, timeout=40)
-    r.raise_for_status()
-    return r.json()["properties"]["parameter"]
-
-rows = []
-failed = []
-
-for i, st in enumerate(states_to_use, start=1):
-    lat, lon = STATE_COORDS[st]
-    try:
-        data = fetch_power_monthly(lat, lon, START_YEAR, END_YEAR)
-        t2m = data["T2M"]
-        pr  = data["PRECTOTCORR"]
-
-        for year in range(START_YEAR, END_YEAR + 1):
-            for month in range(1, 13):
-                key = f"{year}{month:02d}"
-                rows.append({
-                    "State": st,
-                    "Year": year,
-                    "Month": month,
-                    "T2M": t2m.get(key),
-                    "PRECTOTCORR": pr.get(key),
-                })
-
-        print(f"[{i}/{len(states_to_use)}] OK {st}")
-        time.sleep(SLEEP_SEC)
+def power_to_frame(state, data, start_year, end_year):
+    """Turn one POWER `parameter` payload into a (State, Year, Month, T2M, PRECTOTCORR) frame."""
+    years, months = month_axis(start_year, end_year)
+    values = power_to_array(data, start_year, end_year)
+    return pd.DataFrame({
+        "State": state,
+        "Year": years,
+        "Month": months,
+        "T2M": values[:, 0],
+        "PRECTOTCORR": values[:, 1],
+    })
 
-    except Exception as e:
-        print(f"[{i}/{len(states_to_use)}] FAIL {st}: {e}")
-        failed.append((st, str(e)))
 
-weather_df = pd.DataFrame(rows)
+def fetch_states(states, start_year=START_YEAR, end_year=END_YEAR, max_workers=MAX_WORKERS,
+                 min_interval=SLEEP_SEC, max_retries=MAX_RETRIES, backoff_base=BACKOFF_BASE_SEC,
+                 url=POWER_URL, coords=None, cache=None, year_ranges=None):
+    """
+    Fetch monthly weather for `states` concurrently.
+
+    Returns (weather_df, report_df). Each state's rows are converted to a frame
+    as soon as its response lands; report_df has one row per state with
+    status ("ok"/"cached"/"failed"), attempts, seconds and error.
 
-# Clean numeric
-weather_df["T2M"] = pd.to_numeric(weather_df["T2M"], errors="coerce")
-weather_df["PRECTOTCORR"] = pd.to_numeric(weather_df["PRECTOTCORR"], errors="coerce")
+    `year_ranges` optionally maps a state to its own (start_year, end_year);
+    `cache` is a PowerCache consulted before any request is made.
+    """
+    coords = coords or STATE_COORDS
+    year_ranges = year_ranges or {}
+    limiter = RateLimiter(min_interval)
+    frames = []
+    report = []
+    session = make_session(max_workers)
 
-# Save monthly
-weather_df.to_csv("usa_state_monthly_weather_2000_2025.csv", index=False)
+    def fetch_one(st):
+        lat, lon = coords[st]
+        y0, y1 = year_ranges.get(st, (start_year, end_year))
+        t0 = time.perf_counter()
+        try:
+            data, status, attempts = fetch_point_cached(
+                lat, lon, y0, y1, session=session, url=url, limiter=limiter, cache=cache,
+                max_retries=max_retries, backoff_base=backoff_base,
+            )
+            frame = power_to_frame(st, data, y0, y1)
+            return frame, {"State": st, "status": status, "attempts": attempts,
+                           "seconds": round(time.perf_counter() - t0, 3), "error": ""}
+        except Exception as e:
+            return None, {"State": st, "status": "failed", "attempts": getattr(e, "attempts", 1),
+                          "seconds": round(time.perf_counter() - t0, 3), "error": str(e)}
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        futures = [pool.submit(fetch_one, st) for st in states]
+        for i, fut in enumerate(as_completed(futures), start=1):
+            frame, rec = fut.result()
+            report.append(rec)
+            if frame is not None:
+                frames.append(frame)
+                print(f"[{i}/{len(states)}] {rec['status'].upper()} {rec['State']} "
+                      f"({rec['attempts']} attempt(s), {rec['seconds']}s)")
+            else:
+                print(f"[{i}/{len(states)}] FAIL {rec['State']}: {rec['error']}")
+    session.close()
+
+    columns = ["State", "Year", "Month", "T2M", "PRECTOTCORR"]
+    weather_df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+    weather_df = weather_df.sort_values(["State", "Year", "Month"]).reset_index(drop=True)
+    report_df = pd.DataFrame(report, columns=["State", "status", "attempts", "seconds", "error"])
+    report_df = report_df.sort_values("State").reset_index(drop=True)
+    return weather_df, report_df
+
+
+# ==============================
+# Incremental refresh
+# ==============================
+def valid_month_mask(weather_df):
+    """True where both variables are present and not the POWER fill value."""
+    mask = pd.Series(True, index=weather_df.index)
+    for c in ["T2M", "PRECTOTCORR"]:
+        v = pd.to_numeric(weather_df[c], errors="coerce")
+        mask &= v.notna() & (v != POWER_FILL_VALUE)
+    return mask
+
+
+def missing_year_ranges(existing_df, states, start_year=START_YEAR, end_year=END_YEAR, today=None):
+    """
+    For each state with missing (absent, NaN or fill-value) months, return the
+    (first year with a gap, end_year) range to request. POWER's monthly endpoint
+    is year-granular, so this is the smallest request that covers the gaps.
+    Months after `today` cannot exist yet and are not counted as missing.
+    """
+    today = today or datetime.date.today()
+    last_period = min(end_year * 12 + 11, today.year * 12 + today.month - 1)
+
+    grid = pd.MultiIndex.from_product(
+        [states, range(start_year, end_year + 1), range(1, 13)], names=["State", "Year", "Month"]
+    ).to_frame(index=False)
+    grid = grid[grid["Year"] * 12 + grid["Month"] - 1 <= last_period]
+
+    have = existing_df.loc[valid_month_mask(existing_df), ["State", "Year", "Month"]]
+    have = have.assign(_have=True).drop_duplicates(["State", "Year", "Month"])
+    gaps = grid.merge(have, on=["State", "Year", "Month"], how="left")
+    gaps = gaps[gaps["_have"].isna()]
+
+    first_gap = gaps.groupby("State")["Year"].min()
+    return {st: (int(y), end_year) for st, y in first_gap.items()}
+
+
+def merge_incremental(existing_df, new_df):
+    """Rows in new_df replace the same (State, Year, Month) rows of existing_df."""
+    keys = ["State", "Year", "Month"]
+    if new_df.empty:
+        return existing_df.sort_values(keys).reset_index(drop=True)
+    existing_df = existing_df.copy()
+    existing_df["State"] = existing_df["State"].astype(str).str.strip().str.upper()
+    stale = existing_df.set_index(keys).index.isin(new_df.set_index(keys).index)
+    merged = pd.concat([existing_df[~stale], new_df], ignore_index=True)
+    return merged.sort_values(keys).reset_index(drop=True)
 
-print("\nMonthly weather shape:", weather_df.shape)
-print("Failed states:", failed[:5], "..." if len(failed)>5 else "")
 
 # ==============================
 # Growing season aggregation (Apr-Sep)
 # ==============================
-weather_growing = (
-    weather_df[weather_df["Month"].isin(GROWING_MONTHS)]
-    .groupby(["State", "Year"], as_index=False)
-    .agg(
-        avg_temp_growing=("T2M", "mean"),
-        total_rain_growing=("PRECTOTCORR", "sum"),
+def aggregate_growing(weather_df):
+    return (
+        weather_df[weather_df["Month"].isin(GROWING_MONTHS)]
+        .groupby(["State", "Year"], as_index=False)
+        .agg(
+            avg_temp_growing=("T2M", "mean"),
+            total_rain_growing=("PRECTOTCORR", "sum"),
+        )
     )
-)
 
-weather_growing.to_csv("usa_state_yearly_weather_growing_2000_2025.csv", index=False)
 
-print("Growing-season yearly weather shape:", weather_growing.shape)
-weather_growing.head()
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Download NASA POWER monthly weather per state.")
+    p.add_argument("--workers", type=int, default=MAX_WORKERS, help="concurrent requests (1 = sequential)")
+    p.add_argument("--min-interval", type=float, default=SLEEP_SEC, help="min seconds between request starts")
+    p.add_argument("--retries", type=int, default=MAX_RETRIES, help="retries per state after the first attempt")
+    p.add_argument("--backoff", type=float, default=BACKOFF_BASE_SEC, help="base backoff seconds")
+    p.add_argument("--power-url", default=POWER_URL, help="POWER endpoint (override for a local stand-in server)")
+    p.add_argument("--start-year", type=int, default=START_YEAR)
+    p.add_argument("--end-year", type=int, default=END_YEAR)
+    p.add_argument("--incremental", action="store_true",
+                   help=f"only request months missing from {MONTHLY_OUT} and merge into it")
+    p.add_argument("--no-cache", action="store_true", help="bypass the on-disk response cache")
+    p.add_argument("--cache-dir", default=CACHE_DIR)
+    p.add_argument("--cache-ttl-hours", type=float, default=CACHE_TTL_SEC / 3600)
+    p.add_argument("--cache-recent-ttl-hours", type=float, default=RECENT_TTL_SEC / 3600,
+                   help="TTL for responses reaching the current or previous year (0 = always refetch)")
+    p.add_argument("--cache-max-entries", type=int, default=CACHE_MAX_ENTRIES)
+    p.add_argument("--skip-growing", action="store_true",
+                   help=f"do not write {GROWING_OUT} (run_pipeline.py's merge stage builds it)")
+    p.add_argument("--grid", type=int, default=1,
+                   help="sample an N x N grid of points per state instead of the centroid")
+    p.add_argument("--points-file", default=None,
+                   help="CSV of State,lat,lon,weight sample points (e.g. cropland-weighted)")
+    p.add_argument("--batch-states", type=int, default=None,
+                   help="states aggregated together in multi-point mode (default: spatial_sampling.BATCH_STATES)")
+    return p.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    states_to_use = select_states()
+
+    cache = None
+    if not args.no_cache:
+        cache = PowerCache(args.cache_dir, ttl_sec=args.cache_ttl_hours * 3600,
+                           max_entries=args.cache_max_entries,
+                           recent_ttl_sec=args.cache_recent_ttl_hours * 3600)
+
+    existing_df = None
+    year_ranges = None
+    if args.incremental and os.path.exists(MONTHLY_OUT):
+        with span("load_existing") as sp:
+            existing_df = pd.read_csv(MONTHLY_OUT)
+            year_ranges = missing_year_ranges(existing_df, states_to_use, args.start_year, args.end_year)
+            sp.rows = len(existing_df)
+        print(f"Incremental mode: {len(year_ranges)}/{len(states_to_use)} states have missing months.")
+        states_to_use = sorted(year_ranges)
+    elif args.incremental:
+        print(f"Incremental mode: {MONTHLY_OUT} not found, doing a full download.")
+
+    t0 = time.perf_counter()
+    with span("fetch", states=len(states_to_use)) as sp:
+        if args.grid > 1 or args.points_file:
+            from spatial_sampling import BATCH_STATES, fetch_states_multipoint, grid_points, load_points_file
+
+            if args.points_file:
+                points = load_points_file(args.points_file, states=states_to_use)
+            else:
+                points = grid_points(states_to_use, n_per_side=args.grid)
+            print(f"Multi-point mode: {len(points)} points for {points['State'].nunique()} states.")
+            weather_df, report_df = fetch_states_multipoint(
+                points, args.start_year, args.end_year, year_ranges=year_ranges,
+                batch_states=args.batch_states or BATCH_STATES, max_workers=args.workers, min_interval=args.min_interval,
+                max_retries=args.retries, backoff_base=args.backoff, url=args.power_url, cache=cache,
+            )
+        else:
+            weather_df, report_df = fetch_states(
+                states_to_use, args.start_year, args.end_year,
+                max_workers=args.workers, min_interval=args.min_interval,
+                max_retries=args.retries, backoff_base=args.backoff, url=args.power_url,
+                cache=cache, year_ranges=year_ranges,
+            )
+        sp.rows = len(weather_df)
+    elapsed = time.perf_counter() - t0
+
+    if existing_df is not None:
+        print(f"Fetched {len(weather_df)} monthly rows; merging into {len(existing_df)} existing rows.")
+        with span("merge_incremental") as sp:
+            weather_df = merge_incremental(existing_df, weather_df)
+            sp.rows = len(weather_df)
+
+    # Save monthly
+    with span("save_monthly", rows=len(weather_df)):
+        weather_df.to_csv(MONTHLY_OUT, index=False)
+        report_df.to_csv(FETCH_REPORT_OUT, index=False)
+
+    failed = report_df[report_df["status"] == "failed"]
+    print("\nMonthly weather shape:", weather_df.shape)
+    print(f"Fetched {len(report_df) - len(failed)}/{len(report_df)} states in {elapsed:.1f}s "
+          f"({args.workers} worker(s)); report: {FETCH_REPORT_OUT}")
+    if cache is not None:
+        print(f"Cache: {cache.hits} hit(s), {cache.misses} miss(es) in {args.cache_dir}")
+    if len(failed):
+        print("Failed states:")
+        print(failed[["State", "attempts", "error"]].to_string(index=False))
+
+    if args.skip_growing:
+        return
+    with span("aggregate_growing", rows=len(weather_df)):
+        weather_growing = aggregate_growing(weather_df)
+    with span("save_growing", rows=len(weather_growing)):
+        weather_growing.to_csv(GROWING_OUT, index=False)
+
+    print("Growing-season yearly weather shape:", weather_growing.shape)
+
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""
+Rendered-figure cache for the dashboard's analysis tabs.
+
+Every plot is rendered once to PNG bytes and stored under .cache/figures/, keyed by
+(model hash, dataset hash, state, plot type); global plots use state "*" and the per-state
+trend, which does not depend on the model, is keyed without a model hash. Reruns and other
+sessions show the cached image instead of re-plotting. The cache keeps at most
+`max_entries` files and evicts the least recently used ones (by file mtime, refreshed on hit).
+
+Figures are built with the object-oriented matplotlib API (matplotlib.figure.Figure), so
+nothing is registered with pyplot and nothing accumulates in long-running servers.
+
+Run (pre-render every plot for the current model + dataset, e.g. at deploy time):
+  python figure_cache.py
+"""
+
+import argparse
+import hashlib
+import io
+import os
+import threading
+import time
+
+from model_config import CACHE_DIR, TARGET, TEST_END, TEST_START
+
+FIGURE_DIR = os.path.join(CACHE_DIR, "figures")
+FIGURE_MAX_ENTRIES = 1000
+FIGURE_DPI = 100
+
+PLOT_TYPES = ["actual_vs_predicted", "residuals", "feature_importance", "trend", "sensitivity"]
+GLOBAL = "*"
+
+
+# ==============================
+# Renderers: data -> PNG bytes
+# ==============================
+def _png(fig):
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", dpi=FIGURE_DPI, bbox_inches="tight")
+    return buf.getvalue()
+
+
+def _figure(figsize):
+    from matplotlib.figure import Figure  # imported on first render only
+
+    fig = Figure(figsize=figsize)
+    return fig, fig.add_subplot()
+
+
+def render_actual_vs_predicted(y_test, y_pred):
+    fig, ax = _figure((5.5, 5.2))
+    ax.scatter(y_test, y_pred, alpha=0.45)
+    mn, mx = float(y_test.min()), float(y_test.max())
+    ax.plot([mn, mx], [mn, mx], "r--")
+    ax.set_xlabel("Actual Yield (bu/acre)")
+    ax.set_ylabel("Predicted Yield (bu/acre)")
+    ax.set_title(f"Actual vs Predicted (Test Years {TEST_START}–{TEST_END})")
+    return _png(fig)
+
+
+def render_residuals(y_test, y_pred):
+    fig, ax = _figure((6.2, 4.2))
+    ax.scatter(y_pred, y_test - y_pred, alpha=0.45)
+    ax.axhline(0, color="red")
+    ax.set_xlabel("Predicted Yield (bu/acre)")
+    ax.set_ylabel("Residual (Actual − Predicted)")
+    ax.set_title(f"Residual Plot (Test Years {TEST_START}–{TEST_END})")
+    return _png(fig)
+
+
+def render_feature_importance(fi):
+    fig, ax = _figure((7, 4.2))
+    ax.barh(fi["Feature"][::-1], fi["Importance"][::-1])
+    ax.set_title("Top 15 Feature Importances")
+    return _png(fig)
+
+
+def render_trend(state, trend):
+    fig, ax = _figure((10, 3.2))
+    ax.plot(trend["Year"], trend[TARGET])
+    ax.set_xlabel("Year")
+    ax.set_ylabel("Corn Yield (bu/acre)")
+    ax.set_title(f"{state} - Corn Yield Over Time")
+    return _png(fig)
+
+
+def render_sensitivity(state, year, temps, rains, Z):
+    fig, ax = _figure((7, 4.6))
+    cs = ax.contourf(temps, rains, Z, levels=20, cmap="viridis")
+    ax.contour(temps, rains, Z, levels=10, colors="k", linewidths=0.4, alpha=0.5)
+    fig.colorbar(cs, ax=ax, label="Predicted Yield (bu/acre)")
+    ax.set_xlabel("Avg Temp (Growing Season) [°C]")
+    ax.set_ylabel("Total Rain (Growing Season) [mm]")
+    ax.set_title(f"{state} {year} - Yield Sensitivity")
+    return _png(fig)
+
+
+def render_waterfall(title, base_value, contributions):
+    """contributions: [(label, SHAP value)], stacked from base_value to the prediction."""
+    fig, ax = _figure((7, 0.6 * len(contributions) + 1.6))
+    start, ends = base_value, [base_value]
+    for i, (_, value) in enumerate(contributions):
+        ax.barh(i, value, left=start, color="tab:red" if value >= 0 else "tab:blue")
+        ax.text(start + value, i, f" {value:+.1f} ", va="center", ha="left" if value >= 0 else "right")
+        start += value
+        ends.append(start)
+    pad = 0.15 * (max(ends) - min(ends)) or 1.0
+    ax.set_xlim(min(ends) - pad, max(ends) + pad)
+    ax.axvline(base_value, color="grey", linestyle="--", linewidth=0.8)
+    ax.axvline(start, color="black", linewidth=0.8)
+    ax.set_yticks(range(len(contributions)), [label for label, _ in contributions])
+    ax.invert_yaxis()
+    ax.set_xlabel(f"Predicted Yield (bu/acre): E[f] = {base_value:.1f} → f(x) = {start:.1f}")
+    ax.set_title(title)
+    return _png(fig)
+
+
+def feature_importance_table(model, top=15):
+    """Top `top` pipeline features by impurity importance (raises if not a fitted Pipeline)."""
+    import pandas as pd
+
+    feature_names = model.named_steps["preprocessor"].get_feature_names_out()
+    importances = model.named_steps["model"].feature_importances_
+    fi = pd.DataFrame({"Feature": feature_names, "Importance": importances})
+    return fi.sort_values("Importance", ascending=False).head(top)
+
+
+# ==============================
+# Disk cache
+# ==============================
+def figure_key(model_hash, data_hash, state, plot_type):
+    raw = "|".join([model_hash or "-", data_hash or "-", state, plot_type])
+    return f"{plot_type}_{hashlib.sha256(raw.encode('utf-8')).hexdigest()[:24]}"
+
+
+class FigureCache:
+    """PNG-file cache with LRU eviction (by file mtime)."""
+
+    def __init__(self, cache_dir=FIGURE_DIR, max_entries=FIGURE_MAX_ENTRIES):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.png")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                png = f.read()
+            os.utime(path)  # mark as recently used
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return png
+
+    def put(self, key, png):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(png)
+        os.replace(tmp, path)
+        self.evict()
+
+    def get_or_render(self, key, render):
+        """Cached PNG bytes, calling render() (-> bytes) on a miss; write errors are not fatal."""
+        png = self.get(key)
+        if png is None:
+            png = render()
+            try:
+                self.put(key, png)
+            except OSError as e:
+                print(f"⚠️ figure_cache: could not write {key}: {e}")
+        return png
+
+    def evict(self):
+        if self.max_entries is None:
+            return
+        with self._lock:
+            entries = []
+            for name in os.listdir(self.cache_dir):
+                if not name.endswith(".png"):
+                    continue
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    entries.append((os.stat(path).st_mtime, path))
+                except OSError:
+                    continue
+            if len(entries) > self.max_entries:
+                entries.sort()
+                for _, path in entries[: len(entries) - self.max_entries]:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+
+
+# ==============================
+# Pre-render
+# ==============================
+def prerender(cache, model_hash, data_hash, evaluation, index, model=None):
+    """Render the global plots and every state's trend; returns the number of new images."""
+    y_test, y_pred = evaluation["y_test"], evaluation["y_pred"]
+    jobs = [
+        (GLOBAL, "actual_vs_predicted", lambda: render_actual_vs_predicted(y_test, y_pred)),
+        (GLOBAL, "residuals", lambda: render_residuals(y_test, y_pred)),
+    ]
+    if model is not None:
+        jobs.append((GLOBAL, "feature_importance", lambda: render_feature_importance(feature_importance_table(model))))
+    for st in index.states:
+        jobs.append((st, "trend", lambda st=st: render_trend(st, index.frame(st))))
+
+    misses = cache.misses
+    for state, plot_type, render in jobs:
+        key_model = None if plot_type == "trend" else model_hash  # trends depend on the dataset only
+        cache.get_or_render(figure_key(key_model, data_hash, state, plot_type), render)
+    return cache.misses - misses
+
+
+def main(argv=None):
+    import dataset_store as store
+    import model_evaluation
+    from fingerprint import cached_file_digest
+    from model_artifact import load_model
+    from model_config import DATASET, MODEL_FILE
+    from state_index import StateIndex
+
+    p = argparse.ArgumentParser(description="Pre-render the dashboard figures for the current model + dataset.")
+    p.add_argument("--cache-dir", default=FIGURE_DIR)
+    p.add_argument("--max-entries", type=int, default=FIGURE_MAX_ENTRIES)
+    args = p.parse_args(argv)
+
+    t0 = time.perf_counter()
+    model_hash = cached_file_digest(MODEL_FILE)
+    data_hash = cached_file_digest(store.csv_path(DATASET))
+    model = load_model(MODEL_FILE)
+    df = store.load(DATASET)
+    evaluation = model_evaluation.get_evaluation(model_hash, data_hash, lambda: model, lambda: df)
+
+    cache = FigureCache(args.cache_dir, args.max_entries)
+    rendered = prerender(cache, model_hash, data_hash, evaluation, StateIndex(df), model=model)
+    print(f"✅ Figures in {args.cache_dir}: {rendered} rendered, {cache.hits} already cached "
+          f"({time.perf_counter() - t0:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
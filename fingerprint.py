@@ -0,0 +1,45 @@
+"""
+Content fingerprints for files (pipeline skip checks, model/dataset cache keys).
+"""
+
+import hashlib
+import os
+
+CHUNK_BYTES = 1 << 20
+
+
+def file_digest(path, algo="sha256"):
+    """Hex digest of a file's bytes (None if the file does not exist)."""
+    if not os.path.exists(path):
+        return None
+    h = hashlib.new(algo)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(CHUNK_BYTES), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def combined_digest(paths, algo="sha256"):
+    """One digest over several files (order-sensitive; missing files count as empty markers)."""
+    h = hashlib.new(algo)
+    for p in paths:
+        h.update(p.encode("utf-8"))
+        h.update((file_digest(p, algo) or "<missing>").encode("utf-8"))
+    return h.hexdigest()
+
+
+_digest_memo = {}
+
+
+def cached_file_digest(path, algo="sha256"):
+    """file_digest memoised on (size, mtime): cheap to call on every app rerun."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    stamp = (path, algo, st.st_size, st.st_mtime_ns)
+    digest = _digest_memo.get(stamp)
+    if digest is None:
+        digest = file_digest(path, algo)
+        _digest_memo[stamp] = digest
+    return digest
@@ -1,58 +1,29 @@
-import pandas as pd
-import calendar
-
-WEATHER_FILE = "usa_state_monthly_weather_2000_2025.csv"
-YIELD_FILE = "usda_corn_yield_clean.csv"
-OUTPUT_FILE = "final_corn_yield_weather_fixed.csv"
-
-GROWING_MONTHS = [4, 5, 6, 7, 8, 9]
-
-
-def get_days_in_month(year, month):
-    """Get number of days in a given month/year."""
-    return calendar.monthrange(year, month)[1]
+import dataset_store as store
+from instrumentation import span
+from weather_features import GROWING_MONTHS, WeatherCube, season_frame
 
 
 def main():
-    # Load monthly weather
-    w = pd.read_csv(WEATHER_FILE)
-    w["State"] = w["State"].astype(str).str.strip().str.upper()
-    w["Year"] = pd.to_numeric(w["Year"], errors="coerce")
-    w["Month"] = pd.to_numeric(w["Month"], errors="coerce")
-    w["T2M"] = pd.to_numeric(w["T2M"], errors="coerce")
-    w["PRECTOTCORR"] = pd.to_numeric(w["PRECTOTCORR"], errors="coerce")
-    
-    w = w.dropna(subset=["State", "Year", "Month", "T2M", "PRECTOTCORR"]).copy()
-    w["Year"] = w["Year"].astype(int)
-    w["Month"] = w["Month"].astype(int)
-    
-    # Convert PRECTOTCORR (mm/day) to monthly rainfall (mm/month)
-    w["monthly_rain_mm"] = w.apply(
-        lambda row: row["PRECTOTCORR"] * get_days_in_month(row["Year"], row["Month"]),
-        axis=1
-    )
+    # Load monthly weather (typed + cleaned once by the dataset store)
+    with span("load_weather") as sp:
+        w = store.load("weather_monthly", exact=True)
+        sp.rows = len(w)
     
-    # Filter to growing season and aggregate
-    w_growing = (
-        w[w["Month"].isin(GROWING_MONTHS)]
-        .groupby(["State", "Year"], as_index=False)
-        .agg(
-            avg_temp_growing=("T2M", "mean"),
-            total_rain_growing=("monthly_rain_mm", "sum")
-        )
-    )
+    # PRECTOTCORR is mm/day: the cube multiplies each month by its calendar days
+    # (vectorized) before summing, giving growing-season rainfall in mm
+    with span("aggregate_growing", rows=len(w)):
+        w_growing = season_frame(WeatherCube.from_frame(w), GROWING_MONTHS, rain="mm")
     
     # Load yield data
-    y = pd.read_csv(YIELD_FILE)
-    y["State"] = y["State"].astype(str).str.strip().str.upper()
-    y["Year"] = pd.to_numeric(y["Year"], errors="coerce")
-    y["corn_yield_bu_acre"] = pd.to_numeric(y["corn_yield_bu_acre"], errors="coerce")
-    y = y.dropna(subset=["State", "Year", "corn_yield_bu_acre"]).copy()
-    y["Year"] = y["Year"].astype(int)
+    with span("load_yield") as sp:
+        y = store.load("yield_clean", exact=True)
+        sp.rows = len(y)
     
     # Merge
-    final = y.merge(w_growing, on=["State", "Year"], how="inner")
-    final = final.dropna().drop_duplicates(subset=["State", "Year"]).sort_values(["State", "Year"]).reset_index(drop=True)
+    with span("merge") as sp:
+        final = y.merge(w_growing, on=["State", "Year"], how="inner")
+        final = final.dropna().drop_duplicates(subset=["State", "Year"]).sort_values(["State", "Year"]).reset_index(drop=True)
+        sp.rows = len(final)
     
     # Print statistics
     print("Dataset shape:", final.shape)
@@ -61,9 +32,10 @@ def main():
     print("Rainfall min:", final["total_rain_growing"].min(), "mm")
     print("Rainfall max:", final["total_rain_growing"].max(), "mm")
     
-    # Save
-    final.to_csv(OUTPUT_FILE, index=False)
-    print(f"\nSaved: {OUTPUT_FILE}")
+    # Save (CSV + columnar copy)
+    with span("save_final_fixed", rows=len(final)):
+        store.save("final_fixed", final)
+    print(f"\nSaved: {store.csv_path('final_fixed')}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Incremental model update when a new season lands.
+
+  1. New rows: (State, Year) rows of the dataset up to --through-year that the current model
+     was not fitted on (from <model>.training.json; without one, the model is assumed to
+     cover the model_config training years).
+  2. Incremental model: the fitted forest is grown warm_start-style — --add-trees new trees
+     are fitted on old + new rows while the existing trees are kept (with --replace, the same
+     number of oldest trees is then dropped so the forest keeps its size). The fitted
+     preprocessor is reused; a new, unseen State, or a saved model without trees to add
+     (mean / linear / ridge winners of train_model.py), gets a full refit instead.
+  3. Check: a full retrain on the same rows is scored on the holdout (years after
+     --through-year); the incremental model is accepted if its MAE is within --tolerance of
+     the full retrain's, otherwise the full retrain is used (--skip-check trusts step 2).
+     When there is no holdout (the new season is the latest year), both procedures are
+     refitted without the newest season's rows and scored on them instead.
+  4. Swap: the chosen pipeline is written to a temp file and os.replace'd over the model
+     file, so the running app (which keys its caches on the file's content hash) picks it up
+     on its next rerun without a restart.
+
+Run:
+  python incremental_retrain.py --through-year 2020
+"""
+
+import argparse
+import copy
+import json
+import time
+
+import pandas as pd
+from sklearn.base import clone
+
+import dataset_store as store
+from fingerprint import file_digest
+from model_artifact import load_model, load_training_manifest, save_model
+from model_config import DATASET, FEATURES, MODEL_FILE, TARGET, TRAIN_END, TRAIN_START
+from model_evaluation import regression_metrics
+from tree_shap import warm_test_shap
+
+ADD_TREES = 50
+TOLERANCE = 0.02        # incremental MAE may exceed the full retrain's by at most 2 %
+REPORT_FILE = "incremental_retrain_report.json"
+
+
+def trained_rows(df, model_file=MODEL_FILE):
+    """Set of (State, Year) the current model was fitted on."""
+    manifest = load_training_manifest(model_file)
+    if manifest is not None:
+        return manifest["rows"], "manifest"
+    base = df[df["Year"].between(TRAIN_START, TRAIN_END)]
+    return set(zip(base["State"].astype(str), base["Year"].astype(int))), "model_config split"
+
+
+def split_rows(df, seen, through_year):
+    """(old training rows, new rows, holdout rows after through_year)."""
+    keys = pd.Series(list(zip(df["State"].astype(str), df["Year"].astype(int))), index=df.index)
+    is_seen = keys.isin(seen).to_numpy()
+    upto = (df["Year"] <= through_year).to_numpy()
+    return df[is_seen], df[~is_seen & upto], df[~is_seen & ~upto]
+
+
+def can_grow(pipeline):
+    """True if the pipeline's model is a fitted ensemble that supports warm_start."""
+    model = pipeline.named_steps["model"]
+    return hasattr(model, "estimators_") and hasattr(model, "warm_start")
+
+
+def grow_forest(pipeline, rows, add_trees=ADD_TREES, replace=False):
+    """Copy of the pipeline with add_trees new trees fitted on rows (existing trees kept)."""
+    if not can_grow(pipeline):
+        raise ValueError(f"{type(pipeline.named_steps['model']).__name__} cannot be grown incrementally")
+    pipe = copy.deepcopy(pipeline)
+    forest = pipe.named_steps["model"]
+    n_old = len(forest.estimators_)
+    X = pipe.named_steps["preprocessor"].transform(rows[FEATURES])
+    forest.set_params(warm_start=True, n_estimators=n_old + add_trees)
+    forest.fit(X, rows[TARGET].to_numpy(dtype=float))
+    if replace:
+        forest.estimators_ = forest.estimators_[add_trees:]
+        forest.n_estimators = len(forest.estimators_)
+    forest.set_params(warm_start=False)
+    return pipe
+
+
+def full_retrain(pipeline, rows):
+    return clone(pipeline).fit(rows[FEATURES], rows[TARGET])
+
+
+def n_trees(pipeline):
+    model = pipeline.named_steps["model"]
+    return int(len(model.estimators_)) if hasattr(model, "estimators_") else None
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Update the saved forest with newly arrived seasons.")
+    p.add_argument("--model", default=MODEL_FILE)
+    p.add_argument("--through-year", type=int, default=None,
+                   help="last season to add (default: the year after the latest trained year)")
+    p.add_argument("--add-trees", type=int, default=ADD_TREES)
+    p.add_argument("--replace", action="store_true", help="drop as many oldest trees as were added")
+    p.add_argument("--tolerance", type=float, default=TOLERANCE)
+    p.add_argument("--skip-check", action="store_true", help="no full-retrain comparison")
+    p.add_argument("--dry-run", action="store_true", help="report only; do not swap the model file")
+    p.add_argument("--report", default=REPORT_FILE)
+    return p.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    t0 = time.perf_counter()
+    df = store.load(DATASET)
+    pipeline = load_model(args.model)
+    seen, seen_source = trained_rows(df, args.model)
+    through = args.through_year if args.through_year is not None else max(y for _, y in seen) + 1
+
+    old, new, holdout = split_rows(df, seen, through)
+    print(f"Trained rows: {len(old):,} ({seen_source}); new rows through {through}: {len(new):,}; "
+          f"holdout after {through}: {len(holdout):,}")
+    if new.empty:
+        print("✅ Nothing new to learn; model unchanged.")
+        return
+
+    rows = pd.concat([old, new], ignore_index=True)
+    report = {"through_year": through, "old_rows": len(old), "new_rows": len(new), "holdout_rows": len(holdout),
+              "source_model_hash": file_digest(args.model)}
+
+    known = set(pipeline.named_steps["preprocessor"].named_transformers_["cat"].categories_[0])
+    unseen_states = sorted(set(new["State"].astype(str)) - known)
+    growable = can_grow(pipeline)
+    candidates = {}
+    if unseen_states:
+        print(f"New state(s) {unseen_states}: one-hot layout changes, full retrain required")
+    elif not growable:
+        print(f"{type(pipeline.named_steps['model']).__name__} has no trees to add: full refit of the saved estimator")
+    else:
+        t1 = time.perf_counter()
+        candidates["incremental"] = grow_forest(pipeline, rows, args.add_trees, args.replace)
+        report["incremental_sec"] = round(time.perf_counter() - t1, 3)
+
+    if unseen_states or not growable or not args.skip_check:
+        t1 = time.perf_counter()
+        candidates["full"] = full_retrain(pipeline, rows)
+        report["full_sec"] = round(time.perf_counter() - t1, 3)
+
+    # score on the holdout; without one, refit both procedures without the newest season
+    check_models, check_rows, report["check"] = candidates, holdout, f"holdout after {through}"
+    if holdout.empty and "full" in candidates and "incremental" in candidates:
+        last = int(new["Year"].max())
+        check_rows = new[new["Year"] == last]
+        fit_rows = pd.concat([old, new[new["Year"] != last]], ignore_index=True)
+        check_models = {"incremental": grow_forest(pipeline, fit_rows, args.add_trees, args.replace),
+                        "full": full_retrain(pipeline, fit_rows)}
+        report["check"] = f"validation on the new {last} rows (candidates refitted without them)"
+        print(f"No holdout after {through}: validating on the {len(check_rows)} new {last} rows instead")
+
+    scores = {}
+    if not check_rows.empty:
+        y = check_rows[TARGET].to_numpy(dtype=float)
+        for name, model in check_models.items():
+            scores[name] = regression_metrics(y, model.predict(check_rows[FEATURES]))
+            print(f"  {name:<12} MAE {scores[name]['mae']:.3f}  RMSE {scores[name]['rmse']:.3f}  "
+                  f"R² {scores[name]['r2']:.3f}")
+    report["holdout_scores"] = scores
+
+    chosen = "incremental" if "incremental" in candidates else "full"
+    if chosen == "incremental" and "full" in scores:
+        limit = scores["full"]["mae"] * (1 + args.tolerance)
+        if scores["incremental"]["mae"] > limit:
+            print(f"Incremental MAE {scores['incremental']['mae']:.3f} > {limit:.3f} "
+                  f"(full retrain + {args.tolerance:.0%}): using the full retrain")
+            chosen = "full"
+    report["chosen"] = chosen
+    report["n_trees"] = n_trees(candidates[chosen])
+
+    if not args.dry_run:
+        save_model(candidates[chosen], args.model, train_rows=rows, data_hash=file_digest(store.csv_path(DATASET)),
+                   source=f"incremental_retrain:{chosen}")
+        report["model_hash"] = file_digest(args.model)
+        print(f"✅ Swapped {args.model} ({chosen}" + (f", {report['n_trees']} trees)" if report["n_trees"] else ")"))
+        warm_test_shap(candidates[chosen], report["model_hash"], file_digest(store.csv_path(DATASET)), df)
+    report["total_sec"] = round(time.perf_counter() - t0, 3)
+    with open(args.report, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Report: {args.report}")
+
+
+if __name__ == "__main__":
+    main()
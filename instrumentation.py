@@ -0,0 +1,208 @@
+"""
+Opt-in timing / profiling instrumentation for the pipeline scripts and the dashboard.
+
+Disabled by default (spans are then no-ops). Environment variables:
+  CROP_INSTRUMENT=1        record spans: name, parent, wall time, rows, rows/s and the
+                           process's peak RSS, appended as JSON lines to CROP_INSTRUMENT_FILE
+                           (default .cache/spans.jsonl)
+  CROP_PROFILE=1           also run each top-level span (one per stage / app section) under
+                           cProfile and write .cache/profiles/<script>_<span>_<time>.prof (open
+                           with snakeviz / `python -m pstats`); CROP_PROFILE=<name>,<name>
+                           profiles those spans instead, at any depth (one profiler at a time)
+
+Usage:
+  from instrumentation import span, timed
+
+  with span("load_weather") as sp:
+      w = store.load("weather_monthly")
+      sp.rows = len(w)
+
+  @timed("aggregate")
+  def aggregate(...): ...
+
+Summarise a spans file:
+  python instrumentation.py [.cache/spans.jsonl]
+"""
+
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from model_config import CACHE_DIR
+
+ENABLE_ENV = "CROP_INSTRUMENT"
+FILE_ENV = "CROP_INSTRUMENT_FILE"
+PROFILE_ENV = "CROP_PROFILE"
+SPANS_FILE = os.path.join(CACHE_DIR, "spans.jsonl")
+PROFILE_DIR = os.path.join(CACHE_DIR, "profiles")
+
+RUN_ID = uuid.uuid4().hex[:12]
+_local = threading.local()
+_write_lock = threading.Lock()
+
+
+def _flag(name):
+    return os.environ.get(name, "").strip().lower() not in ("", "0", "false", "no", "off")
+
+
+def enabled():
+    return _flag(ENABLE_ENV) or _flag(PROFILE_ENV)
+
+
+def _profile_wanted(name, depth):
+    """Top-level spans for CROP_PROFILE=1, else the listed span names at any depth."""
+    value = os.environ.get(PROFILE_ENV, "").strip()
+    if value.lower() in ("", "0", "false", "no", "off"):
+        return False
+    if value.lower() in ("1", "true", "yes", "on", "all"):
+        return depth == 0
+    return name in {v.strip() for v in value.split(",")}
+
+
+def _script():
+    return os.path.splitext(os.path.basename(sys.argv[0] or "python"))[0]
+
+
+def _max_rss_mb():
+    try:
+        import resource
+    except ImportError:  # not on Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+class _NullSpan:
+    rows = property(lambda self: None, lambda self, value: None)  # assignments are dropped
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NULL = _NullSpan()
+
+
+class Span:
+    def __init__(self, name, rows=None, **attrs):
+        self.name = name
+        self.rows = rows
+        self.attrs = attrs
+        self._profiler = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        self.parent = stack[-1].name if stack else None
+        self.depth = len(stack)
+        stack.append(self)
+        if not getattr(_local, "profiling", False) and _profile_wanted(self.name, self.depth):
+            import cProfile
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+            _local.profiling = True
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self._t0
+        if self._profiler is not None:
+            self._profiler.disable()
+            _local.profiling = False
+        _local.stack.pop()
+        rec = {
+            "ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            "run_id": RUN_ID,
+            "pid": os.getpid(),
+            "script": _script(),
+            "span": self.name,
+            "parent": self.parent,
+            "depth": self.depth,
+            "seconds": round(seconds, 6),
+            "rows": self.rows,
+            "rows_per_sec": round(self.rows / seconds, 1) if self.rows and seconds > 0 else None,
+            "max_rss_mb": _max_rss_mb(),
+            "error": exc_type.__name__ if exc_type else None,
+            **({"attrs": self.attrs} if self.attrs else {}),
+        }
+        if self._profiler is not None:
+            rec["profile"] = _dump_profile(self._profiler, self.name)
+        _emit(rec)
+        return False
+
+
+def span(name, rows=None, **attrs):
+    """Context manager timing one step; set `.rows` inside the block for throughput."""
+    return Span(name, rows, **attrs) if enabled() else _NULL
+
+
+def timed(name=None):
+    """Decorator form of span (rows taken from len(result) when it has one)."""
+    def deco(fn):
+        label = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not enabled():
+                return fn(*args, **kwargs)
+            with Span(label) as sp:
+                out = fn(*args, **kwargs)
+                try:
+                    sp.rows = len(out)
+                except TypeError:
+                    pass
+                return out
+        return wrapper
+    return deco
+
+
+def _emit(rec):
+    path = os.environ.get(FILE_ENV) or SPANS_FILE
+    try:
+        with _write_lock:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(rec) + "\n")
+    except OSError as e:
+        print(f"⚠️ instrumentation: could not write {path}: {e}")
+
+
+def _dump_profile(profiler, name):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    path = os.path.join(PROFILE_DIR, f"{_script()}_{name}_{stamp}_{os.getpid()}.prof")
+    profiler.dump_stats(path)
+    return path
+
+
+def summarize(path=SPANS_FILE):
+    """Per (script, span): count, total / mean / max seconds, max RSS."""
+    import pandas as pd
+
+    df = pd.read_json(path, lines=True)
+    return (
+        df.groupby(["script", "span"], sort=False)
+        .agg(count=("seconds", "size"), total_sec=("seconds", "sum"), mean_sec=("seconds", "mean"),
+             max_sec=("seconds", "max"), max_rss_mb=("max_rss_mb", "max"))
+        .round(4)
+        .sort_values("total_sec", ascending=False)
+        .reset_index()
+    )
+
+
+if __name__ == "__main__":
+    print(summarize(sys.argv[1] if len(sys.argv) > 1 else SPANS_FILE).to_string(index=False))
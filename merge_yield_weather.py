@@ -12,37 +12,25 @@ OUTPUT FILES:
   - usa_state_yearly_weather_growing_2000_2025.csv
   - final_corn_yield_weather.csv
 
+Inputs and outputs go through dataset_store (typed schema + columnar copy in data_store/).
+
 Run:
   python merge_yield_weather.py
 """
 
-import pandas as pd
-
-YIELD_FILE = "usda_corn_yield_clean.csv"
-WEATHER_MONTHLY_FILE = "usa_state_monthly_weather_2000_2025.csv"
-
-OUT_WEATHER_GROWING = "usa_state_yearly_weather_growing_2000_2025.csv"
-OUT_FINAL = "final_corn_yield_weather.csv"
-
-# Corn growing season (USA typical): Apr–Sep
-GROWING_MONTHS = [4, 5, 6, 7, 8, 9]
+import dataset_store as store
+from instrumentation import span
+from weather_features import GROWING_MONTHS, WeatherCube, season_frame
 
 
 def main():
     # -----------------------
     # Load yield data
     # -----------------------
-    yield_df = pd.read_csv(YIELD_FILE)
-    for c in ["Year", "State", "corn_yield_bu_acre"]:
-        if c not in yield_df.columns:
-            raise ValueError(f"Yield file missing column '{c}'. Found: {list(yield_df.columns)}")
-
-    yield_df["State"] = yield_df["State"].astype(str).str.strip().str.upper()
-    yield_df["Year"] = pd.to_numeric(yield_df["Year"], errors="coerce")
-    yield_df["corn_yield_bu_acre"] = pd.to_numeric(yield_df["corn_yield_bu_acre"], errors="coerce")
-    yield_df = yield_df.dropna(subset=["State", "Year", "corn_yield_bu_acre"]).copy()
-    yield_df["Year"] = yield_df["Year"].astype(int)
-    yield_df = yield_df.drop_duplicates(subset=["State", "Year"])
+    with span("load_yield") as sp:
+        yield_df = store.load("yield_clean", exact=True)
+        yield_df = yield_df.drop_duplicates(subset=["State", "Year"])
+        sp.rows = len(yield_df)
 
     print("=== YIELD DATA ===")
     print("Rows:", len(yield_df))
@@ -54,20 +42,9 @@ def main():
     # -----------------------
     # Load monthly weather
     # -----------------------
-    w = pd.read_csv(WEATHER_MONTHLY_FILE)
-    for c in ["State", "Year", "Month", "T2M", "PRECTOTCORR"]:
-        if c not in w.columns:
-            raise ValueError(f"Weather file missing column '{c}'. Found: {list(w.columns)}")
-
-    w["State"] = w["State"].astype(str).str.strip().str.upper()
-    w["Year"] = pd.to_numeric(w["Year"], errors="coerce")
-    w["Month"] = pd.to_numeric(w["Month"], errors="coerce")
-    w["T2M"] = pd.to_numeric(w["T2M"], errors="coerce")
-    w["PRECTOTCORR"] = pd.to_numeric(w["PRECTOTCORR"], errors="coerce")
-
-    w = w.dropna(subset=["State", "Year", "Month", "T2M", "PRECTOTCORR"]).copy()
-    w["Year"] = w["Year"].astype(int)
-    w["Month"] = w["Month"].astype(int)
+    with span("load_weather") as sp:
+        w = store.load("weather_monthly", exact=True)
+        sp.rows = len(w)
 
     print("=== WEATHER MONTHLY ===")
     print("Rows:", len(w))
@@ -78,39 +55,39 @@ def main():
 
     # -----------------------
     # Aggregate to growing season per (State, Year)
+    # (rain="rate" keeps this file's historical sum of mm/day rates;
+    #  fix_weather_and_merge.py produces true mm totals)
     # -----------------------
-    w_growing = (
-        w[w["Month"].isin(GROWING_MONTHS)]
-        .groupby(["State", "Year"], as_index=False)
-        .agg(
-            avg_temp_growing=("T2M", "mean"),
-            total_rain_growing=("PRECTOTCORR", "sum")
-        )
-    )
+    with span("aggregate_growing", rows=len(w)):
+        w_growing = season_frame(WeatherCube.from_frame(w), GROWING_MONTHS, rain="rate")
 
-    w_growing.to_csv(OUT_WEATHER_GROWING, index=False)
+    with span("save_weather_growing", rows=len(w_growing)):
+        store.save("weather_growing", w_growing)
 
     print("=== WEATHER GROWING-SEASON (YEARLY) ===")
     print("Rows:", len(w_growing))
     print("States:", w_growing["State"].nunique())
     print("Years:", w_growing["Year"].min(), "to", w_growing["Year"].max())
     print(w_growing.head(5).to_string(index=False))
-    print(f"✅ Saved: {OUT_WEATHER_GROWING}")
+    print(f"✅ Saved: {store.csv_path('weather_growing')}")
     print()
 
     # -----------------------
     # Merge yield + weather
     # -----------------------
-    final_df = yield_df.merge(w_growing, on=["State", "Year"], how="inner")
-    final_df = final_df.dropna().drop_duplicates(subset=["State", "Year"]).sort_values(["State", "Year"]).reset_index(drop=True)
-    final_df.to_csv(OUT_FINAL, index=False)
+    with span("merge") as sp:
+        final_df = yield_df.merge(w_growing, on=["State", "Year"], how="inner")
+        final_df = final_df.dropna().drop_duplicates(subset=["State", "Year"]).sort_values(["State", "Year"]).reset_index(drop=True)
+        sp.rows = len(final_df)
+    with span("save_final", rows=len(final_df)):
+        store.save("final", final_df)
 
     print("=== FINAL MERGED DATASET ===")
     print("Rows:", len(final_df))
     print("States:", final_df["State"].nunique())
     print("Years:", final_df["Year"].min(), "to", final_df["Year"].max())
     print(final_df.head(10).to_string(index=False))
-    print(f"✅ Saved: {OUT_FINAL}")
+    print(f"✅ Saved: {store.csv_path('final')}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,150 @@
+"""
+Loading the saved model pipeline, with an opt-in fast path for cold starts.
+
+The shipped joblib file may be compressed and is always read fully into private memory.
+With CROP_APP_FAST_START=1 the model is instead loaded from an uncompressed copy under
+.cache/models/ (one per model hash, written on first use or ahead of time with this script)
+via joblib.load(mmap_mode="r"): the file is read from the page cache without a
+decompression pass, which is what makes the load faster. It does not make processes share
+the model: sklearn's tree unpickling copies each tree's node arrays into private memory,
+so every worker still holds its own full copy and should be sized accordingly.
+
+Next to the model file, <model>.training.json records which (State, Year) rows it was
+fitted on (written by train_model.py / incremental_retrain.py), so later updates can tell
+which rows are new.
+
+Run (export the fast-start copy before deploying, and compare load times):
+  python model_artifact.py
+"""
+
+import argparse
+import json
+import os
+import time
+from datetime import datetime, timezone
+
+import joblib
+
+from fingerprint import file_digest
+from model_config import CACHE_DIR, MODEL_FILE
+
+FAST_START_ENV = "CROP_APP_FAST_START"
+MMAP_DIR = os.path.join(CACHE_DIR, "models")
+
+
+def fast_start_enabled():
+    return os.environ.get(FAST_START_ENV, "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def mmap_path(model_hash, mmap_dir=MMAP_DIR):
+    return os.path.join(mmap_dir, f"model_{model_hash[:16]}.joblib")
+
+
+def export_uncompressed(model, path):
+    """Atomic uncompressed dump (a prerequisite for mmap_mode loads)."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    joblib.dump(model, tmp, compress=0)
+    os.replace(tmp, path)
+
+
+def load_model(model_file=MODEL_FILE, model_hash=None, mmap=False, mmap_dir=MMAP_DIR):
+    """The fitted pipeline; mmap=True serves it from the memory-mapped copy (built on a miss)."""
+    if not mmap:
+        return joblib.load(model_file)
+    path = mmap_path(model_hash or file_digest(model_file), mmap_dir)
+    if os.path.exists(path):
+        try:
+            return joblib.load(path, mmap_mode="r")
+        except (OSError, ValueError, EOFError):
+            pass  # partial / corrupt copy: rebuild below
+    model = joblib.load(model_file)
+    try:
+        export_uncompressed(model, path)
+    except OSError as e:
+        print(f"⚠️ model_artifact: could not write fast-start copy {path}: {e}")
+    return model
+
+
+def save_model(model, path=MODEL_FILE, train_rows=None, **info):
+    """Atomic dump; the app picks the new file up by content hash on its next rerun.
+
+    train_rows: frame with State, Year of the rows the model was fitted on (-> training manifest,
+    which also records the estimator type so callers can check it without loading the model).
+    """
+    tmp = f"{path}.{os.getpid()}.tmp"
+    joblib.dump(model, tmp)
+    os.replace(tmp, path)
+    if train_rows is not None:  # only once the model it describes is in place
+        step = model.named_steps["model"]
+        save_training_manifest(path, train_rows, model_hash=file_digest(path), estimator=type(step).__name__,
+                               per_tree=hasattr(step, "estimators_"), **info)
+
+
+def training_manifest_path(model_file=MODEL_FILE):
+    return f"{os.path.splitext(model_file)[0]}.training.json"
+
+
+def save_training_manifest(model_file, train_rows, **info):
+    manifest = {
+        "written": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        **info,
+        "rows": sorted([str(s), int(y)] for s, y in zip(train_rows["State"], train_rows["Year"])),
+    }
+    path = training_manifest_path(model_file)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp, path)
+
+
+def load_training_manifest(model_file=MODEL_FILE):
+    """The manifest dict (rows as a set of (State, Year)), or None if missing / unreadable."""
+    try:
+        with open(training_manifest_path(model_file), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    manifest["rows"] = {(s, int(y)) for s, y in manifest.get("rows", [])}
+    return manifest
+
+
+def manifest_per_tree(model_file=MODEL_FILE, model_hash=None):
+    """
+    Whether the model has per-tree estimators, from its training manifest: None when the
+    manifest is missing, predates the flag, or describes a different file than model_hash.
+    """
+    manifest = load_training_manifest(model_file)
+    if manifest is None or "per_tree" not in manifest:
+        return None
+    if model_hash is not None and manifest.get("model_hash") != model_hash:
+        return None
+    return bool(manifest["per_tree"])
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Export the uncompressed fast-start model copy and time both loads.")
+    p.add_argument("--model", default=MODEL_FILE)
+    p.add_argument("--mmap-dir", default=MMAP_DIR)
+    args = p.parse_args(argv)
+
+    model_hash = file_digest(args.model)
+    if model_hash is None:
+        raise SystemExit(f"Model file not found: {args.model}")
+    path = mmap_path(model_hash, args.mmap_dir)
+
+    t0 = time.perf_counter()
+    model = joblib.load(args.model)
+    t_full = time.perf_counter() - t0
+    export_uncompressed(model, path)
+    t0 = time.perf_counter()
+    joblib.load(path, mmap_mode="r")
+    t_mmap = time.perf_counter() - t0
+
+    print(f"✅ Fast-start copy: {path}")
+    print(f"{args.model}: {os.path.getsize(args.model) / 1e6:.1f} MB, load {t_full * 1000:.0f} ms")
+    print(f"{path}: {os.path.getsize(path) / 1e6:.1f} MB, mmap load {t_mmap * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
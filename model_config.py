@@ -0,0 +1,17 @@
+"""
+Shared model constants: artifact/dataset locations, features, target and the year-based split.
+"""
+
+MODEL_FILE = "random_forest_crop_yield_model.joblib"
+
+# dataset_store name of the modelling table (final_corn_yield_weather_fixed.csv)
+DATASET = "final_fixed"
+
+TRAIN_START, TRAIN_END = 2000, 2019
+TEST_START, TEST_END = 2020, 2025
+
+FEATURES = ["State", "Year", "avg_temp_growing", "total_rain_growing"]
+TARGET = "corn_yield_bu_acre"
+
+# Local cache root for derived artifacts (evaluations, figures, ...)
+CACHE_DIR = ".cache"
@@ -0,0 +1,78 @@
+"""
+Test-set evaluation artifact, keyed by the model file and dataset fingerprints.
+
+The 2020–2025 predictions, residual inputs and MAE/RMSE/R² depend only on the saved model
+and the dataset, so they are computed once per (model hash, dataset hash) pair, written to
+.cache/evaluation/ and served from there (and from memory in the app) afterwards.
+"""
+
+import json
+import os
+
+import numpy as np
+
+from model_config import CACHE_DIR, FEATURES, TARGET, TEST_END, TEST_START
+
+EVAL_DIR = os.path.join(CACHE_DIR, "evaluation")
+
+
+def evaluation_path(model_hash, data_hash, eval_dir=EVAL_DIR):
+    return os.path.join(eval_dir, f"eval_{model_hash[:16]}_{data_hash[:16]}.npz")
+
+
+def regression_metrics(y_true, y_pred):
+    """{"mae", "rmse", "r2"} as floats."""
+    from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score  # only needed on a cache miss
+
+    return {
+        "mae": float(mean_absolute_error(y_true, y_pred)),
+        # ✅ sklearn 1.6-safe RMSE
+        "rmse": float(np.sqrt(mean_squared_error(y_true, y_pred))),
+        "r2": float(r2_score(y_true, y_pred)),
+    }
+
+
+def compute_evaluation(model, df):
+    """Predict the test split once; returns the arrays + metrics the dashboard needs."""
+    test_df = df[df["Year"].between(TEST_START, TEST_END)]
+    y_test = test_df[TARGET].to_numpy(dtype=float)
+    y_pred = np.asarray(model.predict(test_df[FEATURES]), dtype=float)
+    return {
+        "State": test_df["State"].astype(str).to_numpy(dtype=str),
+        "Year": test_df["Year"].to_numpy(dtype=int),
+        "y_test": y_test,
+        "y_pred": y_pred,
+        **regression_metrics(y_test, y_pred),
+    }
+
+
+def save_evaluation(ev, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp.npz"
+    metrics = {k: ev[k] for k in ("mae", "rmse", "r2")}
+    np.savez(tmp, State=ev["State"], Year=ev["Year"], y_test=ev["y_test"], y_pred=ev["y_pred"],
+             metrics=np.array(json.dumps(metrics)))
+    os.replace(tmp, path)
+
+
+def load_evaluation(path):
+    with np.load(path, allow_pickle=False) as z:
+        ev = {k: z[k] for k in ("State", "Year", "y_test", "y_pred")}
+        ev.update(json.loads(str(z["metrics"])))
+    return ev
+
+
+def get_evaluation(model_hash, data_hash, load_model, load_data, eval_dir=EVAL_DIR):
+    """Serve the evaluation for this (model, dataset) pair from disk, computing it on a miss."""
+    path = evaluation_path(model_hash, data_hash, eval_dir)
+    if os.path.exists(path):
+        try:
+            return load_evaluation(path)
+        except (OSError, ValueError, KeyError):
+            pass  # corrupt / partial file: recompute below
+    ev = compute_evaluation(load_model(), load_data())
+    try:
+        save_evaluation(ev, path)
+    except OSError as e:
+        print(f"⚠️ model_evaluation: could not write {path}: {e}")
+    return ev
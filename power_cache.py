@@ -0,0 +1,118 @@
+"""
+Persistent on-disk cache for NASA POWER API responses.
+
+Each response is stored as one JSON file, keyed by (endpoint, lat, lon, parameters, start, end),
+together with the time it was fetched. Entries older than the TTL are treated as misses and
+deleted; when the cache holds more than `max_entries` files the least recently used ones
+(by file mtime, refreshed on every hit) are evicted. Responses whose range reaches the current
+or previous year are still being filled in by POWER (fill values, provisional months), so
+they expire after the much shorter `recent_ttl_sec` instead.
+
+Used by download_us_weather_power.py (and any other POWER fetcher) like:
+  cache = PowerCache()
+  data = cache.get(key, ttl_sec=cache.ttl_for(end))   # None on miss / expired
+  cache.put(key, data)
+"""
+
+import datetime
+import hashlib
+import json
+import os
+import threading
+import time
+
+CACHE_DIR = ".power_cache"
+CACHE_TTL_SEC = 7 * 24 * 3600      # one week
+RECENT_TTL_SEC = 6 * 3600          # ranges reaching the current or previous year
+CACHE_MAX_ENTRIES = 2000
+
+
+def cache_key(lat, lon, params, start, end, endpoint="monthly"):
+    """Stable key for one POWER point request."""
+    raw = json.dumps([endpoint, round(float(lat), 6), round(float(lon), 6), str(params), str(start), str(end)])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+class PowerCache:
+    """JSON-file response cache with TTL expiry and LRU eviction (by file mtime)."""
+
+    def __init__(self, cache_dir=CACHE_DIR, ttl_sec=CACHE_TTL_SEC, max_entries=CACHE_MAX_ENTRIES,
+                 recent_ttl_sec=RECENT_TTL_SEC):
+        self.cache_dir = cache_dir
+        self.ttl_sec = ttl_sec
+        self.recent_ttl_sec = recent_ttl_sec
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def ttl_for(self, end, today=None):
+        """TTL for a request ending at `end` (a year or YYYYMMDD): short while POWER may still revise it."""
+        today = today or datetime.date.today()
+        if int(str(end)[:4]) < today.year - 1:
+            return self.ttl_sec
+        if self.ttl_sec is None:
+            return self.recent_ttl_sec
+        return min(self.ttl_sec, self.recent_ttl_sec)
+
+    def get(self, key, ttl_sec=None):
+        """Cached data for key, or None; `ttl_sec` overrides the cache-wide TTL for this lookup."""
+        ttl_sec = self.ttl_sec if ttl_sec is None else ttl_sec
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            if ttl_sec is not None and time.time() - entry["fetched_at"] > ttl_sec:
+                _remove_quietly(path)
+                raise KeyError("expired")
+            os.utime(path)  # mark as recently used
+        except (OSError, ValueError, KeyError, TypeError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return entry["data"]
+
+    def put(self, key, data):
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"fetched_at": time.time(), "data": data}, f)
+        os.replace(tmp, path)
+        self.evict()
+
+    def evict(self):
+        """Drop the least recently used entries above max_entries (expired ones go on read)."""
+        if self.max_entries is None:
+            return
+        with self._lock:
+            entries = []
+            for name in os.listdir(self.cache_dir):
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    entries.append((os.stat(path).st_mtime, path))
+                except OSError:
+                    continue
+            if len(entries) > self.max_entries:
+                entries.sort()
+                for _, path in entries[: len(entries) - self.max_entries]:
+                    _remove_quietly(path)
+
+    def clear(self):
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".json"):
+                _remove_quietly(os.path.join(self.cache_dir, name))
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
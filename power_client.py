@@ -0,0 +1,155 @@
+"""
+Shared NASA POWER point-request client: rate limiting, retries with backoff, the on-disk
+response cache and payload -> array conversion.
+
+Used by download_us_weather_power.py (state centroids), spatial_sampling.py (many points
+per state) and daily_weather_features.py (daily endpoint), so none of them has to import
+another fetcher script.
+"""
+
+import random
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import requests
+
+from power_cache import cache_key
+
+# NASA POWER monthly endpoint
+POWER_URL = "https://power.larc.nasa.gov/api/temporal/monthly/point"
+
+# Variables:
+# T2M = Temperature at 2m (°C)
+# PRECTOTCORR = Corrected precipitation (mm)
+PARAMS = "T2M,PRECTOTCORR"
+
+# POWER marks months it has no data for yet with this fill value
+POWER_FILL_VALUE = -999.0
+
+# Polite minimum spacing between request starts (shared by all workers)
+SLEEP_SEC = 0.25
+
+# Concurrency + retry policy
+MAX_WORKERS = 4
+MAX_RETRIES = 4          # retries after the first attempt
+BACKOFF_BASE_SEC = 1.0   # 1s, 2s, 4s, ... (+ jitter)
+BACKOFF_MAX_SEC = 30.0
+REQUEST_TIMEOUT_SEC = 40
+
+
+# ==============================
+# Requests
+# ==============================
+class RateLimiter:
+    """Thread-safe limiter: request starts are at least `min_interval` seconds apart."""
+
+    def __init__(self, min_interval):
+        self.min_interval = float(min_interval)
+        self._lock = threading.Lock()
+        self._next_at = 0.0
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            start_at = max(now, self._next_at)
+            self._next_at = start_at + self.min_interval
+        delay = start_at - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+def fetch_power_monthly(lat, lon, start_year, end_year, session=None, url=POWER_URL, params=PARAMS):
+    """GET one POWER point request (any temporal endpoint: start/end are passed through as-is)."""
+    query = {
+        "latitude": lat,
+        "longitude": lon,
+        "start": start_year,
+        "end": end_year,
+        "community": "AG",
+        "parameters": params,
+        "format": "JSON",
+    }
+    r = (session or requests).get(url, params=query, timeout=REQUEST_TIMEOUT_SEC)
+    r.raise_for_status()
+    return r.json()["properties"]["parameter"]
+
+
+def is_retryable(exc):
+    """Network errors, timeouts, 429 and 5xx are retried; other 4xx are not."""
+    if isinstance(exc, requests.HTTPError) and exc.response is not None:
+        code = exc.response.status_code
+        return code == 429 or code >= 500
+    return isinstance(exc, (requests.RequestException, ValueError, KeyError))
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE_SEC, cap=BACKOFF_MAX_SEC):
+    """Exponential backoff with full jitter for the given (1-based) retry attempt."""
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+def call_with_retries(fn, limiter=None, max_retries=MAX_RETRIES, backoff_base=BACKOFF_BASE_SEC):
+    """Run fn() under the rate limiter, retrying retryable errors. Returns (result, attempts)."""
+    attempt = 0
+    while True:
+        attempt += 1
+        if limiter is not None:
+            limiter.wait()
+        try:
+            return fn(), attempt
+        except Exception as e:
+            if attempt > max_retries or not is_retryable(e):
+                e.attempts = attempt
+                raise
+            time.sleep(backoff_delay(attempt, base=backoff_base))
+
+
+def make_session(max_workers=MAX_WORKERS):
+    """requests.Session whose connection pool is sized for `max_workers` threads."""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=max(1, max_workers))
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def fetch_point_cached(lat, lon, start_year, end_year, session=None, url=POWER_URL, limiter=None,
+                       cache=None, max_retries=MAX_RETRIES, backoff_base=BACKOFF_BASE_SEC, params=PARAMS):
+    """
+    Fetch one point through the cache. Returns (data, status, attempts); status is "ok" or "cached".
+
+    Ranges that reach the current or previous year are only served from the cache for the
+    cache's recent_ttl_sec, so nightly --incremental runs pick up newly published months.
+    """
+    key = cache_key(lat, lon, params, start_year, end_year, endpoint=url)
+    data = cache.get(key, ttl_sec=cache.ttl_for(end_year)) if cache is not None else None
+    if data is not None:
+        return data, "cached", 0
+    data, attempts = call_with_retries(
+        lambda: fetch_power_monthly(lat, lon, start_year, end_year, session=session, url=url, params=params),
+        limiter=limiter, max_retries=max_retries, backoff_base=backoff_base,
+    )
+    if cache is not None:
+        cache.put(key, data)
+    return data, "ok", attempts
+
+
+# ==============================
+# Payload conversion
+# ==============================
+def month_axis(start_year, end_year):
+    """(years, months) arrays for every month of start_year..end_year, in order."""
+    years = np.repeat(np.arange(start_year, end_year + 1), 12)
+    months = np.tile(np.arange(1, 13), end_year - start_year + 1)
+    return years, months
+
+
+def power_to_array(data, start_year, end_year, params=("T2M", "PRECTOTCORR")):
+    """One POWER `parameter` payload as a float array shaped (n_months, n_params)."""
+    years, months = month_axis(start_year, end_year)
+    keys = [f"{y}{m:02d}" for y, m in zip(years, months)]
+    return np.column_stack([
+        pd.to_numeric(pd.Series(map(data[p].get, keys), dtype=object), errors="coerce").to_numpy(dtype=float)
+        for p in params
+    ])
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Local HTTP/JSON prediction service for the saved yield model, with dynamic micro-batching.
+
+The model is loaded once. Request handler threads put their rows on a queue; one batching
+thread takes the first waiting request, keeps collecting until MAX_BATCH_ROWS rows are
+queued or MAX_WAIT_MS has passed, and scores the whole batch with a single predict call.
+The fixed per-call pipeline overhead (validation, ColumnTransformer, joblib dispatch) is
+then paid once per batch instead of once per request.
+
+Endpoints:
+  POST /predict   {"rows": [{"State": "IOWA", "Year": 2024, "avg_temp_growing": 21.3,
+                             "total_rain_growing": 540.0}, ...]}   (or one row object)
+                  -> {"predictions": [...]}
+  GET  /metrics   request / row / batch counters, batch sizes, latency percentiles, rows/s
+  GET  /health
+
+Run:
+  python predict_server.py --port 8000 --max-batch-rows 512 --max-wait-ms 5
+"""
+
+import argparse
+import json
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+from batch_score import prepare_features
+from model_artifact import fast_start_enabled, load_model
+from model_config import FEATURES, MODEL_FILE
+
+HOST = "127.0.0.1"
+PORT = 8000
+MAX_BATCH_ROWS = 512
+MAX_WAIT_MS = 5.0
+REQUEST_TIMEOUT_SEC = 30
+LATENCY_WINDOW = 10_000     # recent requests kept for latency percentiles
+
+
+# ==============================
+# Micro-batching
+# ==============================
+class Metrics:
+    def __init__(self, window=LATENCY_WINDOW):
+        self.started = time.time()
+        self.requests = 0
+        self.errors = 0
+        self.rows = 0
+        self.batches = 0
+        self.predict_sec = 0.0
+        self.latencies = deque(maxlen=window)
+        self.batch_rows = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record_batch(self, n_rows, seconds):
+        with self._lock:
+            self.batches += 1
+            self.rows += n_rows
+            self.predict_sec += seconds
+            self.batch_rows.append(n_rows)
+
+    def record_request(self, seconds, ok=True):
+        with self._lock:
+            self.requests += 1
+            self.errors += 0 if ok else 1
+            self.latencies.append(seconds)
+
+    def snapshot(self, queue_depth=0):
+        with self._lock:
+            lat = np.array(self.latencies) * 1000.0
+            sizes = np.array(self.batch_rows)
+            uptime = time.time() - self.started
+            out = {
+                "uptime_sec": round(uptime, 1),
+                "requests": self.requests,
+                "errors": self.errors,
+                "rows": self.rows,
+                "batches": self.batches,
+                "queue_depth": queue_depth,
+                "rows_per_sec": round(self.rows / max(uptime, 1e-9), 1),
+                "predict_sec_total": round(self.predict_sec, 4),
+                "mean_batch_rows": round(float(sizes.mean()), 2) if sizes.size else 0.0,
+                "max_batch_rows": int(sizes.max()) if sizes.size else 0,
+            }
+        for q in (50, 95, 99):
+            out[f"latency_ms_p{q}"] = round(float(np.percentile(lat, q)), 3) if lat.size else None
+        return out
+
+
+class MicroBatcher:
+    """Groups queued prediction requests into one predict call per batch."""
+
+    def __init__(self, model, max_batch_rows=MAX_BATCH_ROWS, max_wait_ms=MAX_WAIT_MS, metrics=None):
+        self.model = model
+        self.max_batch_rows = max_batch_rows
+        self.max_wait = max_wait_ms / 1000.0
+        self.metrics = metrics or Metrics()
+        self.queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, X):
+        """Queue a prepared feature frame; the Future resolves to a float array."""
+        fut = Future()
+        self.queue.put((X, fut))
+        return fut
+
+    def _collect(self):
+        batch = [self.queue.get()]
+        n = len(batch[0][0])
+        deadline = time.perf_counter() + self.max_wait
+        while n < self.max_batch_rows:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(item)
+            n += len(item[0])
+        return batch, n
+
+    def _run(self):
+        while True:
+            batch, n = self._collect()
+            t0 = time.perf_counter()
+            try:
+                X = batch[0][0] if len(batch) == 1 else pd.concat([x for x, _ in batch], ignore_index=True)
+                pred = np.asarray(self.model.predict(X), dtype=float)
+            except Exception as e:
+                if len(batch) == 1:
+                    batch[0][1].set_exception(e)
+                else:
+                    self._run_each(batch)  # only the offending request should fail
+                continue
+            self.metrics.record_batch(n, time.perf_counter() - t0)
+            start = 0
+            for x, fut in batch:
+                fut.set_result(pred[start:start + len(x)])
+                start += len(x)
+
+    def _run_each(self, batch):
+        """Fallback after a failed batch: predict every request on its own."""
+        for x, fut in batch:
+            t0 = time.perf_counter()
+            try:
+                pred = np.asarray(self.model.predict(x), dtype=float)
+            except Exception as e:
+                fut.set_exception(e)
+                continue
+            self.metrics.record_batch(len(x), time.perf_counter() - t0)
+            fut.set_result(pred)
+
+
+# ==============================
+# HTTP
+# ==============================
+def parse_rows(payload):
+    """Request JSON -> prepared feature frame (ValueError on bad input)."""
+    rows = payload.get("rows", payload) if isinstance(payload, dict) else payload
+    if isinstance(rows, dict):
+        rows = [rows]
+    if not isinstance(rows, list) or not rows:
+        raise ValueError("expected a row object or {\"rows\": [...]} with at least one row")
+    df = pd.DataFrame(rows)
+    missing = [c for c in FEATURES if c not in df.columns]
+    if missing:
+        raise ValueError(f"missing feature(s) {missing}")
+    X, ok = prepare_features(df)
+    if not ok.all():
+        raise ValueError(f"non-numeric or missing values in row(s) {np.flatnonzero(~ok).tolist()[:10]}")
+    return X
+
+
+class PredictHandler(BaseHTTPRequestHandler):
+    batcher = None  # set by make_server
+
+    def _send(self, code, obj):
+        body = json.dumps(obj).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send(200, {"status": "ok"})
+        elif self.path == "/metrics":
+            self._send(200, self.batcher.metrics.snapshot(self.batcher.queue.qsize()))
+        else:
+            self._send(404, {"error": f"unknown path {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/predict":
+            self._send(404, {"error": f"unknown path {self.path}"})
+            return
+        t0 = time.perf_counter()
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            X = parse_rows(json.loads(self.rfile.read(length) or b"null"))
+        except ValueError as e:  # includes JSON decode errors
+            self.batcher.metrics.record_request(time.perf_counter() - t0, ok=False)
+            self._send(400, {"error": str(e)})
+            return
+        try:
+            pred = self.batcher.submit(X).result(timeout=REQUEST_TIMEOUT_SEC)
+        except Exception as e:
+            self.batcher.metrics.record_request(time.perf_counter() - t0, ok=False)
+            self._send(500, {"error": str(e)})
+            return
+        self.batcher.metrics.record_request(time.perf_counter() - t0)
+        self._send(200, {"predictions": [round(float(p), 4) for p in pred]})
+
+    def log_message(self, fmt, *args):
+        pass  # per-request logging would dominate latency; see /metrics
+
+
+class PredictServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256  # listen backlog; the socketserver default of 5 resets bursts of clients
+
+
+def make_server(model, host=HOST, port=PORT, max_batch_rows=MAX_BATCH_ROWS, max_wait_ms=MAX_WAIT_MS):
+    handler = type("Handler", (PredictHandler,), {"batcher": MicroBatcher(model, max_batch_rows, max_wait_ms)})
+    return PredictServer((host, port), handler)
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="HTTP/JSON prediction server with micro-batching.")
+    p.add_argument("--host", default=HOST)
+    p.add_argument("--port", type=int, default=PORT)
+    p.add_argument("--model", default=MODEL_FILE)
+    p.add_argument("--max-batch-rows", type=int, default=MAX_BATCH_ROWS)
+    p.add_argument("--max-wait-ms", type=float, default=MAX_WAIT_MS, help="max time a request waits for a batch")
+    return p.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    model = load_model(args.model, mmap=fast_start_enabled())
+    server = make_server(model, args.host, args.port, args.max_batch_rows, args.max_wait_ms)
+    print(f"✅ Serving {args.model} on http://{args.host}:{args.port} "
+          f"(batch <= {args.max_batch_rows} rows, wait <= {args.max_wait_ms} ms)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
-import pandas as pd
+import dataset_store as store
 
-df = pd.read_csv("final_corn_yield_weather.csv")
+df = store.load("final")
 
 print("Shape:", df.shape)
 print("States:", df["State"].nunique())
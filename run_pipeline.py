@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Single entry point for the data pipeline: stages declared as a DAG over their files.
+
+  clean  -> download -> merge
+                     -> fix
+
+A stage depends on every stage that produces one of its inputs. Before running, each
+stage's signature (hashes of its input files, its code files and its arguments) is compared
+with the one recorded after its last successful run; if they match and its outputs are
+unchanged since then, the stage is skipped. Independent ready stages run in parallel.
+
+The download stage's remote data is not an input file, so it only reruns when the yield
+file or its code changes; force it for a refresh (it runs in --incremental mode).
+
+Every run writes pipeline_manifest.json with per-stage status, reason and timings;
+stage stdout/stderr goes to pipeline_logs/<stage>.log.
+
+Run:
+  python run_pipeline.py                 # everything that is stale
+  python run_pipeline.py fix             # `fix` plus whatever it depends on
+  python run_pipeline.py --force download --jobs 2   # nightly: pull new POWER months
+  python run_pipeline.py --dry-run
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+
+from fingerprint import combined_digest, file_digest
+
+STATE_FILE = ".pipeline_state.json"
+MANIFEST_FILE = "pipeline_manifest.json"
+LOG_DIR = "pipeline_logs"
+
+
+class Stage:
+    def __init__(self, name, script, inputs, outputs, code=(), args=()):
+        self.name = name
+        self.script = script
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.code = [script] + list(code)
+        self.args = list(args)
+
+    def command(self):
+        return [sys.executable, self.script] + self.args
+
+    def signature(self):
+        return {
+            "inputs": {p: file_digest(p) for p in self.inputs},
+            "code": combined_digest(self.code),
+            "args": self.args,
+        }
+
+
+# ==============================
+# STAGES (order only matters for display; dependencies come from files)
+# outputs: every file the script writes, each written by exactly one stage (columnar copies
+#          that dataset_store.load() rebuilds for an input are caches, not outputs)
+# code:    every local module the script imports, directly or through another local module
+# ==============================
+COMMON_CODE = ["instrumentation.py", "model_config.py"]
+STORE_CODE = ["weather_features.py", "dataset_store.py"] + COMMON_CODE
+
+STAGES = [
+    Stage(
+        "clean", "clean_usda_corn_yield.py",
+        inputs=["usda_corn_yield_state_year.csv"],
+        outputs=["usda_corn_yield_clean.csv"],
+        code=COMMON_CODE,
+    ),
+    Stage(
+        "download", "download_us_weather_power.py",
+        inputs=["usda_corn_yield_clean.csv"],
+        outputs=["usa_state_monthly_weather_2000_2025.csv", "power_fetch_report.csv"],
+        code=["power_client.py", "power_cache.py", "spatial_sampling.py"] + STORE_CODE,
+        args=["--incremental", "--skip-growing"],   # the growing-season file is merge's output
+    ),
+    Stage(
+        "merge", "merge_yield_weather.py",
+        inputs=["usda_corn_yield_clean.csv", "usa_state_monthly_weather_2000_2025.csv"],
+        outputs=["usa_state_yearly_weather_growing_2000_2025.csv", "final_corn_yield_weather.csv",
+                 "data_store/weather_growing.feather", "data_store/final.feather"],
+        code=STORE_CODE,
+    ),
+    Stage(
+        "fix", "fix_weather_and_merge.py",
+        inputs=["usda_corn_yield_clean.csv", "usa_state_monthly_weather_2000_2025.csv"],
+        outputs=["final_corn_yield_weather_fixed.csv", "data_store/final_fixed.feather"],
+        code=STORE_CODE,
+    ),
+]
+
+
+def dependencies(stages):
+    """{stage name: set of upstream stage names}, from output -> input file links."""
+    producer = {}
+    for st in stages:
+        for out in st.outputs:
+            if out in producer:
+                raise ValueError(f"{out} is produced by both '{producer[out]}' and '{st.name}'")
+            producer[out] = st.name
+    deps = {st.name: {producer[i] for i in st.inputs if i in producer} - {st.name} for st in stages}
+
+    # cycle check (Kahn)
+    pending = {k: set(v) for k, v in deps.items()}
+    while pending:
+        ready = [k for k, v in pending.items() if not v]
+        if not ready:
+            raise ValueError(f"Dependency cycle between stages: {sorted(pending)}")
+        for k in ready:
+            del pending[k]
+        for v in pending.values():
+            v.difference_update(ready)
+    return deps
+
+
+def with_upstream(targets, deps):
+    selected, todo = set(), list(targets)
+    while todo:
+        name = todo.pop()
+        if name not in selected:
+            selected.add(name)
+            todo.extend(deps[name])
+    return selected
+
+
+def load_state(path=STATE_FILE):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_json(path, obj):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(obj, f, indent=2)
+    os.replace(tmp, path)
+
+
+def stale_reason(stage, state, force):
+    """None if the stage is up to date, else a short reason string."""
+    if force:
+        return "forced"
+    missing = [p for p in stage.outputs if not os.path.exists(p)]
+    if missing:
+        return f"missing output {missing[0]}"
+    rec = state.get(stage.name)
+    if not rec:
+        return "no previous run recorded"
+    sig = stage.signature()
+    if rec.get("code") != sig["code"]:
+        return "code changed"
+    if rec.get("args") != sig["args"]:
+        return "arguments changed"
+    changed = [p for p, h in sig["inputs"].items() if rec.get("inputs", {}).get(p) != h]
+    if changed:
+        return f"input changed: {changed[0]}"
+    edited = [p for p in stage.outputs if rec.get("outputs", {}).get(p) != file_digest(p)]
+    if edited:
+        return f"output modified since last run: {edited[0]}"
+    return None
+
+
+def run_stage(stage, log_dir=LOG_DIR):
+    os.makedirs(log_dir, exist_ok=True)
+    log_path = os.path.join(log_dir, f"{stage.name}.log")
+    t0 = time.perf_counter()
+    with open(log_path, "w", encoding="utf-8") as log:
+        proc = subprocess.run(stage.command(), stdout=log, stderr=subprocess.STDOUT)
+    return proc.returncode, time.perf_counter() - t0, log_path
+
+
+def run_pipeline(stages=STAGES, targets=None, force=(), jobs=2, dry_run=False,
+                 state_path=STATE_FILE, manifest_path=MANIFEST_FILE):
+    by_name = {st.name: st for st in stages}
+    deps = dependencies(stages)
+    unknown = [t for t in list(targets or []) + list(force) if t not in by_name and t != "all"]
+    if unknown:
+        raise SystemExit(f"Unknown stage(s): {unknown}. Known: {list(by_name)}")
+    selected = with_upstream(targets, deps) if targets else set(by_name)
+    force = set(by_name) if "all" in force else set(force)
+
+    state = load_state(state_path)
+    results = {}
+    started = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    t_run = time.perf_counter()
+
+    # a stage reruns if it is stale itself or any upstream stage actually changed its outputs;
+    # signatures are re-evaluated only once upstream has finished, so content hashes decide
+    remaining = {n: deps[n] & selected for n in selected}
+    running = {}
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        while remaining or running:
+            for name in [n for n, d in remaining.items() if not d]:
+                del remaining[name]
+                stage = by_name[name]
+                blocked = [d for d in deps[name] & selected if results[d]["status"] in ("failed", "blocked")]
+                if blocked:
+                    results[name] = {"status": "blocked", "reason": f"upstream '{blocked[0]}' did not succeed",
+                                     "seconds": 0.0}
+                    _mark_done(name, remaining)
+                    continue
+                reason = stale_reason(stage, state, name in force)
+                if reason is None and dry_run:
+                    # upstream never runs in a dry run, so its old outputs cannot clear this stage
+                    pending = sorted(d for d in deps[name] & selected if results[d]["status"] == "would run")
+                    if pending:
+                        reason = f"pending upstream '{pending[0]}'"
+                if reason is None or dry_run:
+                    status = "skipped" if reason is None else "would run"
+                    results[name] = {"status": status, "reason": reason or "up to date", "seconds": 0.0}
+                    print(f"[{status.upper():>9}] {name}: {reason or 'up to date'}")
+                    _mark_done(name, remaining)
+                    continue
+                print(f"[  RUNNING] {name}: {reason}")
+                sig = stage.signature()  # inputs are final: all upstream stages are done
+                running[pool.submit(run_stage, stage)] = (name, reason, sig)
+
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                name, reason, sig = running.pop(fut)
+                stage = by_name[name]
+                code, seconds, log_path = fut.result()
+                missing = [p for p in stage.outputs if not os.path.exists(p)]
+                if code == 0 and not missing:
+                    state[name] = {**sig, "outputs": {p: file_digest(p) for p in stage.outputs},
+                                   "finished": datetime.now(timezone.utc).isoformat(timespec="seconds")}
+                    write_json(state_path, state)
+                    results[name] = {"status": "ran", "reason": reason, "seconds": round(seconds, 3),
+                                     "log": log_path}
+                    print(f"[       OK] {name} ({seconds:.1f}s)")
+                else:
+                    err = f"exit code {code}" if code else f"did not write {missing[0]}"
+                    results[name] = {"status": "failed", "reason": err, "seconds": round(seconds, 3),
+                                     "log": log_path}
+                    print(f"[   FAILED] {name}: {err} (see {log_path})")
+                _mark_done(name, remaining)
+
+    manifest = {
+        "started": started,
+        "total_seconds": round(time.perf_counter() - t_run, 3),
+        "jobs": jobs,
+        "dry_run": dry_run,
+        "stages": {n: results[n] for n in by_name if n in results},
+    }
+    if not dry_run:
+        write_json(manifest_path, manifest)
+    return manifest
+
+
+def _mark_done(name, remaining):
+    for d in remaining.values():
+        d.discard(name)
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Run the crop-yield data pipeline, skipping up-to-date stages.")
+    p.add_argument("targets", nargs="*", help="stages to bring up to date (default: all)")
+    p.add_argument("--force", nargs="*", default=[], help="stages to rerun regardless ('all' for every stage)")
+    p.add_argument("--jobs", type=int, default=2, help="stages run in parallel")
+    p.add_argument("--dry-run", action="store_true", help="only report what would run")
+    p.add_argument("--list", action="store_true", help="list stages and their dependencies")
+    return p.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.list:
+        deps = dependencies(STAGES)
+        for st in STAGES:
+            print(f"{st.name:<10} after {sorted(deps[st.name]) or '-'}  ->  {', '.join(st.outputs)}")
+        return
+
+    manifest = run_pipeline(targets=args.targets, force=args.force, jobs=args.jobs, dry_run=args.dry_run)
+    statuses = [s["status"] for s in manifest["stages"].values()]
+    print(f"\nDone in {manifest['total_seconds']:.1f}s: "
+          + ", ".join(f"{statuses.count(s)} {s}" for s in ("ran", "skipped", "would run", "failed", "blocked")
+                      if statuses.count(s)))
+    if not args.dry_run:
+        print(f"Manifest: {MANIFEST_FILE}")
+    if "failed" in statuses or "blocked" in statuses:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+What-if sensitivity surface: predicted yield over a temperature x rainfall grid.
+
+For one (State, Year) the whole grid is built as a single frame and scored with one
+predict call, instead of one prediction per (temp, rain) pair.
+
+Usage:
+  temps, rains, Z = sensitivity_grid(model, "IOWA", 2024, (temp_min, temp_max), (rain_min, rain_max), 100)
+  # Z[i, j] = predicted yield at rains[i], temps[j]
+"""
+
+import numpy as np
+import pandas as pd
+
+from model_config import FEATURES
+
+GRID_RESOLUTIONS = [25, 50, 100]
+
+
+def grid_frame(state, year, temps, rains):
+    """Model input rows for every (rain, temp) pair, rain-major (row i * n_temp + j)."""
+    tt, rr = np.meshgrid(temps, rains)
+    n = tt.size
+    return pd.DataFrame({
+        "State": np.full(n, state, dtype=object),
+        "Year": np.full(n, int(year)),
+        "avg_temp_growing": tt.ravel(),
+        "total_rain_growing": rr.ravel(),
+    })[FEATURES]
+
+
+def sensitivity_grid(model, state, year, temp_range, rain_range, resolution=50):
+    """(temps, rains, Z) with Z shaped (len(rains), len(temps)), from one batched predict."""
+    temps = np.linspace(float(temp_range[0]), float(temp_range[1]), int(resolution))
+    rains = np.linspace(float(rain_range[0]), float(rain_range[1]), int(resolution))
+    Z = np.asarray(model.predict(grid_frame(state, year, temps, rains)), dtype=float)
+    return temps, rains, Z.reshape(len(rains), len(temps))
+
+
+def value_at(temps, rains, Z, temp, rain):
+    """Grid prediction nearest to (temp, rain)."""
+    j = int(np.abs(temps - temp).argmin())
+    i = int(np.abs(rains - rain).argmin())
+    return float(Z[i, j])
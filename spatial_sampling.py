@@ -0,0 +1,309 @@
+"""
+Multi-point spatial sampling of NASA POWER weather per state.
+
+Instead of one centroid per state, each state is covered by a set of sample points:
+  - a regular n x n grid of cell centres over the state's bounding box, keeping only the
+    centres inside the state's outline (state_boundaries.json: lower-48 state polygons
+    simplified to ~0.04 degrees from the Census outlines bundled with libpysal's us_income
+    example). Points are weighted by cos(latitude), so each one counts in proportion to its
+    cell's area. Small states where no centre falls inside get a finer grid; states with
+    no outline (Alaska, Hawaii) keep the whole bounding-box grid, which overweights the
+    sea and neighbouring states, and are reported when sampled.
+  - a user-supplied points file (e.g. cropland-weighted points) with columns
+    State,lat,lon,weight
+
+States are processed in batches: every point of a batch is fetched (concurrently, through
+the same rate limiter / retry / cache path as download_us_weather_power.py, see
+power_client.py), stacked into one (n_points, n_months, n_vars) array and reduced to
+state-month means with NumPy weighted reductions. Only one batch of point data is held in
+memory at a time.
+
+The output has the usual monthly schema: State,Year,Month,T2M,PRECTOTCORR
+"""
+
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from power_client import (
+    BACKOFF_BASE_SEC,
+    MAX_RETRIES,
+    MAX_WORKERS,
+    POWER_FILL_VALUE,
+    POWER_URL,
+    SLEEP_SEC,
+    RateLimiter,
+    fetch_point_cached,
+    make_session,
+    month_axis,
+    power_to_array,
+)
+
+# Points per side of the per-state grid (5 -> 25 points per state)
+GRID_POINTS_PER_SIDE = 5
+
+# States whose points are fetched + aggregated together (bounds memory)
+BATCH_STATES = 8
+
+# {STATE: [ring, ...]}, each ring a list of [lon, lat]; holes / islands by the even-odd rule
+STATE_BOUNDARIES_FILE = "state_boundaries.json"
+MAX_GRID_REFINE = 5      # small states: double the grid up to 5 times to get a point inside
+
+VARIABLES = ["T2M", "PRECTOTCORR"]
+
+# ==============================
+# STATE BOUNDING BOXES (lat_min, lat_max, lon_min, lon_max), approximate
+# ==============================
+STATE_BOUNDS = {
+    "ALABAMA": (30.14, 35.01, -88.47, -84.89),
+    "ALASKA": (51.20, 71.40, -179.10, -129.90),
+    "ARIZONA": (31.33, 37.00, -114.82, -109.04),
+    "ARKANSAS": (33.00, 36.50, -94.62, -89.64),
+    "CALIFORNIA": (32.53, 42.01, -124.41, -114.13),
+    "COLORADO": (36.99, 41.00, -109.06, -102.04),
+    "CONNECTICUT": (40.98, 42.05, -73.73, -71.79),
+    "DELAWARE": (38.45, 39.84, -75.79, -75.05),
+    "FLORIDA": (24.52, 31.00, -87.63, -80.03),
+    "GEORGIA": (30.36, 35.00, -85.61, -80.84),
+    "HAWAII": (18.91, 22.24, -160.25, -154.81),
+    "IDAHO": (41.99, 49.00, -117.24, -111.04),
+    "ILLINOIS": (36.97, 42.51, -91.51, -87.02),
+    "INDIANA": (37.77, 41.76, -88.10, -84.78),
+    "IOWA": (40.38, 43.50, -96.64, -90.14),
+    "KANSAS": (36.99, 40.00, -102.05, -94.59),
+    "KENTUCKY": (36.50, 39.15, -89.57, -81.96),
+    "LOUISIANA": (28.93, 33.02, -94.04, -88.82),
+    "MAINE": (43.06, 47.46, -71.08, -66.95),
+    "MARYLAND": (37.91, 39.72, -79.49, -75.05),
+    "MASSACHUSETTS": (41.24, 42.89, -73.51, -69.93),
+    "MICHIGAN": (41.70, 48.31, -90.42, -82.41),
+    "MINNESOTA": (43.50, 49.38, -97.24, -89.49),
+    "MISSISSIPPI": (30.17, 35.00, -91.66, -88.10),
+    "MISSOURI": (35.99, 40.61, -95.77, -89.10),
+    "MONTANA": (44.36, 49.00, -116.05, -104.04),
+    "NEBRASKA": (40.00, 43.00, -104.05, -95.31),
+    "NEVADA": (35.00, 42.00, -120.01, -114.04),
+    "NEW HAMPSHIRE": (42.70, 45.31, -72.56, -70.61),
+    "NEW JERSEY": (38.93, 41.36, -75.56, -73.89),
+    "NEW MEXICO": (31.33, 37.00, -109.05, -103.00),
+    "NEW YORK": (40.50, 45.02, -79.76, -71.86),
+    "NORTH CAROLINA": (33.84, 36.59, -84.32, -75.46),
+    "NORTH DAKOTA": (45.94, 49.00, -104.05, -96.55),
+    "OHIO": (38.40, 41.98, -84.82, -80.52),
+    "OKLAHOMA": (33.62, 37.00, -103.00, -94.43),
+    "OREGON": (41.99, 46.29, -124.57, -116.46),
+    "PENNSYLVANIA": (39.72, 42.27, -80.52, -74.69),
+    "RHODE ISLAND": (41.15, 42.02, -71.86, -71.12),
+    "SOUTH CAROLINA": (32.03, 35.22, -83.35, -78.54),
+    "SOUTH DAKOTA": (42.48, 45.95, -104.06, -96.44),
+    "TENNESSEE": (34.98, 36.68, -90.31, -81.65),
+    "TEXAS": (25.84, 36.50, -106.65, -93.51),
+    "UTAH": (37.00, 42.00, -114.05, -109.04),
+    "VERMONT": (42.73, 45.02, -73.44, -71.46),
+    "VIRGINIA": (36.54, 39.47, -83.68, -75.24),
+    "WASHINGTON": (45.54, 49.00, -124.76, -116.92),
+    "WEST VIRGINIA": (37.20, 40.64, -82.64, -77.72),
+    "WISCONSIN": (42.49, 47.08, -92.89, -86.81),
+    "WYOMING": (40.99, 45.01, -111.06, -104.05),
+}
+
+
+# ==============================
+# Sample points
+# ==============================
+def load_state_polygons(path=STATE_BOUNDARIES_FILE):
+    """{STATE: [(k, 2) lon/lat ring arrays]}; {} (bounding boxes only) if the file is missing."""
+    if not os.path.exists(path):
+        print(f"⚠️ {path} not found: grid points are not clipped to state outlines.")
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return {st: [np.asarray(r, dtype=float) for r in rings] for st, rings in json.load(f).items()}
+
+
+def points_in_polygon(lon, lat, rings):
+    """Even-odd ray-casting test of many points against all rings of one state, as one array op."""
+    a = np.concatenate(rings)
+    b = np.concatenate([np.roll(r, -1, axis=0) for r in rings])      # edge a -> b, rings closed
+    x, y = np.asarray(lon, dtype=float)[:, None], np.asarray(lat, dtype=float)[:, None]
+    spans = (a[:, 1] > y) != (b[:, 1] > y)                             # (n_points, n_edges)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x_cross = a[:, 0] + (y - a[:, 1]) * (b[:, 0] - a[:, 0]) / (b[:, 1] - a[:, 1])
+    return (spans & (x < x_cross)).sum(axis=1) % 2 == 1
+
+
+def _box_grid(box, n_per_side):
+    """Cell-centre (lat, lon) of an n x n grid over one (lat_min, lat_max, lon_min, lon_max) box."""
+    frac = (np.arange(n_per_side) + 0.5) / n_per_side               # cell centres in [0, 1]
+    lat = box[0] + (box[1] - box[0]) * frac
+    lon = box[2] + (box[3] - box[2]) * frac
+    return np.repeat(lat, n_per_side), np.tile(lon, n_per_side)
+
+
+def grid_points(states, n_per_side=GRID_POINTS_PER_SIDE, bounds=None, polygons=None):
+    """
+    Grid cell centres inside each state; weight = cos(lat) (relative cell area).
+
+    `polygons` ({STATE: rings}, default: STATE_BOUNDARIES_FILE) clips each state's
+    bounding-box grid to its outline. A state with no centre inside is re-gridded at 2x, 4x,
+    ... resolution; a state without an outline keeps the full bounding-box grid.
+    """
+    bounds = bounds or STATE_BOUNDS
+    polygons = load_state_polygons() if polygons is None else polygons
+    states = [st for st in states if st in bounds]
+    frames, unclipped = [], []
+    for st in states:
+        n = n_per_side
+        lat, lon = _box_grid(bounds[st], n)
+        if st in polygons:
+            inside = points_in_polygon(lon, lat, polygons[st])
+            while not inside.any() and n < n_per_side * 2 ** MAX_GRID_REFINE:
+                n *= 2
+                lat, lon = _box_grid(bounds[st], n)
+                inside = points_in_polygon(lon, lat, polygons[st])
+            if inside.any():
+                lat, lon = lat[inside], lon[inside]
+        else:
+            unclipped.append(st)
+        frames.append(pd.DataFrame({
+            "State": st,
+            "lat": lat.round(4),
+            "lon": lon.round(4),
+            "weight": np.cos(np.deg2rad(lat)),
+        }))
+    if unclipped and polygons:
+        print(f"⚠️ No outline for {unclipped}: using their whole bounding-box grid.")
+    columns = ["State", "lat", "lon", "weight"]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+
+
+def load_points_file(path, states=None):
+    """Read State,lat,lon,weight sample points (e.g. cropland-area weights) from a CSV."""
+    pts = pd.read_csv(path)
+    missing = [c for c in ["State", "lat", "lon", "weight"] if c not in pts.columns]
+    if missing:
+        raise ValueError(f"Points file missing columns {missing}. Found: {list(pts.columns)}")
+    pts["State"] = pts["State"].astype(str).str.strip().str.upper()
+    pts = pts[pts["weight"] > 0]
+    if states is not None:
+        pts = pts[pts["State"].isin(states)]
+    return pts.reset_index(drop=True)
+
+
+# ==============================
+# Vectorized aggregation
+# ==============================
+def aggregate_points(values, state_codes, weights, n_states):
+    """
+    Weighted mean over points per state, ignoring missing values.
+
+    values      (n_points, n_months, n_vars) float array; NaN = missing
+    state_codes (n_points,) ints in [0, n_states)
+    weights     (n_points,) non-negative floats
+
+    Returns (n_states, n_months, n_vars); NaN where a state has no valid point.
+    """
+    n_points = values.shape[0]
+    flat = values.reshape(n_points, -1)
+    valid = ~np.isnan(flat)
+    # (n_states, n_points) weight matrix: row s holds the weights of state s's points
+    W = np.zeros((n_states, n_points))
+    W[state_codes, np.arange(n_points)] = weights
+    num = W @ np.where(valid, flat, 0.0)
+    den = W @ valid
+    out = np.full(num.shape, np.nan)
+    np.divide(num, den, out=out, where=den > 0)
+    return out.reshape((n_states,) + values.shape[1:])
+
+
+def fetch_states_multipoint(points, start_year, end_year, year_ranges=None,
+                            batch_states=BATCH_STATES, max_workers=MAX_WORKERS, min_interval=SLEEP_SEC,
+                            max_retries=MAX_RETRIES, backoff_base=BACKOFF_BASE_SEC, url=POWER_URL, cache=None):
+    """
+    Fetch every sample point and aggregate to state-month rows, one batch of states at a time.
+
+    Returns (weather_df, report_df) like download_us_weather_power.fetch_states; a state is
+    reported "failed" only if none of its points could be fetched.
+    """
+    year_ranges = year_ranges or {}
+    limiter = RateLimiter(min_interval)
+    session = make_session(max_workers)
+    years, months = month_axis(start_year, end_year)
+    period = years * 12 + months - 1
+    states = sorted(points["State"].unique())
+    frames = []
+    report = []
+
+    def fetch_one(lat, lon, y0, y1):
+        data, status, attempts = fetch_point_cached(
+            lat, lon, y0, y1, session=session, url=url, limiter=limiter, cache=cache,
+            max_retries=max_retries, backoff_base=backoff_base,
+        )
+        arr = power_to_array(data, y0, y1)
+        arr[arr == POWER_FILL_VALUE] = np.nan
+        return arr, attempts
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        for b0 in range(0, len(states), batch_states):
+            batch = states[b0:b0 + batch_states]
+            pts = points[points["State"].isin(batch)].reset_index(drop=True)
+            codes = pd.Categorical(pts["State"], categories=batch).codes
+            values = np.full((len(pts), len(period), len(VARIABLES)), np.nan)
+            ok = np.zeros(len(pts), dtype=bool)
+            attempts = np.zeros(len(pts), dtype=int)
+            errors = {}
+            t0 = time.perf_counter()
+
+            futures = {}
+            for i, (st, lat, lon) in enumerate(zip(pts["State"], pts["lat"], pts["lon"])):
+                y0, y1 = year_ranges.get(st, (start_year, end_year))
+                futures[pool.submit(fetch_one, lat, lon, y0, y1)] = (i, y0)
+            for fut in as_completed(futures):
+                i, y0 = futures[fut]
+                try:
+                    arr, attempts[i] = fut.result()
+                except Exception as e:
+                    errors.setdefault(pts.at[i, "State"], str(e))
+                    continue
+                off = (y0 - start_year) * 12
+                values[i, off:off + len(arr)] = arr
+                ok[i] = True
+
+            state_means = aggregate_points(values, codes, pts["weight"].to_numpy(dtype=float), len(batch))
+            seconds = round(time.perf_counter() - t0, 3)
+            for j, st in enumerate(batch):
+                mine = codes == j
+                n_ok = int(ok[mine].sum())
+                y0, y1 = year_ranges.get(st, (start_year, end_year))
+                keep = (years >= y0) & (years <= y1)
+                if n_ok:
+                    frames.append(pd.DataFrame({
+                        "State": st,
+                        "Year": years[keep],
+                        "Month": months[keep],
+                        "T2M": state_means[j, keep, 0],
+                        "PRECTOTCORR": state_means[j, keep, 1],
+                    }))
+                report.append({
+                    "State": st,
+                    "status": "ok" if n_ok else "failed",
+                    "attempts": int(attempts[mine].sum()),
+                    "seconds": seconds,
+                    "error": errors.get(st, ""),
+                    "points": int(mine.sum()),
+                    "points_ok": n_ok,
+                })
+            print(f"[batch {b0 // batch_states + 1}] {len(batch)} states, {len(pts)} points, "
+                  f"{int(ok.sum())} fetched in {seconds}s")
+            del values
+    session.close()
+
+    columns = ["State", "Year", "Month"] + VARIABLES
+    weather_df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+    weather_df = weather_df.sort_values(["State", "Year", "Month"]).reset_index(drop=True)
+    report_df = pd.DataFrame(report, columns=["State", "status", "attempts", "seconds", "error",
+                                              "points", "points_ok"])
+    return weather_df, report_df
@@ -0,0 +1,43 @@
+"""
+Startup timing for the dashboard: elapsed-time marks through one script run.
+
+The app marks imports, data load, first render and the end of the run; the first run in a
+server process (the cold start) is appended to .cache/startup_timing.jsonl, one JSON object
+per line, so time to first render can be tracked across deploys.
+"""
+
+import json
+import os
+import time
+from datetime import datetime, timezone
+
+from model_config import CACHE_DIR
+
+REPORT_FILE = os.path.join(CACHE_DIR, "startup_timing.jsonl")
+
+
+class StartupTimer:
+    def __init__(self, t0=None):
+        self.t0 = time.perf_counter() if t0 is None else t0
+        self.marks = {}
+
+    def mark(self, name):
+        self.marks[name] = round(time.perf_counter() - self.t0, 4)
+
+    def record(self, **extra):
+        return {
+            "ts": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "pid": os.getpid(),
+            **extra,
+            "marks_sec": dict(self.marks),
+        }
+
+    def write(self, path=REPORT_FILE, **extra):
+        rec = self.record(**extra)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(rec) + "\n")
+        except OSError as e:
+            print(f"⚠️ startup_timing: could not write {path}: {e}")
+        return rec
@@ -0,0 +1,55 @@
+"""
+Pre-indexed per-state views and summaries for the dashboard.
+
+Built once per dataset: the modelling table is partitioned by State (each partition
+sorted and indexed by Year), and everything the sidebar and state panels need (per-state
+means / yield stats, test-year lists, global slider bounds) is precomputed, so a rerun is a
+handful of dict lookups instead of repeated boolean scans over the whole table.
+"""
+
+from model_config import TARGET, TEST_END, TEST_START
+
+
+class StateIndex:
+    def __init__(self, df):
+        df = df.sort_values(["State", "Year"])
+        self.n_rows = len(df)
+        self.frames = {
+            str(state): part.set_index("Year", drop=False)
+            for state, part in df.groupby("State", sort=True, observed=True)
+        }
+        self.states = list(self.frames)
+
+        self.stats = (
+            df.groupby("State", observed=True)
+            .agg(
+                mean_temp=("avg_temp_growing", "mean"),
+                mean_rain=("total_rain_growing", "mean"),
+                yield_mean=(TARGET, "mean"),
+                yield_min=(TARGET, "min"),
+                yield_max=(TARGET, "max"),
+            )
+            .astype(float)
+        )
+        self.stats.index = self.stats.index.astype(str)
+        self.stats_by_state = self.stats.to_dict("index")
+
+        self.test_years = {
+            st: [int(y) for y in part["Year"] if TEST_START <= y <= TEST_END]
+            for st, part in self.frames.items()
+        }
+
+        self.year_min, self.year_max = int(df["Year"].min()), int(df["Year"].max())
+        self.temp_min, self.temp_max = float(df["avg_temp_growing"].min()), float(df["avg_temp_growing"].max())
+        self.rain_min, self.rain_max = float(df["total_rain_growing"].min()), float(df["total_rain_growing"].max())
+
+    def frame(self, state):
+        """All rows of one state, sorted by Year (indexed by Year)."""
+        return self.frames[state]
+
+    def row(self, state, year):
+        """The (State, Year) row as a Series."""
+        return self.frames[state].loc[int(year)]
+
+    def stat(self, state, name):
+        return self.stats_by_state[state][name]
@@ -0,0 +1,65 @@
+import os
+import sys
+
+import joblib
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.pipeline import Pipeline
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batch_score import PRED_COLUMN, score_file  # noqa: E402
+from model_config import FEATURES  # noqa: E402
+from train_model import build_preprocessor  # noqa: E402
+
+
+@pytest.fixture
+def model_file(tmp_path):
+    df = pd.DataFrame({
+        "State": ["IA", "IL", "NE", "IA", "IL", "NE"],
+        "Year": [2018, 2018, 2018, 2019, 2019, 2019],
+        "avg_temp_growing": [21.0, 22.5, 20.1, 21.7, 23.0, 20.4],
+        "total_rain_growing": [520.0, 610.2, 430.9, 480.3, 590.0, 455.5],
+    })
+    pipe = Pipeline([("prep", build_preprocessor()),
+                     ("model", RandomForestRegressor(n_estimators=5, random_state=0))])
+    pipe.fit(df[FEATURES], [180.0, 190.0, 170.0, 185.0, 195.0, 172.0])
+    path = tmp_path / "model.joblib"
+    joblib.dump(pipe, path)
+    return str(path)
+
+
+def test_empty_parquet_input_gives_parquet_output(tmp_path, model_file):
+    src = tmp_path / "empty.parquet"
+    pd.DataFrame({"State": pd.Series(dtype=str), "Year": pd.Series(dtype="int64"),
+                  "avg_temp_growing": pd.Series(dtype=float),
+                  "total_rain_growing": pd.Series(dtype=float)}).to_parquet(src, index=False)
+    out = tmp_path / "scored.parquet"
+
+    rows, _ = score_file(str(src), str(out), model_file=model_file)
+
+    assert rows == 0
+    table = pq.read_table(out)
+    assert table.num_rows == 0
+    assert table.column_names == FEATURES + [PRED_COLUMN]
+
+
+def test_pass_through_column_changing_dtype_across_chunks(tmp_path, model_file):
+    src = tmp_path / "scenarios.csv"
+    src.write_text(
+        "State,Year,avg_temp_growing,total_rain_growing,note\n"
+        "IA,2020,21.2,500.0,\n"
+        "IL,2020,22.1,580.0,\n"
+        "NE,2020,20.3,440.0,dry\n"
+    )
+    out = tmp_path / "scored.parquet"
+
+    rows, _ = score_file(str(src), str(out), model_file=model_file, chunk_rows=2)
+
+    assert rows == 3
+    scored = pd.read_parquet(out)
+    assert scored["note"].tolist() == [None, None, "dry"]
+    assert scored["Year"].tolist() == [2020, 2020, 2020]
+    assert scored[PRED_COLUMN].notna().all()
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Reproducible training entry point for the crop-yield model.
+
+  1. Year-aware split (model_config): train TRAIN_START..TRAIN_END, test TEST_START..TEST_END.
+     Model selection uses the last VALID_YEARS training years as a validation block
+     (fit on the years before it), so the test years are never used to choose a model.
+  2. Design matrices (one-hot State + numeric passthrough) are built once and cached under
+     .cache/design/, keyed by the dataset hash and the split/feature config.
+  3. Candidates — mean baseline, Linear, Ridge (alpha grid), RandomForest (depth x estimators
+     grid) — are fitted and scored in parallel on a process pool.
+  4. The best candidate (validation MAE) is refitted on all training years as
+     Pipeline(preprocessor=..., model=...) — the step names app.py expects — and written
+     atomically to MODEL_FILE (plus its training-rows manifest), with a JSON report of
+     scores and timings.
+
+Run:
+  python train_model.py --workers 4
+  python train_model.py --no-save          # comparison table + report only
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+import sklearn
+from sklearn.base import clone
+from sklearn.compose import ColumnTransformer
+from sklearn.dummy import DummyRegressor
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.linear_model import LinearRegression, Ridge
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder
+
+import dataset_store as store
+from fingerprint import file_digest
+from model_artifact import save_model
+from model_config import (
+    CACHE_DIR, DATASET, FEATURES, MODEL_FILE, TARGET, TEST_END, TEST_START, TRAIN_END, TRAIN_START,
+)
+from model_evaluation import regression_metrics
+from tree_shap import warm_test_shap
+
+DESIGN_DIR = os.path.join(CACHE_DIR, "design")
+REPORT_FILE = "training_report.json"
+
+VALID_YEARS = 4                 # last training years held out for model selection
+RIDGE_ALPHAS = [0.1, 1.0, 10.0]
+RF_ESTIMATORS = [100, 200, 400]
+RF_MAX_DEPTH = [None, 12, 24]
+RANDOM_STATE = 42
+
+CATEGORICAL = ["State"]
+NUMERIC = [c for c in FEATURES if c not in CATEGORICAL]
+
+
+def build_preprocessor():
+    return ColumnTransformer([
+        ("cat", OneHotEncoder(handle_unknown="ignore"), CATEGORICAL),
+        ("num", "passthrough", NUMERIC),
+    ])
+
+
+def candidates():
+    """[(name, unfitted estimator)] compared by the search."""
+    out = [("mean_baseline", DummyRegressor(strategy="mean")), ("linear", LinearRegression())]
+    out += [(f"ridge_a{a:g}", Ridge(alpha=a)) for a in RIDGE_ALPHAS]
+    out += [
+        (f"rf_n{n}_d{d or 'full'}", RandomForestRegressor(n_estimators=n, max_depth=d,
+                                                          random_state=RANDOM_STATE, n_jobs=1))
+        for d in RF_MAX_DEPTH for n in RF_ESTIMATORS
+    ]
+    return out
+
+
+# ==============================
+# Splits + cached design matrices
+# ==============================
+def split_frames(df, valid_years=VALID_YEARS):
+    train = df[df["Year"].between(TRAIN_START, TRAIN_END)]
+    test = df[df["Year"].between(TEST_START, TEST_END)]
+    valid_start = TRAIN_END - valid_years + 1
+    fit = train[train["Year"] < valid_start]
+    valid = train[train["Year"] >= valid_start]
+    return {"fit": fit, "valid": valid, "train": train, "test": test}
+
+
+def design_key(data_hash, valid_years=VALID_YEARS):
+    raw = json.dumps([data_hash, FEATURES, TARGET, TRAIN_START, TRAIN_END, TEST_START, TEST_END,
+                      valid_years, sklearn.__version__])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:24]
+
+
+def _encode(train_part, other_part):
+    pre = build_preprocessor().fit(train_part[FEATURES])
+    dense = lambda X: X.toarray() if hasattr(X, "toarray") else np.asarray(X)
+    return (dense(pre.transform(train_part[FEATURES])).astype(np.float64),
+            dense(pre.transform(other_part[FEATURES])).astype(np.float64))
+
+
+def design_matrices(df, data_hash, valid_years=VALID_YEARS, design_dir=DESIGN_DIR, use_cache=True):
+    """Encoded X/y for (fit -> valid) and (train -> test); cached per dataset hash + config."""
+    path = os.path.join(design_dir, f"design_{design_key(data_hash, valid_years)}.npz")
+    if use_cache and os.path.exists(path):
+        try:
+            with np.load(path, allow_pickle=False) as z:
+                return {k: z[k] for k in z.files}, True
+        except (OSError, ValueError):
+            pass
+
+    parts = split_frames(df, valid_years)
+    if parts["fit"].empty or parts["valid"].empty:
+        raise ValueError(f"Not enough training years for a {valid_years}-year validation block")
+    X_fit, X_valid = _encode(parts["fit"], parts["valid"])
+    X_train, X_test = _encode(parts["train"], parts["test"])
+    mats = {
+        "X_fit": X_fit, "y_fit": parts["fit"][TARGET].to_numpy(dtype=float),
+        "X_valid": X_valid, "y_valid": parts["valid"][TARGET].to_numpy(dtype=float),
+        "X_train": X_train, "y_train": parts["train"][TARGET].to_numpy(dtype=float),
+        "X_test": X_test, "y_test": parts["test"][TARGET].to_numpy(dtype=float),
+    }
+    if use_cache:
+        try:
+            os.makedirs(design_dir, exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp.npz"
+            np.savez(tmp, **mats)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"⚠️ train_model: could not write {path}: {e}")
+    return mats, False
+
+
+# ==============================
+# Parallel search
+# ==============================
+_mats = None
+
+
+def _init_worker(mats):
+    global _mats
+    _mats = mats
+
+
+def evaluate_candidate(name, estimator, mats=None):
+    """Fit on fit-years -> validation scores; fit on all train years -> test scores."""
+    mats = mats if mats is not None else _mats
+    t0 = time.perf_counter()
+    est = clone(estimator).fit(mats["X_fit"], mats["y_fit"])
+    valid = regression_metrics(mats["y_valid"], est.predict(mats["X_valid"]))
+    t1 = time.perf_counter()
+    est = clone(estimator).fit(mats["X_train"], mats["y_train"])
+    test = regression_metrics(mats["y_test"], est.predict(mats["X_test"]))
+    return {
+        "name": name,
+        "params": {k: v for k, v in estimator.get_params().items() if not callable(v)},
+        "valid": valid,
+        "test": test,
+        "seconds": round(time.perf_counter() - t0, 3),
+        "valid_seconds": round(t1 - t0, 3),
+    }
+
+
+def run_search(mats, cands, workers=1):
+    if workers <= 1:
+        return [evaluate_candidate(name, est, mats) for name, est in cands]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(mats,)) as pool:
+        futures = [pool.submit(evaluate_candidate, name, est) for name, est in cands]
+        return [f.result() for f in futures]
+
+
+def fit_final(df, estimator):
+    train = split_frames(df)["train"]
+    pipe = Pipeline([("preprocessor", build_preprocessor()), ("model", clone(estimator))])
+    return pipe.fit(train[FEATURES], train[TARGET])
+
+
+def print_table(results, best):
+    print(f"{'model':<18}{'valid MAE':>10}{'valid R²':>10}{'test MAE':>10}{'test RMSE':>10}{'test R²':>9}{'sec':>8}")
+    for r in sorted(results, key=lambda r: r["valid"]["mae"]):
+        mark = " *" if r["name"] == best else ""
+        print(f"{r['name']:<18}{r['valid']['mae']:>10.2f}{r['valid']['r2']:>10.3f}{r['test']['mae']:>10.2f}"
+              f"{r['test']['rmse']:>10.2f}{r['test']['r2']:>9.3f}{r['seconds']:>8.1f}{mark}")
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Train and select the crop-yield model.")
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    p.add_argument("--output", default=MODEL_FILE)
+    p.add_argument("--report", default=REPORT_FILE)
+    p.add_argument("--valid-years", type=int, default=VALID_YEARS)
+    p.add_argument("--no-cache", action="store_true", help="rebuild the design matrices")
+    p.add_argument("--no-save", action="store_true", help="compare only; do not write the model")
+    return p.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    t0 = time.perf_counter()
+    df = store.load(DATASET)
+    data_hash = file_digest(store.csv_path(DATASET))
+    mats, cached = design_matrices(df, data_hash, args.valid_years, use_cache=not args.no_cache)
+    t_design = time.perf_counter() - t0
+
+    cands = candidates()
+    results = run_search(mats, cands, workers=args.workers)
+    t_search = time.perf_counter() - t0 - t_design
+
+    best = min(results, key=lambda r: r["valid"]["mae"])
+    print_table(results, best["name"])
+
+    report = {
+        "trained": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "dataset": DATASET,
+        "data_hash": data_hash,
+        "split": {"train": [TRAIN_START, TRAIN_END], "valid_years": args.valid_years,
+                  "test": [TEST_START, TEST_END]},
+        "design_cached": cached,
+        "workers": args.workers,
+        "timings_sec": {"design": round(t_design, 3), "search": round(t_search, 3)},
+        "candidates": results,
+        "best": best["name"],
+    }
+
+    if not args.no_save:
+        t1 = time.perf_counter()
+        model = fit_final(df, dict(cands)[best["name"]])
+        save_model(model, args.output, train_rows=split_frames(df)["train"], data_hash=data_hash,
+                   source="train_model", candidate=best["name"])
+        report["timings_sec"]["final_fit"] = round(time.perf_counter() - t1, 3)
+        report["model_file"] = args.output
+        report["model_hash"] = file_digest(args.output)
+        print(f"✅ Saved best model ({best['name']}): {args.output}")
+        t2 = time.perf_counter()
+        if warm_test_shap(model, report["model_hash"], data_hash, df) is not None:
+            report["timings_sec"]["test_shap"] = round(time.perf_counter() - t2, 3)
+
+    report["timings_sec"]["total"] = round(time.perf_counter() - t0, 3)
+    with open(args.report, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Report: {args.report} (design {'cached' if cached else 'built'}, "
+          f"search {t_search:.1f}s on {args.workers} worker(s))")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+Shared growing-season feature engine over a dense State x Year x Month weather cube.
+
+The monthly weather table (dataset_store "weather_monthly") is loaded once into a NumPy
+array shaped (state, year, month, variable). Season windows are boolean month masks, so any number
+of windows (fixed months, per-state planting calendars, lagged months, early/late
+splits) is computed in one batched reduction instead of one pandas groupby per window.
+
+Month masks run over a 24-month axis: index 0..11 = previous year Jan..Dec,
+12..23 = harvest year Jan..Dec. That is what lets a window reach back across New Year
+(e.g. "Oct-Dec of the previous year" or "May, lagged 8 months").
+
+Usage:
+  cube = load_cube()
+  growing = season_frame(cube, GROWING_MONTHS)                    # avg_temp_growing, total_rain_growing
+  feats = compute_windows(cube, early_late_windows() + lagged_month_windows([7], lags=[0, 12]))
+
+Run (timing demo over every contiguous Mar-Oct window):
+  python weather_features.py
+"""
+
+import time
+
+import numpy as np
+import pandas as pd
+
+import dataset_store as store
+
+# Corn growing season (USA typical): Apr–Sep
+GROWING_MONTHS = [4, 5, 6, 7, 8, 9]
+
+VARIABLES = ["T2M", "PRECTOTCORR"]
+
+
+# ==============================
+# Loading
+# ==============================
+def days_in_month(years):
+    """(n_years, 12) array of calendar days per month."""
+    first = (np.asarray(years)[:, None] - 1970) * 12 + np.arange(12)
+    start = first.astype("datetime64[M]").astype("datetime64[D]")
+    end = (first + 1).astype("datetime64[M]").astype("datetime64[D]")
+    return (end - start).astype(int)
+
+
+class WeatherCube:
+    """Dense monthly weather: values[state, year, month - 1, variable], NaN where missing."""
+
+    def __init__(self, states, years, variables, values):
+        self.states = np.asarray(states)
+        self.years = np.asarray(years)
+        self.variables = list(variables)
+        self.values = values
+        self.days = days_in_month(self.years)
+
+    @classmethod
+    def from_frame(cls, w, variables=VARIABLES):
+        states = np.array(sorted(w["State"].unique()))
+        years = np.arange(int(w["Year"].min()), int(w["Year"].max()) + 1)
+        s = pd.Categorical(w["State"], categories=states).codes
+        y = w["Year"].to_numpy() - years[0]
+        m = w["Month"].to_numpy() - 1
+        values = np.full((len(states), len(years), 12, len(variables)), np.nan)
+        values[s, y, m] = w[list(variables)].to_numpy(dtype=float)
+        return cls(states, years, variables, values)
+
+    def var(self, name):
+        return self.values[..., self.variables.index(name)]
+
+    def extended(self, arr):
+        """(S, Y, 12) -> (S, Y, 24): previous year's months followed by this year's."""
+        prev = np.full_like(arr, np.nan)
+        prev[:, 1:] = arr[:, :-1]
+        return np.concatenate([prev, arr], axis=2)
+
+
+def load_cube():
+    """Monthly weather (typed, via dataset_store) as a WeatherCube."""
+    return WeatherCube.from_frame(store.load("weather_monthly"))
+
+
+# ==============================
+# Season windows
+# ==============================
+class SeasonWindow:
+    """
+    A named set of months, optionally per state and/or lagged.
+
+    months    list of months 1..12 (harvest year), used for every state
+    by_state  {STATE: [months]} planting calendar; states not listed fall back to `months`
+    lag       shift every month back by this many months (12 = same months, previous year)
+    """
+
+    def __init__(self, name, months=None, by_state=None, lag=0):
+        if months is None and by_state is None:
+            raise ValueError(f"Window '{name}' needs months or by_state")
+        self.name = name
+        self.months = list(months) if months is not None else None
+        self.by_state = by_state or {}
+        self.lag = int(lag)
+
+    def _row(self, months):
+        row = np.zeros(24, dtype=bool)
+        if months:
+            idx = 12 + np.asarray(months) - 1 - self.lag
+            if (idx < 0).any() or (idx > 23).any():
+                raise ValueError(f"Window '{self.name}': lag {self.lag} reaches outside the previous year")
+            row[idx] = True
+        return row
+
+    def mask(self, states):
+        """(n_states, 24) boolean month mask."""
+        default = self._row(self.months)
+        return np.stack([self._row(self.by_state[st]) if st in self.by_state else default for st in states])
+
+    def __repr__(self):
+        return f"SeasonWindow({self.name!r}, months={self.months}, lag={self.lag}, by_state={len(self.by_state)})"
+
+
+def early_late_windows(months=GROWING_MONTHS):
+    """Split a season in two halves: 'early' and 'late'."""
+    half = (len(months) + 1) // 2
+    return [SeasonWindow("early", months[:half]), SeasonWindow("late", months[half:])]
+
+
+def lagged_month_windows(months, lags=(0,)):
+    """One single-month window per (month, lag): 'm7_lag0', 'm7_lag12', ..."""
+    return [SeasonWindow(f"m{m}_lag{k}", [m], lag=k) for m in months for k in lags]
+
+
+def contiguous_windows(first_month=3, last_month=10, min_len=1):
+    """Every contiguous run of months inside [first_month, last_month]: 'w4_9' = Apr–Sep, ..."""
+    return [
+        SeasonWindow(f"w{a}_{b}", list(range(a, b + 1)))
+        for a in range(first_month, last_month + 1)
+        for b in range(a + min_len - 1, last_month + 1)
+    ]
+
+
+# ==============================
+# Batched reductions
+# ==============================
+def _masked_reduce(masks, arr):
+    """Sum and count of non-NaN arr[s, y, m] over each window: (W, S, 24) x (S, Y, 24) -> (W, S, Y)."""
+    valid = ~np.isnan(arr)
+    m = masks.astype(float)
+    total = np.einsum("wsm,sym->wsy", m, np.where(valid, arr, 0.0))
+    count = np.einsum("wsm,sym->wsy", m, valid.astype(float))
+    return total, count
+
+
+def window_arrays(cube, windows, rain="mm"):
+    """
+    (avg_temp, total_rain), each shaped (n_windows, n_states, n_years).
+
+    rain="mm"   -> PRECTOTCORR (mm/day) x days in month, summed (true monthly totals)
+    rain="rate" -> PRECTOTCORR summed as-is (legacy merge_yield_weather.py behaviour)
+    """
+    masks = np.stack([w.mask(cube.states) for w in windows])
+    temp = cube.extended(cube.var("T2M"))
+    pr = cube.var("PRECTOTCORR")
+    if rain == "mm":
+        pr = pr * cube.days[None, :, :]
+    elif rain != "rate":
+        raise ValueError(f"rain must be 'mm' or 'rate', got {rain!r}")
+    pr = cube.extended(pr)
+
+    t_sum, t_cnt = _masked_reduce(masks, temp)
+    r_sum, r_cnt = _masked_reduce(masks, pr)
+    avg_temp = np.full(t_sum.shape, np.nan)
+    np.divide(t_sum, t_cnt, out=avg_temp, where=t_cnt > 0)
+    total_rain = np.where(r_cnt > 0, r_sum, np.nan)
+    return avg_temp, total_rain
+
+
+def compute_windows(cube, windows, rain="mm"):
+    """Wide frame: State, Year, <window>_avg_temp, <window>_total_rain for every window."""
+    avg_temp, total_rain = window_arrays(cube, windows, rain=rain)
+    n_states, n_years = len(cube.states), len(cube.years)
+    out = {
+        "State": np.repeat(cube.states, n_years),
+        "Year": np.tile(cube.years, n_states),
+    }
+    for i, w in enumerate(windows):
+        out[f"{w.name}_avg_temp"] = avg_temp[i].ravel()
+        out[f"{w.name}_total_rain"] = total_rain[i].ravel()
+    return pd.DataFrame(out)
+
+
+def season_frame(cube, months=GROWING_MONTHS, rain="mm"):
+    """State, Year, avg_temp_growing, total_rain_growing for one season (rows with no data dropped)."""
+    df = compute_windows(cube, [SeasonWindow("growing", months)], rain=rain)
+    df = df.rename(columns={"growing_avg_temp": "avg_temp_growing", "growing_total_rain": "total_rain_growing"})
+    return df.dropna(subset=["avg_temp_growing", "total_rain_growing"]).reset_index(drop=True)
+
+
+def main():
+    t0 = time.perf_counter()
+    cube = load_cube()
+    t1 = time.perf_counter()
+    windows = contiguous_windows(3, 10) + early_late_windows() + lagged_month_windows(range(1, 13), lags=(0, 12))
+    feats = compute_windows(cube, windows)
+    t2 = time.perf_counter()
+    print(f"Cube: {cube.values.shape} (state, year, month, variable) loaded in {t1 - t0:.2f}s")
+    print(f"{len(windows)} windows -> {feats.shape} feature frame in {t2 - t1:.3f}s")
+
+
+if __name__ == "__main__":
+    main()